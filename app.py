@@ -1,40 +1,115 @@
 import os
-from flask import Flask, render_template, request, jsonify
+import json
+import time
+import itertools
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, send_file, abort
 from dotenv import load_dotenv
 
-# LangChain Modern Core Imports
-from langchain_pinecone import PineconeVectorStore
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-
 # Custom Modules
-from src.helper import download_hugging_face_embeddings
+from src.helper import load_embedding_model
 from src.citation_manager import CitationManager
+from src.pipeline import RAGPipeline
+from src.vector_store import get_vector_store, ShardedVectorStore
+from src.config import (
+    INDEX_NAME, VECTOR_BACKEND, INDEX_VERSION_PATH, ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD,
+    EMBED_BATCH_SIZE, EMBED_MAX_WAIT_MS, EMBED_CACHE_SIZE,
+    LEXICAL_INDEX_PATH, HYBRID_SEARCH, HYBRID_FETCH_K, TOP_K, REFERENCE_INDEX_PATH,
+    CONTEXT_TOKEN_BUDGET, MMR_LAMBDA, PRELOAD_MODELS, LAZY_STARTUP,
+    HEALTH_CHECK_INTERVAL, TABLE_STORE_PATH, TABLE_LOOKUP, BATCH_MAX_QUESTIONS, BATCH_CONCURRENCY,
+    SINGLEFLIGHT, LLM_MAX_CONCURRENCY, LLM_QUEUE_SIZE, LLM_QUEUE_TIMEOUT,
+    PAGE_IMAGE_INDEX_PATH, DATA_DIR, PAGE_CACHE_DIR, QUERY_FILTERS, FILTERED_TOP_K, SHARD_MAP_PATH
+)
+from src.answer_cache import AnswerCache
+from src.embedding_service import BatchingEmbeddings
+from src.lexical_index import BM25Index
+from src.reference_index import ReferenceIndex
+from src.table_store import TableStore
+from src.page_images import PageImageIndex, PageRenderer, PAGE_SIZES
+from src.shards import ShardMap
+from src.context_builder import ContextBuilder
+from src.clients import make_chat_model
+from src.components import ComponentRegistry
+from src.health import HealthProber
+from src.admission import SingleFlight, AdmissionController, Overloaded
+from src.metrics import registry as metrics_registry, REQUESTS, ERRORS
 
 app = Flask(__name__)
 load_dotenv()
 
 # --- 1. Configuration & Initialization ---
-INDEX_NAME = "multimodal-rag-v2"
-embeddings = download_hugging_face_embeddings()
-
-# Initialize Vector Store & Retriever
-try:
-    docsearch = PineconeVectorStore.from_existing_index(
-        index_name=INDEX_NAME,
-        embedding=embeddings
-    )
-    # Using k=12 as per your requirement for better context
-    retriever = docsearch.as_retriever(
-        search_type="similarity", 
-        search_kwargs={"k": 12}
+# Everything heavy is a lazily built component (src/components.py). Under
+# gunicorn.conf.py the local ones are preloaded once in the master and shared
+# copy-on-write with the forked workers; remote clients are created and warmed
+# per worker in the background, so workers start answering almost immediately.
+components = ComponentRegistry()
+
+
+def load_embeddings():
+    # Concurrent query embeddings are micro-batched into single forward passes
+    return BatchingEmbeddings(
+        load_embedding_model(),
+        max_batch_size=EMBED_BATCH_SIZE,
+        max_wait_ms=EMBED_MAX_WAIT_MS,
+        cache_size=EMBED_CACHE_SIZE
     )
-    print(f"✅ Connected to Pinecone index: {INDEX_NAME}")
-except Exception as e:
-    print(f"❌ Error connecting to Pinecone: {e}")
-    retriever = None
+
+
+def load_shard_map():
+    # Shards the index was built with (store_index.py); "none" for a single unsharded index
+    shard_map = ShardMap.load(SHARD_MAP_PATH)
+    if shard_map.shard_by != "none":
+        print(f"✅ Loaded shard map: {len(shard_map)} shards by {shard_map.shard_by}")
+    return shard_map
+
+
+def load_vector_store():
+    # VECTOR_BACKEND = pinecone | flat | hnsw, one index or one store/namespace per shard
+    try:
+        store = get_vector_store(components.get("embeddings"), shard_map=components.get("shard_map"))
+    except Exception as e:
+        # Re-raised so the registry doesn't cache the failure and the next get() retries
+        print(f"❌ Error connecting to {VECTOR_BACKEND} vector store: {e}")
+        raise
+    print(f"✅ Connected to {VECTOR_BACKEND} vector store: {INDEX_NAME}")
+    return store
+
+
+def load_lexical_index():
+    # BM25 index built by store_index.py, fused with dense results for exact-token queries
+    if not HYBRID_SEARCH:
+        return None
+    lexical_index = BM25Index.load(LEXICAL_INDEX_PATH)
+    print(f"✅ Loaded BM25 index: {len(lexical_index)} chunks")
+    return lexical_index
+
+
+def load_reference_index():
+    # Figure/Table/page references resolved straight to chunk IDs, skipping similarity search
+    reference_index = ReferenceIndex.load(REFERENCE_INDEX_PATH)
+    print(f"✅ Loaded reference index: {len(reference_index.refs)} references")
+    return reference_index
+
+
+def load_table_store():
+    # Numeric table cells answered directly, without an LLM round-trip
+    if not TABLE_LOOKUP:
+        return None
+    table_store = TableStore.load(TABLE_STORE_PATH)
+    print(f"✅ Loaded table store: {len(table_store)} table cells")
+    return table_store
+
+
+def load_page_images():
+    # Which cited pages carry figures; the images themselves are rendered on request
+    page_images = PageImageIndex.load(PAGE_IMAGE_INDEX_PATH)
+    print(f"✅ Loaded page image index: {len(page_images)} pages with figures or images")
+    return page_images
+
+
+# Pages and figures are rendered from the PDFs in DATA_DIR on first request and cached on disk
+page_renderer = PageRenderer(DATA_DIR, PAGE_CACHE_DIR)
+
 
 # --- 2. System Prompt Definition ---
 MULTIMODAL_SYSTEM_PROMPT = """You are an expert financial document analyst. Your job is to find and explain specific data, figures, and tables in the document.
@@ -64,36 +139,167 @@ QUESTION: {question}
 
 YOUR ANSWER:"""
 
-# --- 3. RAG Chain Setup (LCEL Style) ---
-chat_model = ChatOpenAI(
-    model="openai/gpt-4o-mini", 
-    openai_api_base="https://openrouter.ai/api/v1",
-    openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-    temperature=0.1,
-    max_tokens=800
+# --- 3. RAG Pipeline Setup ---
+# Exact + semantic answer cache, invalidated when store_index.py rebuilds the index
+answer_cache = AnswerCache(
+    max_entries=ANSWER_CACHE_SIZE,
+    ttl=ANSWER_CACHE_TTL,
+    threshold=ANSWER_CACHE_THRESHOLD,
+    version_path=INDEX_VERSION_PATH
+) if ANSWER_CACHE_ENABLED else None
+
+
+# Concurrent identical questions share one run; LLM calls beyond the limit wait in a
+# bounded queue or are shed with 429/503 + Retry-After instead of piling up
+singleflight = SingleFlight() if SINGLEFLIGHT else None
+admission = AdmissionController(
+    max_concurrent=LLM_MAX_CONCURRENCY,
+    max_queue=LLM_QUEUE_SIZE,
+    queue_timeout=LLM_QUEUE_TIMEOUT
 )
 
-# Helper function to format retrieved documents into a single string
-def format_docs(docs):
-    return "\n\n".join(doc.page_content for doc in docs)
 
-# The modern LCEL Chain
-if retriever:
-    prompt = ChatPromptTemplate.from_template(MULTIMODAL_SYSTEM_PROMPT)
-    
-    rag_chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
-        | prompt
-        | chat_model
-        | StrOutputParser()
+def optional_component(name):
+    """An index the pipeline can run without: None (logged) if it can't be loaded"""
+    try:
+        return components.get(name)
+    except Exception as e:
+        print(f"⚠️ {name} unavailable, continuing without it: {e}")
+        return None
+
+
+def load_rag_chain():
+    # Single-pass pipeline: one embedding + one vector search per question,
+    # shared between the prompt context and the citations. Raises (and is
+    # retried on the next request) until the vector store is reachable.
+    docsearch = components.get("vector_store")
+
+    # k defaults to 12 (RAG_TOP_K); hybrid retrieval is precise enough to lower it
+    rag_chain = RAGPipeline(
+        embeddings=components.get("embeddings"),
+        vector_store=docsearch,
+        chat_model=components.get("chat_model"),
+        prompt_template=MULTIMODAL_SYSTEM_PROMPT,
+        k=TOP_K,
+        cache=answer_cache,
+        lexical_index=optional_component("lexical_index"),
+        fetch_k=HYBRID_FETCH_K,
+        reference_index=optional_component("reference_index"),
+        table_store=optional_component("table_store"),
+        singleflight=singleflight,
+        admission=admission,
+        query_filters=QUERY_FILTERS,
+        filtered_k=FILTERED_TOP_K,
+        shard_map=components.get("shard_map"),
+        context_builder=ContextBuilder(token_budget=CONTEXT_TOKEN_BUDGET, mmr_lambda=MMR_LAMBDA)
     )
-    print("✅ LCEL RAG chain initialized successfully")
-else:
-    rag_chain = None
-    print("⚠️ RAG chain not initialized due to missing retriever")
+    print("✅ RAG pipeline initialized successfully")
+    return rag_chain
+
+
+components.register("embeddings", load_embeddings, warm=lambda e: e.embed_documents(["warmup"]))
+components.register("shard_map", load_shard_map)
+components.register("vector_store", load_vector_store)
+components.register("lexical_index", load_lexical_index)
+components.register("reference_index", load_reference_index)
+components.register("table_store", load_table_store, warm=lambda t: t.lookup("warmup"))
+components.register("page_images", load_page_images)
+# Shared keep-alive HTTP pools for both sync (Flask) and async (asgi.py) calls
+components.register("chat_model", make_chat_model)
+components.register("rag_chain", load_rag_chain)
+
+# Local, read-only state worth sharing between workers; remote clients stay per process
+LOCAL_COMPONENTS = ["embeddings", "shard_map", "lexical_index", "reference_index", "table_store", "page_images"]
+if VECTOR_BACKEND != "pinecone":
+    LOCAL_COMPONENTS.append("vector_store")
+
+
+def check_vector_store():
+    if components.error("vector_store") is not None:
+        # Retry the failed connection; raises (and stays unhealthy) while it still fails
+        components.get("vector_store")
+    if not components.is_ready("vector_store"):
+        raise RuntimeError("initializing")
+    docsearch = components.peek("vector_store")
+    if isinstance(docsearch, ShardedVectorStore):
+        if docsearch.index is not None:
+            return {"backend": "pinecone", "index": INDEX_NAME, "shards": len(docsearch.shards),
+                    "vectors": docsearch.index.describe_index_stats().total_vector_count}
+        return {"backend": VECTOR_BACKEND, "shards": len(docsearch.shards), "vectors": len(docsearch)}
+    if VECTOR_BACKEND != "pinecone":
+        if len(docsearch) == 0:
+            raise RuntimeError(f"{VECTOR_BACKEND} index is empty")
+        return {"backend": VECTOR_BACKEND, "vectors": len(docsearch)}
+    # Reuses the pooled Index client instead of creating a new one per probe
+    stats = docsearch.index.describe_index_stats()
+    return {"backend": "pinecone", "index": INDEX_NAME, "vectors": stats.total_vector_count}
+
+
+def check_pipeline():
+    if components.error("rag_chain") is not None:
+        components.get("rag_chain")
+    if not components.is_ready("rag_chain"):
+        raise RuntimeError("initializing")
+    return {}
+
+
+# Probes (/health, /ready) only read the cached results of these background checks
+health_prober = HealthProber(
+    {"vector_store": check_vector_store, "rag_chain": check_pipeline},
+    interval=HEALTH_CHECK_INTERVAL
+)
+
+if PRELOAD_MODELS:
+    # gunicorn master (preload_app): load once before fork; workers warm the rest
+    # and start the health prober in post_fork
+    components.preload(LOCAL_COMPONENTS)
+elif not LAZY_STARTUP:
+    page_renderer.start()
+    components.warmup()
+    health_prober.start()
+
+
+def visual_sources(docs):
+    """Thumbnail citations for the cited pages (empty if the page image index is unavailable)"""
+    try:
+        return CitationManager.get_visual_sources(docs, components.get("page_images"))
+    except Exception as e:
+        print(f"⚠️ Visual citations unavailable: {e}")
+        return []
+
+
+class PipelineUnavailable(RuntimeError):
+    """The pipeline (or the vector store it needs) could not be built; retried on the next request"""
+
+
+def get_rag_chain():
+    """The pipeline, waiting for the warmup if it is still loading.
+
+    Raises PipelineUnavailable while it can't be built; each call retries.
+    """
+    try:
+        return components.get("rag_chain")
+    except Exception as e:
+        print(f"❌ RAG pipeline unavailable: {e}")
+        raise PipelineUnavailable(str(e)) from e
+
+
+UNAVAILABLE_ANSWER = "System is currently initializing or Pinecone is disconnected."
 
 # --- 4. Routes ---
 
+def overloaded_response(e):
+    """429/503 with Retry-After for a request shed by admission control"""
+    response = jsonify({
+        "error": str(e),
+        "answer": "The assistant is busy right now, please retry shortly.",
+        "sources": [],
+        "retry_after": e.retry_after
+    })
+    response.status_code = e.status
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
 @app.route("/")
 def index():
     return render_template("dashboard.html")
@@ -105,50 +311,251 @@ def chat():
         if not msg:
             return jsonify({"error": "No message received"}), 400
         
-        if rag_chain is None:
-            return jsonify({
-                "answer": "System is currently initializing or Pinecone is disconnected.",
-                "sources": []
-            })
-        
-        # 1. Manually get docs first so we can extract sources for CitationManager
-        retrieved_docs = retriever.invoke(msg)
+        REQUESTS.inc(endpoint="/get")
+        rag_chain = get_rag_chain()
         
-        # 2. Invoke the chain for the answer
-        answer = rag_chain.invoke(msg)
+        # 1. Embed, retrieve and generate in a single pass
+        result = rag_chain.invoke(msg)
         
-        # 3. Process sources using your existing CitationManager
-        unique_sources = CitationManager.get_unique_sources(retrieved_docs)
+        # 2. Process sources from the same retrieved docs using CitationManager
+        unique_sources = CitationManager.get_unique_sources(result["docs"])
+        print(f"⏱️ /get timings: {result['timings']}")
         
         return jsonify({
-            "answer": answer,
+            "answer": result["answer"],
             "sources": unique_sources,
+            "visuals": visual_sources(result["docs"]),
+            "timings": result["timings"],
+            "cache": result["cache"],
             "success": True
         })
         
+    except PipelineUnavailable:
+        return jsonify({"answer": UNAVAILABLE_ANSWER, "sources": []})
+    except Overloaded as e:
+        print(f"🚦 /get shed: {e}")
+        return overloaded_response(e)
     except Exception as e:
         print(f"❌ Error in /get route: {e}")
+        ERRORS.inc(endpoint="/get")
         return jsonify({
             "error": str(e),
             "answer": "An error occurred while processing your request.",
             "sources": []
         }), 500
 
-@app.route("/health", methods=["GET"])
-def health():
-    from pinecone import Pinecone
+def sse_event(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/stream", methods=["POST"])
+def chat_stream():
+    """Streaming variant of /get: citations first, then answer tokens as SSE"""
+    msg = request.form.get("msg", "").strip()
+    if not msg:
+        return jsonify({"error": "No message received"}), 400
+    
+    REQUESTS.inc(endpoint="/stream")
     try:
-        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        indexes = [idx.name for idx in pc.list_indexes()]
-        pinecone_ok = INDEX_NAME in indexes
-        
-        return jsonify({
-            "status": "healthy" if rag_chain and pinecone_ok else "degraded",
-            "pinecone_connection": "connected" if pinecone_ok else "disconnected",
-            "rag_chain_status": "ready" if rag_chain else "initializing"
-        })
+        rag_chain = get_rag_chain()
+    except PipelineUnavailable:
+        return jsonify({"answer": UNAVAILABLE_ANSWER, "sources": []})
+    
+    # Run up to the first event here: admission happens before it, so an overloaded
+    # server can still answer with a 429/503 status instead of an SSE error
+    stream = rag_chain.stream(msg)
+    try:
+        first = next(stream)
+    except Overloaded as e:
+        print(f"🚦 /stream shed: {e}")
+        return overloaded_response(e)
     except Exception as e:
-        return jsonify({"status": "unhealthy", "error": str(e)}), 500
+        print(f"❌ Error in /stream route: {e}")
+        ERRORS.inc(endpoint="/stream")
+        return jsonify({"error": str(e), "answer": "An error occurred while processing your request.", "sources": []}), 500
+
+    def events():
+        try:
+            for kind, payload in itertools.chain([first], stream):
+                if kind == "docs":
+                    # Citations go out as soon as retrieval finishes
+                    yield sse_event("sources", CitationManager.get_unique_sources(payload))
+                    yield sse_event("visuals", visual_sources(payload))
+                elif kind == "token":
+                    yield sse_event("token", payload)
+                else:
+                    print(f"⏱️ /stream timings: {payload}")
+                    yield sse_event("done", {"timings": payload, "success": True})
+        except Exception as e:
+            print(f"❌ Error in /stream route: {e}")
+            ERRORS.inc(endpoint="/stream")
+            yield sse_event("error", {"error": str(e)})
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def read_questions():
+    """Questions from a JSON body ({"questions": [...]}) or a newline-separated ``questions`` form field"""
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        questions = payload.get("questions") or []
+    else:
+        questions = request.form.get("questions", "").splitlines()
+    return [str(q).strip() for q in questions if str(q).strip()]
+
+@app.route("/batch", methods=["POST"])
+def chat_batch():
+    """Answer a list of questions, streaming one JSON line per answer as each one finishes
+    (in completion order, tagged with its index), then a final summary line"""
+    questions = read_questions()
+    if not questions:
+        return jsonify({"error": "No questions received"}), 400
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        return jsonify({"error": f"At most {BATCH_MAX_QUESTIONS} questions per batch"}), 413
+
+    REQUESTS.inc(len(questions), endpoint="/batch")
+    try:
+        rag_chain = get_rag_chain()
+    except PipelineUnavailable:
+        return jsonify({"error": UNAVAILABLE_ANSWER}), 503
+
+    def lines():
+        start = time.perf_counter()
+        failed = 0
+        try:
+            for index, future in rag_chain.batch(questions, max_concurrency=BATCH_CONCURRENCY):
+                line = {"index": index, "question": questions[index]}
+                try:
+                    result = future.result()
+                    line.update({
+                        "answer": result["answer"],
+                        "sources": CitationManager.get_unique_sources(result["docs"]),
+                        "timings": result["timings"],
+                        "cache": result["cache"],
+                        "success": True
+                    })
+                except Overloaded as e:
+                    failed += 1
+                    line.update({"error": str(e), "retry_after": e.retry_after, "success": False})
+                except Exception as e:
+                    print(f"❌ Error in /batch question {index}: {e}")
+                    ERRORS.inc(endpoint="/batch")
+                    failed += 1
+                    line.update({"error": str(e), "success": False})
+                yield json.dumps(line) + "\n"
+        except Exception as e:
+            # Embedding or retrieval failed for the whole batch
+            print(f"❌ Error in /batch route: {e}")
+            ERRORS.inc(endpoint="/batch")
+            yield json.dumps({"error": str(e), "success": False}) + "\n"
+            return
+        total_ms = round((time.perf_counter() - start) * 1000, 2)
+        print(f"⏱️ /batch: {len(questions)} questions, {failed} failed, {total_ms} ms")
+        yield json.dumps({"done": True, "questions": len(questions), "failed": failed, "total_ms": total_ms}) + "\n"
+
+    return Response(
+        stream_with_context(lines()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def rendered_file(render, *args):
+    """send_file for an on-demand rendering: ETag/Last-Modified, 304s and long-lived caching"""
+    try:
+        path = render(*args)
+    except LookupError as e:
+        abort(404, description=str(e))
+    except ImportError:
+        abort(501, description="Page rendering needs the pypdfium2 package")
+    # The cache path changes when the PDF does, so renderings can be cached for a day
+    return send_file(path, mimetype="image/png", conditional=True, etag=True, max_age=86400)
+
+@app.route("/pdf/<source>", methods=["GET"])
+def pdf_file(source):
+    """The source PDF, with conditional GETs and Range requests (PDF viewers fetch it in parts)"""
+    path = page_renderer.pdf_path(source)
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype="application/pdf", conditional=True, etag=True, max_age=3600)
+
+@app.route("/pages/<source>/<int:page>.png", methods=["GET"])
+def page_image(source, page):
+    """A page rendered at ?size=thumb (default) or large"""
+    size = request.args.get("size", "thumb")
+    if page_renderer.pdf_path(source) is None or size not in PAGE_SIZES:
+        abort(404)
+    return rendered_file(page_renderer.page_image, source, page, size)
+
+@app.route("/pages/<source>/<int:page>/images/<int:number>.png", methods=["GET"])
+def page_embedded_image(source, page, number):
+    """One raster image (photo, scanned chart) as drawn on the page"""
+    if page_renderer.pdf_path(source) is None:
+        abort(404)
+    return rendered_file(page_renderer.embedded_image, source, page, number)
+
+@app.route("/pages/<source>/<int:page>", methods=["GET"])
+def page_info(source, page):
+    """Figure captions and image URLs recorded for a page at ingestion"""
+    if page_renderer.pdf_path(source) is None:
+        abort(404)
+    visuals = CitationManager.get_visual_sources(
+        [{"metadata": {"source": source, "page": page}}], components.get("page_images")
+    )
+    entry = components.get("page_images").page(source, page)
+    return jsonify({**visuals[0], "figures": entry["figures"], "image_sizes": entry["images"]})
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    embeddings = components.peek("embeddings")
+    return jsonify({
+        "answer_cache": answer_cache.stats() if answer_cache else {"enabled": False},
+        "embedding_service": embeddings.stats() if embeddings else {"loaded": False}
+    })
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text exposition: stage latencies, tokens, chunk types, cache and error counters"""
+    return Response(metrics_registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/live", methods=["GET"])
+def live():
+    """Liveness: the worker is up and serving requests; no dependency checks"""
+    return jsonify({"status": "alive"})
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness: 200 once the pipeline is warm and the last background checks passed"""
+    checks = health_prober.status()
+    is_ready = all(result["ok"] for result in checks.values())
+    return jsonify({
+        "ready": is_ready,
+        "checks": checks,
+        "components": components.status(),
+        "admission": admission.stats(),
+        "singleflight": singleflight.stats() if singleflight else {"enabled": False}
+    }), 200 if is_ready else 503
+
+@app.route("/health", methods=["GET"])
+def health():
+    """Cached health summary from the background prober (no outbound calls)"""
+    checks = health_prober.status()
+    vector_store = checks["vector_store"]
+    rag_chain = checks["rag_chain"]
+    if vector_store["ok"] and rag_chain["ok"]:
+        status = "healthy"
+    elif vector_store.get("error") not in (None, "initializing") or vector_store.get("state") == "stale":
+        status = "unhealthy"
+    else:
+        status = "degraded"
+    return jsonify({
+        "status": status,
+        "vector_store": vector_store,
+        "rag_chain_status": "ready" if rag_chain["ok"] else rag_chain.get("error", rag_chain.get("state")),
+        "checks": checks
+    }), 503 if status == "unhealthy" else 200
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 7860))
@@ -0,0 +1,147 @@
+"""Async serving entry point.
+
+/get and /stream run as native async routes on the chain's ``ainvoke`` /
+``astream``, so one worker holds many in-flight questions while they wait
+on the vector store and the LLM. Every other route is served by the Flask
+app in app.py, which also owns the shared model, vector store and pooled
+HTTP clients (built lazily per worker, see app.components).
+
+Run with:
+    gunicorn -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:7860 asgi:app
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as wsgi
+from src.citation_manager import CitationManager
+from src.clients import get_async_http_client
+from src.metrics import REQUESTS, ERRORS
+from src.admission import Overloaded
+
+
+async def read_msg(request):
+    """Read the ``msg`` form field (application/x-www-form-urlencoded)"""
+    body = (await request.body()).decode("utf-8")
+    return parse_qs(body).get("msg", [""])[0].strip()
+
+
+def overloaded_response(e):
+    return JSONResponse({
+        "error": str(e),
+        "answer": "The assistant is busy right now, please retry shortly.",
+        "sources": [],
+        "retry_after": e.retry_after
+    }, status_code=e.status, headers={"Retry-After": str(e.retry_after)})
+
+
+async def chat(request):
+    try:
+        msg = await read_msg(request)
+        if not msg:
+            return JSONResponse({"error": "No message received"}, status_code=400)
+
+        REQUESTS.inc(endpoint="/get")
+        rag_chain = await asyncio.to_thread(wsgi.get_rag_chain)
+
+        result = await rag_chain.ainvoke(msg)
+        print(f"⏱️ /get timings: {result['timings']}")
+
+        return JSONResponse({
+            "answer": result["answer"],
+            "sources": CitationManager.get_unique_sources(result["docs"]),
+            "visuals": wsgi.visual_sources(result["docs"]),
+            "timings": result["timings"],
+            "cache": result["cache"],
+            "success": True
+        })
+
+    except wsgi.PipelineUnavailable:
+        return JSONResponse({"answer": wsgi.UNAVAILABLE_ANSWER, "sources": []})
+    except Overloaded as e:
+        print(f"🚦 async /get shed: {e}")
+        return overloaded_response(e)
+    except Exception as e:
+        print(f"❌ Error in async /get route: {e}")
+        ERRORS.inc(endpoint="/get")
+        return JSONResponse({
+            "error": str(e),
+            "answer": "An error occurred while processing your request.",
+            "sources": []
+        }, status_code=500)
+
+
+async def chat_stream(request):
+    msg = await read_msg(request)
+    if not msg:
+        return JSONResponse({"error": "No message received"}, status_code=400)
+
+    REQUESTS.inc(endpoint="/stream")
+    try:
+        rag_chain = await asyncio.to_thread(wsgi.get_rag_chain)
+    except wsgi.PipelineUnavailable:
+        return JSONResponse({"answer": wsgi.UNAVAILABLE_ANSWER, "sources": []})
+
+    # Admission happens before the first event, so shedding can still set the status code
+    stream = rag_chain.astream(msg)
+    try:
+        first = await stream.__anext__()
+    except Overloaded as e:
+        print(f"🚦 async /stream shed: {e}")
+        return overloaded_response(e)
+    except Exception as e:
+        print(f"❌ Error in async /stream route: {e}")
+        ERRORS.inc(endpoint="/stream")
+        return JSONResponse({
+            "error": str(e),
+            "answer": "An error occurred while processing your request.",
+            "sources": []
+        }, status_code=500)
+
+    async def chained():
+        yield first
+        async for event in stream:
+            yield event
+
+    async def events():
+        try:
+            async for kind, payload in chained():
+                if kind == "docs":
+                    yield wsgi.sse_event("sources", CitationManager.get_unique_sources(payload))
+                    yield wsgi.sse_event("visuals", wsgi.visual_sources(payload))
+                elif kind == "token":
+                    yield wsgi.sse_event("token", payload)
+                else:
+                    print(f"⏱️ /stream timings: {payload}")
+                    yield wsgi.sse_event("done", {"timings": payload, "success": True})
+        except Exception as e:
+            print(f"❌ Error in async /stream route: {e}")
+            ERRORS.inc(endpoint="/stream")
+            yield wsgi.sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    yield
+    await get_async_http_client().aclose()
+
+
+app = Starlette(
+    routes=[
+        Route("/get", chat, methods=["POST"]),
+        Route("/stream", chat_stream, methods=["POST"]),
+        Mount("/", app=WSGIMiddleware(wsgi.app))
+    ],
+    lifespan=lifespan
+)
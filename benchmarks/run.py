@@ -0,0 +1,345 @@
+"""Offline end-to-end benchmarks: no Pinecone or OpenRouter keys needed.
+
+    python -m benchmarks.run serve   # replay queries through the real /get route
+    python -m benchmarks.run ingest  # extract -> split -> embed -> upsert over data/qatar_test_doc.pdf
+    python -m benchmarks.run all --output results.json --baseline previous.json
+
+The vector store, chat model and (unless --real-embeddings) the embedding model
+are replaced by the stand-ins in benchmarks/standins.py, with simulated
+latencies set on the command line. Everything else — BatchingEmbeddings,
+hybrid retrieval, context packing, the Flask route — is the production code.
+Results (throughput and p50/p95/p99 per stage) are written as JSON; with
+--baseline, p95 regressions beyond --max-regression fail the run.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_QUERIES = os.path.join(os.path.dirname(__file__), "queries.txt")
+DEFAULT_PDF = os.path.join("data", "qatar_test_doc.pdf")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("suite", choices=["serve", "ingest", "all"], nargs="?", default="all")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="previous results JSON to compare p95 latencies against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 increase (0.2 = 20%%)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jitter", type=float, default=0.2, help="+/- fraction applied to every simulated latency")
+    parser.add_argument("--real-embeddings", action="store_true",
+                        help="use the configured EMBEDDING_BACKEND model instead of the stand-in")
+    parser.add_argument("--embed-batch-ms", type=float, default=5.0)
+    parser.add_argument("--embed-text-ms", type=float, default=0.5)
+
+    serve = parser.add_argument_group("serve")
+    serve.add_argument("--queries", default=DEFAULT_QUERIES, help=".txt (one per line) or .jsonl with a question/query/msg field")
+    serve.add_argument("--endpoint", choices=["get", "stream"], default="get")
+    serve.add_argument("--concurrency", type=int, default=8)
+    serve.add_argument("--repeat", type=int, default=3, help="passes over the query set")
+    serve.add_argument("--search-ms", type=float, default=40.0)
+    serve.add_argument("--fetch-ms", type=float, default=20.0)
+    serve.add_argument("--llm-ttft-ms", type=float, default=300.0)
+    serve.add_argument("--llm-token-ms", type=float, default=10.0)
+    serve.add_argument("--answer-cache", action="store_true", help="keep the answer cache on (off by default)")
+
+    ingest = parser.add_argument_group("ingest")
+    ingest.add_argument("--pdf", default=DEFAULT_PDF)
+    ingest.add_argument("--ingest-runs", type=int, default=3)
+    ingest.add_argument("--upsert-ms", type=float, default=80.0)
+    ingest.add_argument("--batch-size", type=int, default=64)
+    ingest.add_argument("--pdf-workers", type=int, default=1)
+    return parser.parse_args()
+
+
+def summarize(samples):
+    """p50/p95/p99/mean/max of a list of millisecond samples"""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples, dtype=np.float64)
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 2),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+        "max": round(float(values.max()), 2)
+    }
+
+
+def load_queries(path):
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            queries = []
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    queries.append(next(record[key] for key in ("question", "query", "msg", "text") if key in record))
+            return queries
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def load_corpus(pdf_path):
+    """Chunks of the benchmark PDF, or the texts in pinecone_samples.json if it is missing"""
+    from src.helper import SimplePDFProcessor
+
+    if os.path.exists(pdf_path):
+        processor = SimplePDFProcessor(workers=1)
+        pages = processor.iter_pdf_pages(os.path.dirname(pdf_path), pdf_files=[os.path.basename(pdf_path)])
+        return list(processor.iter_split(pages))
+
+    with open("pinecone_samples.json", "r", encoding="utf-8") as f:
+        samples = json.load(f)
+    chunks = []
+    for sample in samples:
+        metadata = dict(sample["metadata"])
+        chunks.append({"text": metadata.pop("text"), "metadata": metadata})
+    return chunks
+
+
+def make_embedding_model(args, latency):
+    from benchmarks.standins import SimulatedEmbeddings
+
+    if args.real_embeddings:
+        from src.helper import load_embedding_model
+        return load_embedding_model()
+    return SimulatedEmbeddings(batch_ms=args.embed_batch_ms, per_text_ms=args.embed_text_ms, latency=latency)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+# --- Serving ---
+
+def bench_serve(args):
+    # app.py reads these at import: build nothing until the stand-ins are in place
+    os.environ["LAZY_STARTUP"] = "1"
+    if not args.answer_cache:
+        os.environ["ANSWER_CACHE"] = "0"
+
+    import app as wsgi
+    from benchmarks.standins import Latency, SimulatedChatModel, SimulatedVectorStore
+    from src.config import EMBED_BATCH_SIZE, EMBED_MAX_WAIT_MS, EMBED_CACHE_SIZE, HYBRID_SEARCH
+    from src.embedding_service import BatchingEmbeddings
+    from src.lexical_index import BM25Index
+    from src.reference_index import ReferenceIndex
+
+    latency = Latency(jitter=args.jitter, seed=args.seed)
+    model = make_embedding_model(args, latency)
+    chunks = load_corpus(args.pdf)
+    print(f"📚 Stand-in corpus: {len(chunks)} chunks")
+
+    store = SimulatedVectorStore(model, search_ms=args.search_ms, fetch_ms=args.fetch_ms, upsert_ms=0, latency=latency)
+    texts = [chunk["text"] for chunk in chunks]
+    store.add_embeddings(texts, model.embed_documents(texts), metadatas=[c["metadata"] for c in chunks])
+    lexical_index = BM25Index(path=None) if HYBRID_SEARCH else None
+    reference_index = ReferenceIndex(path=None)
+    for chunk in chunks:
+        for index in (lexical_index, reference_index):
+            if index is not None:
+                index.add(chunk["metadata"]["chunk_id"], chunk["text"], chunk["metadata"])
+
+    wsgi.components.override("embeddings", BatchingEmbeddings(
+        model, max_batch_size=EMBED_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS, cache_size=EMBED_CACHE_SIZE
+    ))
+    wsgi.components.override("vector_store", store)
+    wsgi.components.override("lexical_index", lexical_index)
+    wsgi.components.override("reference_index", reference_index)
+    wsgi.components.override("chat_model", SimulatedChatModel(
+        ttft_ms=args.llm_ttft_ms, token_ms=args.llm_token_ms, latency=latency
+    ))
+
+    queries = load_queries(args.queries) * args.repeat
+    client = wsgi.app.test_client()
+    path = f"/{args.endpoint}"
+    # One untimed request builds the pipeline
+    client.post(path, data={"msg": queries[0]}).get_data()
+
+    def run_one(question):
+        start = time.perf_counter()
+        response = client.post(path, data={"msg": question})
+        body = response.get_data(as_text=True)
+        client_ms = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            return client_ms, None
+        if args.endpoint == "get":
+            payload = json.loads(body)
+            timings = payload.get("timings") if payload.get("success") else None
+        else:
+            timings = None
+            for event in body.split("\n\n"):
+                if event.startswith("event: done"):
+                    timings = json.loads(event.split("data: ", 1)[1])["timings"]
+        return client_ms, timings
+
+    print(f"🚀 Replaying {len(queries)} queries against {path} at concurrency {args.concurrency}...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(run_one, queries))
+    wall = time.perf_counter() - start
+
+    stages = defaultdict(list)
+    errors = 0
+    for client_ms, timings in results:
+        stages["client"].append(client_ms)
+        if timings is None:
+            errors += 1
+            continue
+        for key, value in timings.items():
+            stages[key[:-3] if key.endswith("_ms") else key].append(value)
+
+    return {
+        "endpoint": path,
+        "requests": len(queries),
+        "errors": errors,
+        "concurrency": args.concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(queries) / wall, 2),
+        "embedding_batches": wsgi.components.get("embeddings").stats(),
+        "stages_ms": {stage: summarize(samples) for stage, samples in stages.items()}
+    }
+
+
+# --- Ingestion ---
+
+def bench_ingest(args):
+    from benchmarks.standins import Latency, SimulatedVectorStore
+    from src.helper import SimplePDFProcessor
+    from src.index_cache import IndexManifest, file_hash
+    from src.ingest import IngestionPipeline
+    from src.lexical_index import BM25Index
+    from src.reference_index import ReferenceIndex
+    from src.vector_store import upsert_vectors, delete_vectors
+
+    if not os.path.exists(args.pdf):
+        print(f"⚠️ {args.pdf} not found, skipping the ingestion benchmark")
+        return None
+
+    latency = Latency(jitter=args.jitter, seed=args.seed)
+    model = make_embedding_model(args, latency)
+    data_dir, pdf_file = os.path.split(args.pdf)
+    processor = SimplePDFProcessor(workers=args.pdf_workers)
+
+    runs = []
+    stages = defaultdict(list)
+    for run in range(args.ingest_runs):
+        # Extraction and splitting alone (no embedding or upload)
+        start = time.perf_counter()
+        pages = list(processor.iter_pdf_pages(data_dir, pdf_files=[pdf_file]))
+        stages["extract"].append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        chunks = list(processor.iter_split(pages))
+        stages["split"].append((time.perf_counter() - start) * 1000)
+
+        # Full streaming pipeline into a fresh stand-in store
+        def embed_fn(texts):
+            batch_start = time.perf_counter()
+            vectors = model.embed_documents(texts)
+            stages["embed_batch"].append((time.perf_counter() - batch_start) * 1000)
+            return vectors
+
+        store = SimulatedVectorStore(model, upsert_ms=args.upsert_ms, latency=latency)
+
+        def upsert_fn(**batch):
+            batch_start = time.perf_counter()
+            upsert_vectors(store, **batch)
+            stages["upsert_batch"].append((time.perf_counter() - batch_start) * 1000)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            pipeline = IngestionPipeline(
+                processor,
+                IndexManifest(os.path.join(tmp, "manifest.json")),
+                embed_fn=embed_fn,
+                upsert_fn=upsert_fn,
+                delete_fn=lambda ids: delete_vectors(store, ids),
+                batch_size=args.batch_size,
+                chunk_indexes=[BM25Index(os.path.join(tmp, "bm25.json")),
+                               ReferenceIndex(os.path.join(tmp, "references.json"))]
+            )
+            start = time.perf_counter()
+            counts = pipeline.run(data_dir, {pdf_file: file_hash(args.pdf)})
+            total = time.perf_counter() - start
+
+        stages["pipeline"].append(total * 1000)
+        runs.append({
+            "pages": counts["pages"],
+            "chunks": counts["chunks"],
+            "seconds": round(total, 3),
+            "pages_per_s": round(counts["pages"] / total, 2),
+            "chunks_per_s": round(counts["chunks"] / total, 2)
+        })
+        print(f"📄 Run {run + 1}: {len(pages)} pages, {len(chunks)} chunks, pipeline {total:.2f}s")
+
+    return {
+        "pdf": args.pdf,
+        "pdf_workers": args.pdf_workers,
+        "batch_size": args.batch_size,
+        "runs": runs,
+        "pages_per_s": summarize([r["pages_per_s"] for r in runs])["p50"],
+        "chunks_per_s": summarize([r["chunks_per_s"] for r in runs])["p50"],
+        "stages_ms": {stage: summarize(samples) for stage, samples in stages.items()}
+    }
+
+
+# --- Regression check ---
+
+def compare(results, baseline, max_regression):
+    """Return the (suite, stage, old p95, new p95) entries that regressed"""
+    regressions = []
+    for suite in ("serve", "ingest"):
+        old_stages = (baseline.get(suite) or {}).get("stages_ms", {})
+        new_stages = (results.get(suite) or {}).get("stages_ms", {})
+        for stage, new in new_stages.items():
+            old = old_stages.get(stage)
+            if not old or not old.get("p95") or "p95" not in new:
+                continue
+            change = new["p95"] / old["p95"] - 1
+            marker = "❌" if change > max_regression else "  "
+            print(f"{marker} {suite}.{stage}: p95 {old['p95']} -> {new['p95']} ms ({change:+.1%})")
+            if change > max_regression:
+                regressions.append((suite, stage, old["p95"], new["p95"]))
+    return regressions
+
+
+def main():
+    args = parse_args()
+    results = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "settings": vars(args)
+    }
+    if args.suite in ("serve", "all"):
+        results["serve"] = bench_serve(args)
+    if args.suite in ("ingest", "all"):
+        results["ingest"] = bench_ingest(args)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"📊 Comparing with {args.baseline} (revision {baseline.get('revision')})")
+        if compare(results, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
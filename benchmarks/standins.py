@@ -0,0 +1,149 @@
+"""Offline stand-ins for the remote services, with simulated latency.
+
+Each latency is ``base_ms`` scaled by a random factor in [1 - jitter, 1 + jitter],
+drawn from a seeded generator so runs are repeatable.
+"""
+import time
+import random
+import asyncio
+import threading
+
+from langchain_core.embeddings import Embeddings, DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.config import EMBEDDING_DIM
+from src.vector_store import LocalVectorStore
+
+CANNED_ANSWER = (
+    "According to **Table 3a**, Qatar's central government recorded a fiscal surplus in 2023, "
+    "driven by LNG and investment income, while expenditure remained broadly stable. "
+    "Figure 3 shows the external sector remaining in surplus over the projection horizon."
+)
+
+
+class Latency:
+    def __init__(self, jitter=0.2, seed=0):
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def seconds(self, base_ms):
+        if base_ms <= 0:
+            return 0.0
+        with self._lock:
+            factor = 1 + self._random.uniform(-self.jitter, self.jitter)
+        return base_ms * factor / 1000
+
+    def sleep(self, base_ms):
+        time.sleep(self.seconds(base_ms))
+
+    async def asleep(self, base_ms):
+        await asyncio.sleep(self.seconds(base_ms))
+
+
+class SimulatedEmbeddings(Embeddings):
+    """Deterministic hash-seeded vectors; each call costs ``batch_ms + per_text_ms * len(texts)``"""
+
+    def __init__(self, batch_ms=5.0, per_text_ms=0.5, latency=None, dim=EMBEDDING_DIM):
+        self.batch_ms = batch_ms
+        self.per_text_ms = per_text_ms
+        self.latency = latency or Latency()
+        self._fake = DeterministicFakeEmbedding(size=dim)
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        self.latency.sleep(self.batch_ms + self.per_text_ms * len(texts))
+        return self._fake.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class SimulatedVectorStore(LocalVectorStore):
+    """In-memory LocalVectorStore that pays a simulated network round-trip per call, like Pinecone"""
+
+    def __init__(self, embedding, search_ms=40.0, fetch_ms=20.0, upsert_ms=80.0, latency=None, **kwargs):
+        super().__init__(index_dir=None, embedding=embedding, **kwargs)
+        self.search_ms = search_ms
+        self.fetch_ms = fetch_ms
+        self.upsert_ms = upsert_ms
+        self.latency = latency or Latency()
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        self.latency.sleep(self.upsert_ms)
+        return super().add_embeddings(texts, embeddings, metadatas=metadatas, ids=ids)
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        self.latency.sleep(self.search_ms)
+        return super().similarity_search_by_vector_with_score(embedding, k=k, filter=filter, **kwargs)
+
+    def get_by_ids(self, ids):
+        if ids:
+            self.latency.sleep(self.fetch_ms)
+        return super().get_by_ids(ids)
+
+
+class SimulatedChatModel(BaseChatModel):
+    """Streams a canned answer word by word: ``ttft_ms`` before the first token, then ``token_ms`` per token.
+
+    Reports usage_metadata like the real OpenRouter model.
+    """
+
+    response: str = CANNED_ANSWER
+    ttft_ms: float = 300.0
+    token_ms: float = 10.0
+    latency: Latency = None
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    @property
+    def _llm_type(self):
+        return "simulated"
+
+    def _tokens(self):
+        words = self.response.split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def _usage(self, messages):
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        completion_tokens = len(self._tokens())
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+    def _latency(self):
+        if self.latency is None:
+            self.latency = Latency()
+        return self.latency
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        latency = self._latency()
+        latency.sleep(self.ttft_ms + self.token_ms * (len(self._tokens()) - 1))
+        message = AIMessage(content=self.response, usage_metadata=self._usage(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        latency = self._latency()
+        await latency.asleep(self.ttft_ms + self.token_ms * (len(self._tokens()) - 1))
+        message = AIMessage(content=self.response, usage_metadata=self._usage(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        latency = self._latency()
+        tokens = self._tokens()
+        for i, token in enumerate(tokens):
+            latency.sleep(self.ttft_ms if i == 0 else self.token_ms)
+            usage = self._usage(messages) if i == len(tokens) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        latency = self._latency()
+        tokens = self._tokens()
+        for i, token in enumerate(tokens):
+            await latency.asleep(self.ttft_ms if i == 0 else self.token_ms)
+            usage = self._usage(messages) if i == len(tokens) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
@@ -0,0 +1,88 @@
+"""Evaluate retrieval (and optionally answers) on a labelled query set.
+
+Runs the app's real pipeline (same index, settings and components as
+app.py) over every query concurrently, caches each result per query and
+pipeline config in evaluation/results.sqlite, and reports recall@k, MRR,
+context/fact recall and latency percentiles. Interrupted runs resume;
+sweeps only run the configs and queries not seen before.
+
+    python evaluate.py                                    # retrieval only, no LLM calls
+    python evaluate.py --k 4,8,12 --token-budget 1000,1500
+    python evaluate.py --mode answer --concurrency 4      # end to end through the LLM
+    python evaluate.py --label chunk_size=800             # tag results of an index build
+"""
+import os
+import json
+import argparse
+import itertools
+
+from dotenv import load_dotenv
+
+# src.config and app.py read this at import: build nothing until the overrides below are in place
+os.environ["LAZY_STARTUP"] = "1"
+
+from src.evaluation import RAGEvaluator, load_query_set
+
+load_dotenv()
+
+parser = argparse.ArgumentParser(description="Evaluate the RAG pipeline on a labelled query set")
+parser.add_argument("--queries", default=os.path.join("benchmarks", "labelled_queries.jsonl"))
+parser.add_argument("--mode", choices=["retrieval", "answer"], default="retrieval")
+parser.add_argument("--k", help="comma-separated RAG_TOP_K values to sweep")
+parser.add_argument("--token-budget", help="comma-separated CONTEXT_TOKEN_BUDGET values to sweep")
+parser.add_argument("--no-answer-cache", action="store_true", help="answer mode: bypass the answer cache")
+parser.add_argument("--concurrency", type=int, default=8)
+parser.add_argument("--recall-at", default="1,3,5,10", help="k values for recall@k")
+parser.add_argument("--label", action="append", default=[], help="key=value added to the config (and cache key)")
+parser.add_argument("--cache", default=os.path.join("evaluation", "results.sqlite"))
+parser.add_argument("--fresh", action="store_true", help="ignore and overwrite cached results")
+parser.add_argument("--output", default="evaluation_results.json")
+args = parser.parse_args()
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",")] if value else [None]
+
+
+import app as wsgi
+
+if args.mode == "retrieval":
+    # Retrieval runs never call the LLM, so no API key is needed
+    wsgi.components.override("chat_model", None)
+try:
+    pipeline = wsgi.get_rag_chain()
+except wsgi.PipelineUnavailable:
+    print("❌ Pipeline unavailable (is the index built? run store_index.py)")
+    exit(1)
+if args.no_answer_cache:
+    pipeline.cache = None
+
+queries = load_query_set(args.queries)
+labels = dict(label.split("=", 1) for label in args.label)
+evaluator = RAGEvaluator(pipeline, cache_path=args.cache, max_concurrency=args.concurrency,
+                         k_values=int_list(args.recall_at))
+print(f"📋 {len(queries)} labelled queries from {args.queries}")
+
+reports = []
+default_k, default_budget = pipeline.k, pipeline.context_builder.token_budget
+try:
+    for k, budget in itertools.product(int_list(args.k), int_list(args.token_budget)):
+        pipeline.k = k or default_k
+        pipeline.fetch_k = max(pipeline.fetch_k, pipeline.k)
+        pipeline.context_builder.token_budget = budget or default_budget
+
+        report = evaluator.run(queries, mode=args.mode, fresh=args.fresh, **labels)
+        reports.append(report)
+        metrics = report["metrics"]
+        print(f"✅ k={pipeline.k} budget={pipeline.context_builder.token_budget}: "
+              + "  ".join(f"{name}={value}" for name, value in metrics.items() if value is not None and name != "count")
+              + f"  p50={report['latency_ms'].get('p50')} ms  p99={report['latency_ms'].get('p99')} ms"
+              + f"  ({report['cached']} cached, {report['run']} run in {report['wall_s']} s)")
+        if report["errors"]:
+            print(f"⚠️  {len(report['errors'])} queries failed (retried on the next run)")
+finally:
+    evaluator.close()
+
+with open(args.output, "w", encoding="utf-8") as f:
+    json.dump(reports if len(reports) > 1 else reports[0], f, indent=2, ensure_ascii=False)
+print(f"📁 Report written to {args.output}")
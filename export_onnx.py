@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import argparse
+
+from src.config import EMBEDDING_MODEL, ONNX_MODEL_DIR
+from src.helper import SimplePDFProcessor, download_hugging_face_embeddings
+from src.onnx_embeddings import OnnxEmbeddings, export_quantized_model, parity_check
+
+# Build the int8 ONNX embedding model (EMBEDDING_BACKEND=onnx) and check it against
+# the PyTorch model. Needs torch + transformers + onnxruntime + tokenizers; the
+# serving image then only needs onnxruntime + tokenizers.
+parser = argparse.ArgumentParser(description="Export and verify the quantized ONNX embedding model")
+parser.add_argument("--output", default=ONNX_MODEL_DIR)
+parser.add_argument("--skip-export", action="store_true", help="only run the parity check")
+parser.add_argument("--samples", type=int, default=256, help="document chunks to compare")
+parser.add_argument("--min-cosine", type=float, default=0.99)
+args = parser.parse_args()
+
+if not args.skip_export:
+    print(f"📦 Exporting {EMBEDDING_MODEL} to {args.output}...")
+    path = export_quantized_model(EMBEDDING_MODEL, args.output)
+    print(f"✅ Quantized model: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+# Compare on real chunks from data/ (plus a few short query-like texts)
+processor = SimplePDFProcessor()
+texts = [
+    "What was Qatar's fiscal balance in 2023?",
+    "Explain Figure 3",
+    "LNG production expansion outlook",
+    "inflation",
+]
+for chunk in processor.iter_split(processor.iter_pdf_pages("data/")):
+    if len(texts) >= args.samples:
+        break
+    texts.append(chunk["text"])
+
+reference = download_hugging_face_embeddings()
+candidate = OnnxEmbeddings(args.output)
+
+
+def throughput(model):
+    model.embed_documents(texts[:8])  # warm up
+    start = time.perf_counter()
+    model.embed_documents(texts)
+    bulk = len(texts) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for text in texts[:32]:
+        model.embed_query(text)
+    query_ms = (time.perf_counter() - start) * 1000 / min(32, len(texts))
+    return bulk, query_ms
+
+
+report = parity_check(reference, candidate, texts)
+print(f"🔍 Parity over {report['texts']} texts: min cosine {report['min_cosine']}, "
+      f"mean {report['mean_cosine']}, top-5 neighbour overlap {report['top5_overlap']}")
+
+for name, model in [("pytorch fp32", reference), ("onnx int8", candidate)]:
+    bulk, query_ms = throughput(model)
+    print(f"⏱️ {name}: {bulk:.0f} chunks/s bulk, {query_ms:.2f} ms per query")
+
+if report["min_cosine"] < args.min_cosine:
+    print(f"❌ Parity check failed: min cosine {report['min_cosine']} < {args.min_cosine}")
+    sys.exit(1)
+print("✅ Parity check passed")
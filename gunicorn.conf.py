@@ -0,0 +1,93 @@
+"""Gunicorn settings for fast cold starts.
+
+The app is imported once in the master (preload_app), which loads the
+embedding model and local indexes a single time; forked workers share those
+pages copy-on-write instead of each loading a private copy. Remote clients
+(Pinecone, the LLM HTTP pools) are not fork-safe, so each worker builds and
+warms them in a background thread right after fork. /ready reports progress;
+/live is the liveness probe.
+
+    gunicorn app:app                                       # Flask (sync)
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app     # async
+"""
+import gc
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault("PRELOAD_MODELS", "1")
+PORT = os.getenv("PORT", "7860")
+# Workers share /metrics totals through per-process snapshot files (src/metrics.py); one
+# directory per port, since on_starting clears it and another instance may be running
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), f"rag-metrics-{PORT}"))
+METRICS_OWNER_FILE = "master.pid"
+
+bind = f"0.0.0.0:{PORT}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# More threads than LLM slots (LLM_MAX_CONCURRENCY): cache/table hits keep flowing while the
+# LLM is saturated, and excess questions are queued or shed by the app instead of piling up
+# in the accept backlog until the worker timeout
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+preload_app = True
+# Workers no longer load the model themselves, but slow LLM requests still need
+# the long timeout the deploy commands used to pass (--timeout 200)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "200"))
+
+
+def metrics_dir_owner(metrics_dir):
+    """PID of the running gunicorn master that claimed ``metrics_dir``, or None"""
+    owner = None
+    try:
+        with open(os.path.join(metrics_dir, METRICS_OWNER_FILE), encoding="utf-8") as f:
+            owner = int(f.read())
+        os.kill(owner, 0)
+    except PermissionError:
+        return owner  # alive, under another user
+    except (OSError, ValueError):
+        return None  # unclaimed, or its master has exited
+    return owner
+
+
+def on_starting(server):
+    metrics_dir = os.environ["METRICS_DIR"]
+    owner = metrics_dir_owner(metrics_dir)
+    if owner is not None:
+        raise RuntimeError(f"METRICS_DIR {metrics_dir} is in use by gunicorn master {owner}; set another METRICS_DIR")
+
+    # Counters restart from zero with the server, like any Prometheus target
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    with open(os.path.join(metrics_dir, METRICS_OWNER_FILE), "w", encoding="utf-8") as f:
+        f.write(str(os.getpid()))
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the GC's reach: collections would
+    # otherwise touch (and copy) every shared page in each worker
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+
+    # Before any worker thread exists, so the render processes fork cleanly
+    app.page_renderer.start()
+    app.components.warmup()
+    app.health_prober.start()
+    app.metrics_registry.start_writer()
+
+
+def worker_exit(server, worker):
+    # Last samples since the previous periodic snapshot
+    import app
+
+    if app.metrics_registry.metrics_dir:
+        app.metrics_registry.write_snapshot()
+
+
+def child_exit(server, worker):
+    # Runs in the master: keep the dead worker's totals, but not under its PID,
+    # which a new worker may be handed
+    import app
+
+    app.metrics_registry.mark_process_dead(worker.pid)
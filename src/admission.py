@@ -0,0 +1,318 @@
+import math
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from src.metrics import COALESCED, SHED
+
+
+class Overloaded(Exception):
+    """A request shed by admission control: 429 when the wait queue is full, 503 after waiting too long"""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(f"Server is overloaded ({reason}), retry in {retry_after}s")
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Abandoned(Exception):
+    """The leader of a coalesced call went away (client disconnect) before finishing"""
+
+
+class Broadcast:
+    """The events of one running stream, delivered to each follower from the first as they arrive.
+
+    Safe to read from threads (``events``) and asyncio tasks (``aevents``)
+    alike; a follower that joins late catches up on what was already sent.
+    """
+
+    def __init__(self):
+        self.followers = 0  # guarded by the owning SingleFlight's lock
+        self.drain = None  # task finishing the stream after an async leader was cancelled
+        self._events = []
+        self._done = False
+        self._error = None
+        self._waiters = []
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        with self._lock:
+            self._events.append(event)
+            waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            waiter.set_result(None)
+
+    def close(self, error=None):
+        with self._lock:
+            self._done = True
+            self._error = error
+            waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            waiter.set_result(None)
+
+    def _poll(self, index):
+        # (events from index on, finished, error) or a future resolved by the next publish/close
+        with self._lock:
+            if index < len(self._events) or self._done:
+                return self._events[index:], self._done, self._error, None
+            waiter = Future()
+            self._waiters.append(waiter)
+            return [], False, None, waiter
+
+    def events(self):
+        index = 0
+        while True:
+            events, done, error, waiter = self._poll(index)
+            if waiter is not None:
+                waiter.result()
+                continue
+            yield from events
+            index += len(events)
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+    async def aevents(self):
+        index = 0
+        while True:
+            events, done, error, waiter = self._poll(index)
+            if waiter is not None:
+                await asyncio.wrap_future(waiter)
+                continue
+            for event in events:
+                yield event
+            index += len(events)
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """In-flight deduplication: identical concurrent calls share one execution.
+
+    The first caller for a key becomes the leader and runs the work; callers
+    arriving while it is still running wait for the leader's result (or
+    error) instead of starting their own. Streamed calls are shared through
+    a ``Broadcast``, so followers get each event as the leader produces it.
+    Nothing is kept once the call ends; the answer cache covers later repeats.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def join(self, key):
+        """Return (future, is_leader); the leader must ``finish`` the key"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                COALESCED.inc()
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def finish(self, key, result=None, error=None):
+        with self._lock:
+            future = self._calls.pop(key, None)
+        if future is None:
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def join_stream(self, key):
+        """Return (broadcast, is_leader); the leader publishes to the broadcast and must ``finish_stream``"""
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is not None:
+                # Not decremented when a follower leaves early; the leader just finishes for nobody
+                broadcast.followers += 1
+                self.coalesced += 1
+                COALESCED.inc()
+                return broadcast, False
+            broadcast = self._streams[key] = Broadcast()
+            return broadcast, True
+
+    def finish_stream(self, key, error=None):
+        with self._lock:
+            broadcast = self._streams.pop(key, None)
+        if broadcast is not None:
+            broadcast.close(error)
+
+    def abandon_stream(self, key):
+        """The leader's client went away: True if followers are waiting, and the leader must
+        finish the stream for them; otherwise the key is dropped"""
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is None or broadcast.followers:
+                return broadcast is not None
+            del self._streams[key]
+        broadcast.close(Abandoned())
+        return False
+
+    def do(self, key, fn):
+        """Run ``fn()`` once per key among concurrent callers; returns (result, shared)"""
+        future, leader = self.join(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+        except Exception as e:
+            self.finish(key, error=e)
+            raise
+        except BaseException:
+            self.finish(key, error=Abandoned())
+            raise
+        self.finish(key, result=result)
+        return result, False
+
+    async def ado(self, key, coro_fn):
+        """Async ``do``: followers await the leader without blocking the event loop"""
+        future, leader = self.join(key)
+        if not leader:
+            return await asyncio.wrap_future(future), True
+        try:
+            result = await coro_fn()
+        except Exception as e:
+            self.finish(key, error=e)
+            raise
+        except BaseException:
+            # Cancelled (client went away): followers run the question themselves
+            self.finish(key, error=Abandoned())
+            raise
+        self.finish(key, result=result)
+        return result, False
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls) + len(self._streams), "coalesced": self.coalesced}
+
+
+class _Waiter:
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+
+class AdmissionController:
+    """Bounded concurrency with a bounded FIFO wait queue, shared by threads and asyncio tasks.
+
+    At most ``max_concurrent`` holders run at once and at most ``max_queue``
+    more wait, each for up to ``queue_timeout`` seconds. Anything beyond that
+    is rejected immediately with ``Overloaded``, so waiting time stays bounded
+    under bursts instead of growing until the worker timeout. A released slot
+    is handed straight to the oldest waiter. ``Retry-After`` is estimated from
+    the average time a slot is held.
+    """
+
+    def __init__(self, max_concurrent=4, max_queue=8, queue_timeout=10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._active = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        # Seconds a slot is held (one LLM call), smoothed
+        self._hold_time = 2.0
+
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "queue_timeout": 0}
+
+    def _retry_after(self):
+        waves = (len(self._waiters) + self.max_concurrent) / self.max_concurrent
+        return max(1, math.ceil(self._hold_time * waves))
+
+    def _shed(self, status, reason):
+        self.shed[reason] += 1
+        SHED.inc(reason=reason)
+        return Overloaded(status, reason, self._retry_after())
+
+    def _enter(self, waiter):
+        """Take a free slot (True) or join the queue (False); called under the lock"""
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            raise self._shed(429, "queue_full")
+        self._waiters.append(waiter)
+        return False
+
+    def _leave_queue(self, waiter):
+        """Give up waiting: False if a slot was handed over meanwhile; called under the lock"""
+        if waiter.granted:
+            return False
+        self._waiters.remove(waiter)
+        return True
+
+    def acquire(self):
+        """Block until a slot is free; returns a ticket for ``release``"""
+        event = threading.Event()
+        waiter = _Waiter(event.set)
+        with self._lock:
+            if self._enter(waiter):
+                return time.monotonic()
+        if not event.wait(self.queue_timeout):
+            with self._lock:
+                if self._leave_queue(waiter):
+                    raise self._shed(503, "queue_timeout")
+        return time.monotonic()
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: ready.done() or ready.set_result(None))
+
+        waiter = _Waiter(wake)
+        with self._lock:
+            if self._enter(waiter):
+                return time.monotonic()
+        try:
+            await asyncio.wait_for(ready, self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if self._leave_queue(waiter):
+                    raise self._shed(503, "queue_timeout")
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = not self._leave_queue(waiter)
+            if granted:
+                self.release(time.monotonic())
+            raise
+        return time.monotonic()
+
+    def release(self, ticket):
+        with self._lock:
+            self._hold_time = 0.8 * self._hold_time + 0.2 * (time.monotonic() - ticket)
+            if self._waiters:
+                # Hand the slot over; _active stays the same
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                self.admitted += 1
+                waiter.wake()
+                return
+            self._active -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self._active,
+                "waiting": len(self._waiters),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "shed": dict(self.shed),
+                "avg_llm_s": round(self._hold_time, 3)
+            }
@@ -0,0 +1,152 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize_query(query):
+    """Case/punctuation/whitespace-insensitive form of a question"""
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return " ".join(query.split())
+
+
+def _numbers(query):
+    # "Figure 3" and "Figure 4" embed almost identically; never treat them as the same question
+    return frozenset(re.findall(r"\d+(?:\.\d+)?", query))
+
+
+class AnswerCache:
+    """Two-level answer cache in front of the RAG pipeline.
+
+    - exact: keyed on the normalized query text
+    - semantic: reuses an answer when the query embedding's cosine similarity
+      to a cached query is >= ``threshold`` (and both mention the same numbers)
+
+    Both levels share one LRU order with a TTL. Entries are dropped whenever
+    the index version file written by store_index.py changes.
+    """
+
+    def __init__(self, max_entries=512, ttl=3600, threshold=0.95, version_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version_path = version_path
+
+        self._entries = OrderedDict()  # normalized query -> entry
+        self._matrix = None            # stacked unit query vectors, rebuilt lazily
+        self._keys = []
+        self._lock = threading.Lock()
+        self._version = self._read_version()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    # --- Invalidation ---
+
+    def _read_version(self):
+        if not self.version_path:
+            return None
+        try:
+            return os.stat(self.version_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_version(self):
+        version = self._read_version()
+        if version != self._version:
+            self._version = version
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._matrix = None
+        self._keys = []
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _expired(self, entry, now):
+        return self.ttl is not None and now - entry["created"] > self.ttl
+
+    # --- Lookups ---
+
+    def get_exact(self, query):
+        """Exact-level lookup; does not count a miss (the semantic level may still hit)"""
+        key = normalize_query(query)
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, time.time()):
+                self._evict(key)
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry
+
+    def get_semantic(self, query, query_vector):
+        """Semantic-level lookup by cosine similarity of query embeddings"""
+        numbers = _numbers(query)
+        vector = np.asarray(query_vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+
+        with self._lock:
+            self._check_version()
+            if self._entries:
+                if self._matrix is None:
+                    self._keys = list(self._entries)
+                    self._matrix = np.stack([self._entries[k]["vector"] for k in self._keys])
+
+                now = time.time()
+                scores = self._matrix @ vector
+                for row in np.argsort(-scores):
+                    if scores[row] < self.threshold:
+                        break
+                    key = self._keys[row]
+                    entry = self._entries.get(key)
+                    if entry is None or self._expired(entry, now) or entry["numbers"] != numbers:
+                        continue
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    return entry
+
+            self.misses += 1
+            return None
+
+    def put(self, query, query_vector, answer, docs):
+        key = normalize_query(query)
+        vector = np.asarray(query_vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+
+        with self._lock:
+            self._entries[key] = {
+                "answer": answer,
+                "docs": docs,
+                "vector": vector,
+                "numbers": _numbers(query),
+                "created": time.time()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def _evict(self, key):
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    def stats(self):
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
@@ -1,34 +1,74 @@
 from typing import List, Dict, Any
+from urllib.parse import quote
 
 class CitationManager:
+    @staticmethod
+    def _metadata(doc) -> Dict:
+        # Handle both dictionary and Document object metadata
+        return getattr(doc, 'metadata', doc.get('metadata', {}) if isinstance(doc, dict) else {})
+
+    @staticmethod
+    def _label(e_type: str, page_val) -> str:
+        if e_type == "table":
+            return f"📊 Table on Page {page_val}"
+        elif e_type == "image":
+            return f"🖼️ Image on Page {page_val}"
+        return f"📄 Page {page_val}"
+
     @staticmethod
     def get_unique_sources(retrieved_docs: List) -> List[str]:
         """Generate clean, unique, and formatted citations"""
         unique_citations = set()
-        
+
         for doc in retrieved_docs:
-            # Handle both dictionary and Document object metadata
-            meta = getattr(doc, 'metadata', doc.get('metadata', {}) if isinstance(doc, dict) else {})
-            
+            meta = CitationManager._metadata(doc)
+
             if not meta:
                 continue
-            
+
             # Clean page numbers (removes .0)
             try:
                 page_val = int(float(meta.get("page", 0)))
             except:
                 page_val = "N/A"
-            
+
             e_type = meta.get("element_type", "text")
-            
-            if e_type == "table":
-                citation = f"📊 Table on Page {page_val}"
-            elif e_type == "image":
-                citation = f"🖼️ Image on Page {page_val}"
-            else:
-                citation = f"📄 Page {page_val}"
-            
-            unique_citations.add(citation)
-            
+            unique_citations.add(CitationManager._label(e_type, page_val))
+
         # Return sorted list for consistent UI display
-        return sorted(list(unique_citations))
\ No newline at end of file
+        return sorted(list(unique_citations))
+
+    @staticmethod
+    def get_visual_sources(retrieved_docs: List, page_index=None, limit: int = 6) -> List[Dict[str, Any]]:
+        """Page thumbnails for the cited pages (figure pages first), with links to
+        the full-size rendering, embedded images and the PDF page (see app.py routes)"""
+        pages = {}
+        for doc in retrieved_docs:
+            meta = CitationManager._metadata(doc)
+            try:
+                key = (meta["source"], int(float(meta["page"])))
+            except (KeyError, TypeError, ValueError):
+                continue
+            e_type = meta.get("element_type", "text")
+            # A table or figure chunk labels the page better than plain text
+            if key not in pages or pages[key] == "text":
+                pages[key] = e_type
+
+        visuals = []
+        for (source, page_val), e_type in pages.items():
+            entry = page_index.page(source, page_val) if page_index else {"figures": [], "images": []}
+            base = f"/pages/{quote(source)}/{page_val}"
+            visuals.append({
+                "source": source,
+                "page": page_val,
+                "label": f"{', '.join(entry['figures'])} · Page {page_val}" if entry["figures"]
+                         else CitationManager._label(e_type, page_val),
+                "thumbnail": f"{base}.png",
+                "image": f"{base}.png?size=large",
+                "images": [f"{base}/images/{n}.png" for n in range(len(entry["images"]))],
+                "pdf": f"/pdf/{quote(source)}#page={page_val}",
+                "has_figure": bool(entry["figures"] or entry["images"])
+            })
+
+        visuals.sort(key=lambda v: (not v["has_figure"], v["page"]))
+        return visuals[:limit]
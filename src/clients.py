@@ -0,0 +1,56 @@
+import os
+import httpx
+from langchain_openai import ChatOpenAI
+
+from src.config import INDEX_NAME
+
+# Keep-alive connection pool shared by every request in a worker process
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "64"))
+HTTP_LIMITS = httpx.Limits(
+    max_connections=HTTP_POOL_SIZE,
+    max_keepalive_connections=HTTP_POOL_SIZE,
+    keepalive_expiry=60
+)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+_http_client = None
+_async_http_client = None
+
+
+def get_http_client():
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    return _http_client
+
+
+def get_async_http_client():
+    global _async_http_client
+    if _async_http_client is None:
+        _async_http_client = httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    return _async_http_client
+
+
+def make_chat_model(**kwargs):
+    """ChatOpenAI (via OpenRouter) on the shared pooled sync and async HTTP clients"""
+    params = dict(
+        model="openai/gpt-4o-mini",
+        openai_api_base="https://openrouter.ai/api/v1",
+        openai_api_key=os.getenv("OPENROUTER_API_KEY"),
+        temperature=0.1,
+        max_tokens=800,
+        # Token usage on the last streamed chunk too (reported on /metrics)
+        stream_usage=True,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client()
+    )
+    params.update(kwargs)
+    return ChatOpenAI(**params)
+
+
+def make_pinecone_index(index_name=INDEX_NAME):
+    """Pinecone Index handle with a connection pool sized for concurrent searches"""
+    from pinecone import Pinecone
+
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"), pool_threads=HTTP_POOL_SIZE)
+    return pc.Index(index_name, pool_threads=HTTP_POOL_SIZE, connection_pool_maxsize=HTTP_POOL_SIZE)
@@ -0,0 +1,135 @@
+import os
+import time
+import threading
+
+
+class PerProcess:
+    """A value built on first use in each process, such as a background thread or thread pool.
+
+    Threads don't survive fork(): a gunicorn worker inherits the objects the
+    master built but none of their threads. So anything that owns threads is
+    created lazily, again in each forked process, and again whenever
+    ``alive(value)`` reports that the previous one has stopped.
+    """
+
+    def __init__(self, factory, alive=None):
+        self._factory = factory
+        self._alive = alive
+        self._value = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _current(self):
+        return self._pid == os.getpid() and (self._alive is None or self._alive(self._value))
+
+    def get(self):
+        if not self._current():
+            with self._lock:
+                if not self._current():
+                    self._value = self._factory()
+                    self._pid = os.getpid()
+        return self._value
+
+
+class ComponentRegistry:
+    """Named process-wide components built lazily, on first use or in a warmup thread.
+
+    Each component is registered with a zero-argument factory (and optionally
+    a ``warm`` callback, e.g. a dummy forward pass). ``preload`` builds
+    components synchronously, which the gunicorn master uses so forked
+    workers share them copy-on-write; ``warmup`` builds the rest in a
+    background thread so a worker can accept connections immediately.
+    ``override`` swaps in a ready-made instance (stand-ins for benchmarks).
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._warmers = {}
+        self._instances = {}
+        self._errors = {}
+        self._load_ms = {}
+        self._locks = {}
+        self._warming = set()
+
+    def register(self, name, factory, warm=None):
+        self._factories[name] = factory
+        self._warmers[name] = warm
+        self._locks[name] = threading.Lock()
+
+    def override(self, name, instance):
+        """Use ``instance`` for ``name`` instead of calling its factory"""
+        if name not in self._locks:
+            self.register(name, lambda: instance)
+        self._instances[name] = instance
+        self._errors.pop(name, None)
+
+    def get(self, name):
+        """Return the component, building it (or waiting for the warmup thread) if needed"""
+        if name in self._instances:
+            return self._instances[name]
+        with self._locks[name]:
+            if name not in self._instances:
+                start = time.perf_counter()
+                try:
+                    instance = self._factories[name]()
+                except Exception as e:
+                    # Not cached: the next get() retries (remote services may come back)
+                    self._errors[name] = e
+                    raise
+                self._load_ms[name] = round((time.perf_counter() - start) * 1000, 2)
+                self._errors.pop(name, None)
+                self._instances[name] = instance
+        return self._instances[name]
+
+    def peek(self, name):
+        """Return the component if it is already built, without triggering a load"""
+        return self._instances.get(name)
+
+    def error(self, name):
+        """The exception from the last failed build of ``name`` (None if it hasn't failed)"""
+        return self._errors.get(name)
+
+    def preload(self, names):
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                # Left unbuilt; workers retry it on first use
+                print(f"❌ Preload of {name} failed: {e}")
+
+    def warmup(self, names=None):
+        """Build (and warm) components in a background thread; returns the thread"""
+        names = list(self._factories) if names is None else list(names)
+        self._warming.update(names)
+        thread = threading.Thread(target=self._warm, args=(names,), name="component-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def _warm(self, names):
+        for name in names:
+            try:
+                instance = self.get(name)
+                if self._warmers[name] is not None and instance is not None:
+                    self._warmers[name](instance)
+                print(f"🔥 Warmed {name} ({self._load_ms.get(name, 0)} ms)")
+            except Exception as e:
+                print(f"❌ Warmup of {name} failed: {e}")
+            finally:
+                self._warming.discard(name)
+
+    def is_ready(self, name):
+        return name in self._instances and name not in self._warming
+
+    def status(self):
+        """{name: {"state": ready|warming|pending|failed, ...}} for the readiness endpoint"""
+        report = {}
+        for name in self._factories:
+            if name in self._errors:
+                report[name] = {"state": "failed", "error": str(self._errors[name])}
+            elif self.is_ready(name):
+                report[name] = {"state": "ready", "load_ms": self._load_ms.get(name)}
+            elif name in self._warming:
+                report[name] = {"state": "warming"}
+            else:
+                report[name] = {"state": "pending"}
+        return report
@@ -0,0 +1,87 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Vector store selection: "pinecone" (remote), "flat" (exact, NumPy) or "hnsw" (approximate, hnswlib)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "multimodal-rag-v2")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "index")
+
+# Incremental re-indexing state (kept locally for every backend)
+MANIFEST_PATH = os.path.join(LOCAL_INDEX_DIR, "manifest.json")
+EMBEDDING_CACHE_PATH = os.path.join(LOCAL_INDEX_DIR, "embedding_cache.sqlite")
+# BM25 inverted index built alongside the vectors (src/lexical_index.py)
+LEXICAL_INDEX_PATH = os.path.join(LOCAL_INDEX_DIR, "bm25.json")
+# Figure/Table/page number -> chunk ID map (src/reference_index.py)
+REFERENCE_INDEX_PATH = os.path.join(LOCAL_INDEX_DIR, "references.json")
+# Table cells (row x year) parsed from the PDFs (src/table_store.py)
+TABLE_STORE_PATH = os.path.join(LOCAL_INDEX_DIR, "tables.json")
+# Page -> figure captions and raster images, for visual citations (src/page_images.py)
+PAGE_IMAGE_INDEX_PATH = os.path.join(LOCAL_INDEX_DIR, "page_images.json")
+# Shard (namespace) per source PDF or per collection (src/shards.py): SHARD_BY = none | source | collection.
+# The map in use is written by store_index.py; collections.json lists {"collection": ["file.pdf", ...]}
+SHARD_BY = os.getenv("SHARD_BY", "none").lower()
+SHARD_MAP_PATH = os.path.join(LOCAL_INDEX_DIR, "shards.json")
+# Fan-out search: time each shard gets before results are returned without it, and threads per process
+SHARD_BUDGET_MS = float(os.getenv("SHARD_BUDGET_MS", "1000"))
+SHARD_MAX_WORKERS = int(os.getenv("SHARD_MAX_WORKERS", "16"))
+# Touched by store_index.py after every index change; caches watch it for invalidation
+INDEX_VERSION_PATH = os.path.join(LOCAL_INDEX_DIR, "VERSION")
+
+# Source PDFs (served at /pdf/<file>) and the on-demand page render cache
+DATA_DIR = os.getenv("DATA_DIR", "data")
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", os.path.join("cache", "pages"))
+COLLECTIONS_PATH = os.getenv("COLLECTIONS_PATH", os.path.join(DATA_DIR, "collections.json"))
+
+# Answer cache in front of the RAG pipeline (ANSWER_CACHE=0 disables it)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") != "0"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+# huggingface (PyTorch, full precision) | onnx (int8 graph on onnxruntime, see export_onnx.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join("models", "all-MiniLM-L6-v2-int8"))
+
+# Query-embedding micro-batching (src/embedding_service.py)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "2"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "1024"))
+
+# Retrieval: chunks sent to the LLM, and hybrid BM25 + dense fusion (HYBRID_SEARCH=0 disables)
+TOP_K = int(os.getenv("RAG_TOP_K", "12"))
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") != "0"
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", "20"))
+
+# Table/figure/page questions search only matching chunks (QUERY_FILTERS=0 disables) and keep fewer of them
+QUERY_FILTERS = os.getenv("QUERY_FILTERS", "1") != "0"
+FILTERED_TOP_K = int(os.getenv("FILTERED_TOP_K", "8"))
+
+# Prompt context packing (src/context_builder.py): token budget and MMR relevance/diversity trade-off
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+# Answer direct table lookups ("X in 2023") from the table store, skipping retrieval and the LLM
+TABLE_LOOKUP = os.getenv("TABLE_LOOKUP", "1") != "0"
+
+# /batch: questions accepted per request and LLM generations run concurrently per batch
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "200"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Identical concurrent questions share one pipeline run (SINGLEFLIGHT=0 disables)
+SINGLEFLIGHT = os.getenv("SINGLEFLIGHT", "1") != "0"
+# LLM admission control per worker: concurrent calls, bounded wait queue and max wait before a 503
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "8"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+
+# Set by gunicorn.conf.py: load local models/indexes in the master before forking workers
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "0") == "1"
+# Skip the import-time warmup; components are built on first use (benchmarks swap in stand-ins first)
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "0") == "1"
+
+# Background health checks behind /health and /ready (src/health.py)
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "15"))
@@ -0,0 +1,165 @@
+import re
+
+from src.lexical_index import tokenize
+
+TABLE_BLOCK = re.compile(r"\[TABLE_START\](.*?)(?:\[TABLE_END\]|$)", re.S)
+CHUNK_INDEX = re.compile(r"_c(\d+)$")
+# Overlapping neighbours share up to chunk_overlap (150) characters; ignore tiny coincidences
+MIN_OVERLAP = 20
+MAX_OVERLAP = 400
+# Lines shorter than this ("2023", "Total") are too generic to treat as duplicates
+MIN_DEDUPE_LINE = 25
+
+
+def _token_counter(encoding_name):
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(encoding_name)
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        # ~4 characters per token for English prose
+        return lambda text: (len(text) + 3) // 4
+
+
+def _chunk_index(doc):
+    match = CHUNK_INDEX.search(doc.metadata.get("chunk_id") or "")
+    return int(match.group(1)) if match else None
+
+
+def _overlap(left, right):
+    """Length of the longest suffix of ``left`` that is a prefix of ``right``"""
+    for size in range(min(len(left), len(right), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _normalize(line):
+    return " ".join(line.split()).lower()
+
+
+class ContextBuilder:
+    """Packs retrieved chunks into a prompt context under a token budget.
+
+    Chunks are picked by maximal marginal relevance (retrieval rank for
+    relevance, token-set Jaccard for redundancy), adjacent overlapping chunks
+    from the same page are stitched back together, lines and [TABLE_START]
+    blocks already in the context are dropped, and passages are added until
+    ``token_budget`` is reached. Returns the context and the chunks it uses,
+    so citations match what the LLM actually saw.
+    """
+
+    def __init__(self, token_budget=1500, mmr_lambda=0.7, encoding_name="o200k_base"):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.count_tokens = _token_counter(encoding_name)
+
+    def build(self, docs):
+        """Return (context string, docs used in the context)"""
+        if not docs:
+            return "", []
+
+        selected = self._mmr(docs)
+        seen_lines = set()
+        parts = []
+        used = []
+        tokens = 0
+        for group in self._merge(selected):
+            text = self._dedupe(self._stitch(group), seen_lines)
+            if not text:
+                continue
+            cost = self.count_tokens(text) + 2
+            if tokens + cost > self.token_budget:
+                # A smaller later passage may still fit
+                continue
+            tokens += cost
+            parts.append(text)
+            used.extend(group)
+
+        if not parts:
+            # Always give the LLM something: the top chunk cut to the budget
+            top = docs[0]
+            return top.page_content[:self.token_budget * 4], [top]
+        return "\n\n".join(parts), used
+
+    def _mmr(self, docs):
+        """Reorder docs by maximal marginal relevance, dropping near-duplicates"""
+        n = len(docs)
+        terms = [set(tokenize(doc.page_content)) for doc in docs]
+        # Input order is the retriever's ranking
+        relevance = [1.0 - i / n for i in range(n)]
+
+        remaining = list(range(n))
+        order = []
+        while remaining:
+            def score(i):
+                redundancy = max((_jaccard(terms[i], terms[j]) for j in order), default=0.0)
+                return self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * redundancy
+
+            best = max(remaining, key=score)
+            remaining.remove(best)
+            if order and max(_jaccard(terms[best], terms[j]) for j in order) >= 0.9:
+                continue
+            order.append(best)
+        return [docs[i] for i in order]
+
+    def _merge(self, docs):
+        """Group runs of consecutive chunks of the same page, placed at the best-ranked member.
+
+        Runs are found in (source, page, chunk index) order, so c0, c2, c1
+        becomes one passage however the ranking interleaved them.
+        """
+        rank = {id(doc): i for i, doc in enumerate(docs)}
+        groups = []
+        by_page = {}
+        for doc in docs:
+            if _chunk_index(doc) is None:
+                groups.append([doc])
+            else:
+                by_page.setdefault((doc.metadata.get("source"), doc.metadata.get("page")), []).append(doc)
+        for page_docs in by_page.values():
+            page_docs.sort(key=_chunk_index)
+            run = [page_docs[0]]
+            for doc in page_docs[1:]:
+                if _chunk_index(doc) - _chunk_index(run[-1]) > 1:
+                    groups.append(run)
+                    run = []
+                run.append(doc)
+            groups.append(run)
+        return sorted(groups, key=lambda group: min(rank[id(doc)] for doc in group))
+
+    def _stitch(self, group):
+        text = group[0].page_content
+        for doc in group[1:]:
+            size = _overlap(text, doc.page_content)
+            text += ("" if size else "\n") + doc.page_content[size:]
+        return text
+
+    def _dedupe(self, text, seen_lines):
+        """Drop table blocks and lines that are already in the context"""
+        def table(match):
+            key = _normalize(match.group(1))
+            if key in seen_lines:
+                return ""
+            seen_lines.add(key)
+            return match.group(0)
+
+        text = TABLE_BLOCK.sub(table, text)
+        kept = []
+        for line in text.split("\n"):
+            key = _normalize(line)
+            if len(key) >= MIN_DEDUPE_LINE:
+                if key in seen_lines:
+                    continue
+                seen_lines.add(key)
+            kept.append(line)
+        text = "\n".join(kept).strip()
+        # A table whose rows were all duplicates leaves an empty marker pair
+        text = re.sub(r"\[TABLE_START\]\s*\[TABLE_END\]", "", text).strip()
+        return text
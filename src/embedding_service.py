@@ -0,0 +1,118 @@
+import time
+import queue
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+
+from src.components import PerProcess
+from src.metrics import EMBEDDING_QUERIES, EMBEDDING_BATCHES
+
+
+class BatchingEmbeddings(Embeddings):
+    """Query-embedding service that micro-batches concurrent callers.
+
+    ``embed_query`` calls from concurrent requests are queued; a background
+    thread collects up to ``max_batch_size`` of them (waiting at most
+    ``max_wait_ms`` after the first arrives), encodes them in one forward
+    pass with ``embed_documents`` and fans the vectors back out. Recent query
+    vectors are kept in an LRU. all-MiniLM-L6-v2 is symmetric, so query and
+    document encodings are identical.
+    """
+
+    def __init__(self, embeddings, max_batch_size=32, max_wait_ms=2, cache_size=1024):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+
+        self._queue = queue.Queue()
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._worker = PerProcess(self._start_worker, alive=threading.Thread.is_alive)
+
+        self.batches = 0
+        self.batched_queries = 0
+        self.cache_hits = 0
+
+    def _start_worker(self):
+        self._queue = queue.Queue()
+        worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        worker.start()
+        return worker
+
+    def _cached(self, text):
+        with self._lock:
+            vector = self._lru.get(text)
+            if vector is not None:
+                self._lru.move_to_end(text)
+                self.cache_hits += 1
+                EMBEDDING_QUERIES.inc(source="cache")
+            return vector
+
+    def _remember(self, text, vector):
+        with self._lock:
+            self._lru[text] = vector
+            self._lru.move_to_end(text)
+            while len(self._lru) > self.cache_size:
+                self._lru.popitem(last=False)
+
+    def submit(self, text):
+        """Queue one query for the next batch; returns a Future of its vector"""
+        future = Future()
+        vector = self._cached(text)
+        if vector is not None:
+            future.set_result(vector)
+            return future
+        self._worker.get()
+        self._queue.put((text, future))
+        return future
+
+    def embed_query(self, text):
+        return self.submit(text).result()
+
+    async def aembed_query(self, text):
+        return await asyncio.wrap_future(self.submit(text))
+
+    def embed_documents(self, texts):
+        # Bulk callers already batch; pass straight through
+        return self.embeddings.embed_documents(texts)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(texts, self.embeddings.embed_documents(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.batched_queries += len(batch)
+            EMBEDDING_BATCHES.inc()
+            EMBEDDING_QUERIES.inc(len(batch), source="batch")
+            for text, future in batch:
+                self._remember(text, vectors[text])
+                future.set_result(vectors[text])
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.batched_queries,
+            "avg_batch_size": round(self.batched_queries / self.batches, 2) if self.batches else 0.0,
+            "cache_hits": self.cache_hits
+        }
@@ -1,49 +1,358 @@
-
+import os
+import re
 import json
-from datetime import datetime
+import time
+import sqlite3
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from src.config import INDEX_VERSION_PATH, EMBEDDING_MODEL, EMBEDDING_BACKEND
+from src.lexical_index import doc_key
+
+
+def load_query_set(path):
+    """Labelled queries from a .jsonl file (one object per line) or a .json list.
+
+    Each query looks like::
+
+        {"query": "...", "expected_pages": [41], "expected_chunks": ["report.pdf_p41_c2"],
+         "expected_facts": ["11.9"], "source": "report.pdf", "type": "table", "id": "debt-2023"}
+
+    Only ``query`` is required; pages are matched within ``source`` when it is given.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            queries = [json.loads(line) for line in f if line.strip() and not line.startswith("#")]
+        else:
+            queries = json.load(f)
+    for i, query in enumerate(queries):
+        query.setdefault("id", str(i))
+    return queries
+
+
+def pipeline_config(pipeline, mode="retrieval", **extra):
+    """Everything that changes a pipeline's results; results are cached per config.
+
+    The index version (touched by every store_index.py run) stands in for
+    ingestion settings such as chunk size; ``extra`` labels anything else.
+    """
+    index_version = None
+    if os.path.exists(INDEX_VERSION_PATH):
+        with open(INDEX_VERSION_PATH, "r", encoding="utf-8") as f:
+            index_version = f.read().strip()
+    config = {
+        "mode": mode,
+        "k": pipeline.k,
+        "fetch_k": pipeline.fetch_k,
+        "hybrid": pipeline.lexical_index is not None,
+        "references": pipeline.reference_index is not None,
+        "table_lookup": pipeline.table_store is not None,
+        "query_filters": pipeline.query_filters,
+        "filtered_k": pipeline.filtered_k,
+        "shard_by": pipeline.shard_map.shard_by if pipeline.shard_map is not None else "none",
+        "token_budget": pipeline.context_builder.token_budget,
+        "mmr_lambda": pipeline.context_builder.mmr_lambda,
+        "embedding": f"{EMBEDDING_MODEL}:{EMBEDDING_BACKEND}",
+        "index_version": index_version
+    }
+    if mode == "answer":
+        config["answer_cache"] = pipeline.cache is not None
+    config.update(extra)
+    return config
+
+
+def config_key(config):
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def query_key(query):
+    return hashlib.sha1(query.encode("utf-8")).hexdigest()[:16]
+
+
+def summarize(samples):
+    """p50/p90/p99/mean/max of a list of millisecond samples"""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples, dtype=np.float64)
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 2),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p90": round(float(np.percentile(values, 90)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+        "max": round(float(values.max()), 2)
+    }
+
+
+def _normalize_fact(text):
+    # "11.9 %" / "11.9%" / "QR 1,234" compare equal to "11.9" / "1234"
+    return re.sub(r"(?<=\d),(?=\d{3})", "", " ".join(text.lower().split())).replace(" %", "%")
+
+
+class ResultCache:
+    """Per-config, per-query results in SQLite.
+
+    Doubles as the checkpoint: results are committed as they complete, so
+    an interrupted run resumes where it stopped and a repeated run of the
+    same config only pays for new queries.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results (config TEXT, query TEXT, result TEXT NOT NULL, "
+            "PRIMARY KEY (config, query))"
+        )
+        self._pending = 0
+
+    def load(self, config):
+        rows = self._conn.execute("SELECT query, result FROM results WHERE config = ?", (config,))
+        return {query: json.loads(result) for query, result in rows}
+
+    def put(self, config, query, result, commit_every=50):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO results (config, query, result) VALUES (?, ?, ?)",
+            (config, query, json.dumps(result, ensure_ascii=False))
+        )
+        self._pending += 1
+        if self._pending >= commit_every:
+            self.commit()
+
+    def commit(self):
+        self._conn.commit()
+        self._pending = 0
+
+    def clear(self, config):
+        self._conn.execute("DELETE FROM results WHERE config = ?", (config,))
+        self.commit()
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
 
 class RAGEvaluator:
-    def __init__(self, qa_system):
-        self.qa_system = qa_system
-        self.test_cases = [
-            {
-                "query": "What are the key findings in the executive summary?",
-                "type": "text",
-                "expected_keywords": ["summary", "findings", "conclusion"]
-            },
-            {
-                "query": "Show me data from any tables in the document",
-                "type": "table",
-                "expected_keywords": ["table", "data", "figure"]
-            },
-            {
-                "query": "What information is contained in the images?",
-                "type": "image",
-                "expected_keywords": ["image", "chart", "figure"]
-            }
-        ]
-    
-    def run_evaluation(self):
-        results = []
-        for test in self.test_cases:
-            response = self.qa_system.answer(test["query"])
-            
-            # Simple keyword check
-            keyword_score = 0
-            for keyword in test["expected_keywords"]:
-                if keyword.lower() in response.lower():
-                    keyword_score += 1
-            
-            results.append({
-                "query": test["query"],
-                "type": test["type"],
-                "response": response[:200],  # First 200 chars
-                "keyword_score": f"{keyword_score}/{len(test['expected_keywords'])}",
-                "timestamp": datetime.now().isoformat()
+    """Runs labelled query sets through a RAGPipeline and scores them.
+
+    ``mode="retrieval"`` embeds queries in batches and runs the pipeline's
+    search and context packing concurrently, without the LLM. ``mode="answer"``
+    runs ``pipeline.invoke`` end to end and also scores expected facts in the
+    answer. Results are cached per (pipeline config, query) in ``cache_path``,
+    so sweeps over k, context budget or index builds only run what is new.
+    Reports recall@k and MRR over the expected pages / chunk IDs, context
+    recall, fact recall and latency percentiles.
+    """
+
+    def __init__(self, pipeline, cache_path=os.path.join("evaluation", "results.sqlite"), max_concurrency=8,
+                 embed_batch_size=64, k_values=(1, 3, 5, 10)):
+        self.pipeline = pipeline
+        self.cache = ResultCache(cache_path)
+        self.max_concurrency = max_concurrency
+        self.embed_batch_size = embed_batch_size
+        self.k_values = k_values
+
+    # --- Running ---
+
+    @staticmethod
+    def _doc_record(doc):
+        meta = doc.metadata
+        try:
+            page = int(float(meta.get("page")))
+        except (TypeError, ValueError):
+            page = None
+        return {"chunk_id": doc_key(doc), "source": meta.get("source"), "page": page,
+                "element_type": meta.get("element_type", "text")}
+
+    def _retrieve(self, query, query_vector, embed_ms):
+        timings = {"embed_ms": embed_ms}
+        docs = self.pipeline.search(query, query_vector, timings)
+        with_context = time.perf_counter()
+        context, packed = self.pipeline.context_builder.build(docs)
+        timings["prompt_ms"] = round((time.perf_counter() - with_context) * 1000, 2)
+        timings["total_ms"] = round(sum(timings.values()), 2)
+        return {
+            "ranked": [self._doc_record(doc) for doc in docs],
+            "context": [doc_key(doc) for doc in packed],
+            "text": context,
+            "timings": timings
+        }
+
+    def _answer(self, query):
+        result = self.pipeline.invoke(query)
+        return {
+            "ranked": [self._doc_record(doc) for doc in result["docs"]],
+            "context": [doc_key(doc) for doc in result["docs"]],
+            "text": result["answer"],
+            "timings": result["timings"],
+            "cache": result["cache"]
+        }
+
+    def _submit_all(self, pool, todo, mode):
+        """Yield futures for every query, embedding retrieval queries one batch ahead of the searches"""
+        if mode == "answer":
+            for query in todo:
+                yield query, pool.submit(self._answer, query)
+            return
+        for start in range(0, len(todo), self.embed_batch_size):
+            batch = todo[start:start + self.embed_batch_size]
+            embed_start = time.perf_counter()
+            vectors = self.pipeline.embeddings.embed_documents(batch)
+            # Batched embedding time, shared out per query
+            embed_ms = round((time.perf_counter() - embed_start) * 1000 / len(batch), 2)
+            for query, vector in zip(batch, vectors):
+                yield query, pool.submit(self._retrieve, query, vector, embed_ms)
+
+    def run(self, queries, mode="retrieval", fresh=False, progress_every=500, **extra):
+        """Run (or resume) a query set under the pipeline's current settings and return the report"""
+        config = pipeline_config(self.pipeline, mode, **extra)
+        key = config_key(config)
+        if fresh:
+            self.cache.clear(key)
+
+        results = self.cache.load(key)
+        unique = list(dict.fromkeys(q["query"] for q in queries))
+        todo = [query for query in unique if query_key(query) not in results]
+        cached = len(unique) - len(todo)
+        print(f"🧪 Config {key}: {len(queries)} queries, {cached} cached, {len(todo)} to run ({mode})")
+
+        errors = {}
+        completed = 0
+        start = time.perf_counter()
+        pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="eval")
+        in_flight = {}
+
+        def collect(futures):
+            nonlocal completed
+            for future in futures:
+                query = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # Not cached, so a resumed run retries it
+                    errors[query] = str(e)
+                    continue
+                results[query_key(query)] = result
+                self.cache.put(key, query_key(query), result)
+                completed += 1
+                if progress_every and completed % progress_every == 0:
+                    print(f"   ...{completed}/{len(todo)} ({completed / (time.perf_counter() - start):.1f} queries/s)")
+
+        try:
+            for query, future in self._submit_all(pool, todo, mode):
+                in_flight[future] = query
+                # Bounded look-ahead: at most a few batches queued at a time
+                if len(in_flight) >= self.max_concurrency * 4:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(finished)
+            collect(wait(in_flight)[0])
+        finally:
+            # Keep everything finished so far (Ctrl-C included); the rest runs on resume
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.cache.commit()
+
+        wall_s = time.perf_counter() - start
+        report = self.report(queries, results, config)
+        report.update({
+            "config_key": key,
+            "cached": cached,
+            "run": len(todo) - len(errors),
+            "errors": errors,
+            "wall_s": round(wall_s, 2),
+            "queries_per_s": round((len(todo) - len(errors)) / wall_s, 1) if todo and wall_s > 0 else None
+        })
+        return report
+
+    def run_evaluation(self, queries, output="evaluation_results.json", **kwargs):
+        """``run`` and write the report to ``output``"""
+        report = self.run(queries, **kwargs)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        return report
+
+    def close(self):
+        self.cache.close()
+
+    # --- Scoring ---
+
+    @staticmethod
+    def _targets(query):
+        return ([("chunk", c) for c in query.get("expected_chunks", [])]
+                + [("page", int(p)) for p in query.get("expected_pages", [])])
+
+    @staticmethod
+    def _covers(doc, target, source):
+        kind, value = target
+        if kind == "chunk":
+            return doc["chunk_id"] == value
+        return doc["page"] == value and (source is None or doc["source"] == source)
+
+    def score(self, query, result):
+        """Per-query metrics; None for metrics the query has no labels for"""
+        targets = self._targets(query)
+        source = query.get("source")
+        scores = {"first_hit_rank": None}
+
+        if targets:
+            ranked = result["ranked"]
+            for k in self.k_values:
+                covered = {t for t in targets for doc in ranked[:k] if self._covers(doc, t, source)}
+                scores[f"recall@{k}"] = len(covered) / len(targets)
+            first = next((rank for rank, doc in enumerate(ranked, 1)
+                          if any(self._covers(doc, t, source) for t in targets)), None)
+            scores["first_hit_rank"] = first
+            scores["mrr"] = 1.0 / first if first else 0.0
+            in_context = set(result["context"])
+            context = [doc for doc in ranked if doc["chunk_id"] in in_context]
+            scores["context_recall"] = len(
+                {t for t in targets for doc in context if self._covers(doc, t, source)}
+            ) / len(targets)
+
+        facts = query.get("expected_facts", [])
+        if facts:
+            text = _normalize_fact(result.get("text", ""))
+            scores["fact_recall"] = sum(_normalize_fact(fact) in text for fact in facts) / len(facts)
+        return scores
+
+    def _aggregate(self, scored):
+        metrics = [f"recall@{k}" for k in self.k_values] + ["mrr", "context_recall", "fact_recall"]
+        summary = {"count": len(scored)}
+        for metric in metrics:
+            values = [s[metric] for s in scored if s.get(metric) is not None]
+            summary[metric] = round(float(np.mean(values)), 4) if values else None
+        return summary
+
+    def report(self, queries, results, config):
+        per_query = []
+        stages = {}
+        for query in queries:
+            result = results.get(query_key(query["query"]))
+            if result is None:
+                continue
+            for stage, ms in result["timings"].items():
+                stages.setdefault(stage[:-3] if stage.endswith("_ms") else stage, []).append(ms)
+            per_query.append({
+                "id": query["id"],
+                "query": query["query"],
+                "type": query.get("type"),
+                **self.score(query, result),
+                "total_ms": result["timings"].get("total_ms"),
+                "cache": result.get("cache")
             })
-        
-        # Save results
-        with open("evaluation_results.json", "w") as f:
-            json.dump(results, f, indent=2)
-        
-        return results
\ No newline at end of file
+
+        by_type = {}
+        for row in per_query:
+            by_type.setdefault(row["type"] or "untyped", []).append(row)
+
+        return {
+            "config": config,
+            "queries": len(queries),
+            "answered": len(per_query),
+            "metrics": self._aggregate(per_query),
+            "by_type": {name: self._aggregate(rows) for name, rows in sorted(by_type.items())},
+            "latency_ms": summarize([row["total_ms"] for row in per_query if row["total_ms"] is not None]),
+            "stages_ms": {stage: summarize(values) for stage, values in sorted(stages.items())},
+            "per_query": per_query
+        }
@@ -0,0 +1,69 @@
+import time
+import threading
+
+from src.components import PerProcess
+
+
+class HealthProber:
+    """Runs health checks in a background thread and serves the cached result.
+
+    ``checks`` maps a name to a zero-argument callable returning a detail dict
+    (raise to report failure). Probes of /health and /ready only read the
+    last result, so they never make outbound calls themselves. A result older
+    than ``3 * interval`` is reported as stale, so a hung check shows up too.
+    """
+
+    def __init__(self, checks, interval=15.0, retry_interval=2.0):
+        self.checks = dict(checks)
+        self.interval = interval
+        # Failing checks (e.g. still warming up) are re-run sooner
+        self.retry_interval = min(retry_interval, interval)
+        self._results = {}
+        self._thread = PerProcess(self._start_thread, alive=threading.Thread.is_alive)
+
+    def start(self):
+        self._thread.get()
+
+    def _start_thread(self):
+        thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self):
+        while True:
+            self.run_checks()
+            all_ok = all(result["ok"] for result in self._results.values())
+            time.sleep(self.interval if all_ok else self.retry_interval)
+
+    def run_checks(self):
+        for name, check in self.checks.items():
+            start = time.perf_counter()
+            try:
+                result = {"ok": True, **(check() or {})}
+            except Exception as e:
+                result = {"ok": False, "error": str(e)}
+            result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            result["checked_at"] = time.time()
+            self._results[name] = result
+
+    def status(self):
+        """Last result of every check; never blocks on the checks themselves"""
+        self.start()
+        now = time.time()
+        report = {}
+        for name in self.checks:
+            result = self._results.get(name)
+            if result is None:
+                report[name] = {"ok": False, "state": "pending"}
+                continue
+            result = dict(result)
+            result["age_s"] = round(now - result.pop("checked_at"), 1)
+            if result["age_s"] > 3 * self.interval:
+                result["ok"] = False
+                result["state"] = "stale"
+            report[name] = result
+        return report
+
+    def healthy(self, names=None):
+        report = self.status()
+        return all(report[name]["ok"] for name in (names or report))
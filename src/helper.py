@@ -1,84 +1,192 @@
 import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pypdf import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 import re
 
+from src.config import EMBEDDING_BACKEND, ONNX_MODEL_DIR
+from src.page_images import image_refs
+
+# Pages handed to a worker per task in parallel mode
+PAGES_PER_TASK = 8
+
+
+def _parse_page(pdf_file, page_num, page_text):
+    """Apply the multi-modal heuristics to one page of extracted text"""
+    if not page_text.strip():
+        return None
+
+    # Heuristic for multi-modal elements
+    lines = page_text.split('\n')
+    table_content = ""
+    text_content = ""
+
+    for line in lines:
+        if (line.count('|') >= 2 or line.count('\t') >= 2 or
+            re.search(r'\d+\.?\d*\s*[%$€£]', line)):
+            table_content += line + "\n"
+        else:
+            text_content += line + "\n"
+
+    metadata = {
+        "source": pdf_file,
+        "page": int(page_num),  # Explicitly store as integer
+        "element_type": "text", # Default, will be refined in split
+        "has_tables": bool(table_content.strip()),
+        "has_images": bool(re.search(r'Figure|Chart|Graph', page_text, re.I))
+    }
+
+    content = text_content
+    if table_content.strip():
+        content += "\n[TABLE_START]\n" + table_content + "\n[TABLE_END]\n"
+
+    return {
+        "content": content,
+        "metadata": metadata
+    }
+
+
+def _iter_pages(task):
+    """Lazily extract pages [start, end) of one PDF"""
+    pdf_path, start, end = task
+    pdf_file = os.path.basename(pdf_path)
+    images_pdf = None
+    try:
+        with open(pdf_path, 'rb') as f:
+            reader = PdfReader(f)
+            end = min(end, len(reader.pages) + 1)
+            images_pdf = _open_for_images(pdf_path)
+
+            # Page numbers are 1-based so Page 1 is physically the first page
+            for page_num in range(start, end):
+                pdf_page = reader.pages[page_num - 1]
+                doc = _parse_page(pdf_file, page_num, pdf_page.extract_text() or "")
+                if doc:
+                    # Raster images for the page image index (not chunk metadata), numbered
+                    # by pdfium the same way /pages/<source>/<page>/images/<n>.png renders them
+                    doc["images"] = image_refs(images_pdf[page_num - 1]) if images_pdf is not None else []
+                    yield doc
+    except Exception as e:
+        print(f"❌ Error processing {pdf_file} (pages {start}-{end - 1}): {e}")
+        # Passed on to SimplePDFProcessor.failed so the file is not recorded as indexed
+        yield {"error": str(e), "metadata": {"source": pdf_file}}
+    finally:
+        if images_pdf is not None:
+            images_pdf.close()
+
+
+def _open_for_images(pdf_path):
+    """pypdfium2 document to list page images from, or None without the optional package"""
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        return None
+    return pdfium.PdfDocument(pdf_path)
+
+
+def _extract_pages(task):
+    """Extract a page range eagerly. Runs in worker processes."""
+    return list(_iter_pages(task))
+
+
 class SimplePDFProcessor:
-    def __init__(self):
-        pass
-        
-    def load_pdf_file(self, data_path):
-        """PDF extraction with absolute page numbering fix"""
-        all_docs = []
+    def __init__(self, workers=None):
+        # PDF_WORKERS > 1 spreads pages and files across a process pool
+        self.workers = workers if workers is not None else int(os.getenv("PDF_WORKERS", "1"))
+        # {pdf file: error} for files that failed to extract in the last iter_pdf_pages run
+        self.failed = {}
         
+    def load_pdf_file(self, data_path, pdf_files=None):
+        """PDF extraction with absolute page numbering fix.
+
+        ``pdf_files`` restricts extraction to the given file names (used for
+        incremental re-indexing); by default every PDF in ``data_path`` is read.
+        """
+        return list(self.iter_pdf_pages(data_path, pdf_files=pdf_files))
+
+    def iter_pdf_pages(self, data_path, pdf_files=None):
+        """Yield page dicts one at a time, in file name then page order.
+
+        With ``workers > 1`` page ranges are extracted in a process pool, with
+        at most ``2 * workers`` ranges in flight so memory stays bounded.
+        Files that fail to extract (in whole or in part) are listed in
+        ``self.failed``; pages read before the failure are still yielded.
+        """
+        self.failed = {}
         if not os.path.exists(data_path):
             print(f"Warning: {data_path} does not exist")
-            return all_docs
-            
-        for pdf_file in os.listdir(data_path):
-            if pdf_file.endswith('.pdf'):
-                pdf_path = os.path.join(data_path, pdf_file)
-                print(f"📄 Processing: {pdf_file}")
-                
-                try:
-                    with open(pdf_path, 'rb') as f:
-                        reader = PdfReader(f)
-                        
-                        # Use enumerate(..., 1) to ensure Page 1 is physically the first page
-                        for page_num, page in enumerate(reader.pages, 1):
-                            page_text = page.extract_text() or ""
-                            
-                            if not page_text.strip():
-                                continue
-                            
-                            # Heuristic for multi-modal elements
-                            lines = page_text.split('\n')
-                            table_content = ""
-                            text_content = ""
-                            
-                            for line in lines:
-                                if (line.count('|') >= 2 or line.count('\t') >= 2 or 
-                                    re.search(r'\d+\.?\d*\s*[%$€£]', line)):
-                                    table_content += line + "\n"
-                                else:
-                                    text_content += line + "\n"
-                            
-                            metadata = {
-                                "source": pdf_file,
-                                "page": int(page_num),  # Explicitly store as integer
-                                "element_type": "text", # Default, will be refined in split
-                                "has_tables": bool(table_content.strip()),
-                                "has_images": bool(re.search(r'Figure|Chart|Graph', page_text, re.I))
-                            }
-                            
-                            content = text_content
-                            if table_content.strip():
-                                content += "\n[TABLE_START]\n" + table_content + "\n[TABLE_END]\n"
-                            
-                            all_docs.append({
-                                "content": content,
-                                "metadata": metadata
-                            })
-                except Exception as e:
-                    print(f"❌ Error processing {pdf_file}: {e}")
-        
-        return all_docs
+            return
+
+        tasks = self._page_tasks(data_path, pdf_files)
+
+        if self.workers <= 1:
+            for task in tasks:
+                yield from self._collect(_iter_pages(task))
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for task in tasks:
+                pending.append(executor.submit(_extract_pages, task))
+                if len(pending) >= 2 * self.workers:
+                    yield from self._collect(pending.popleft().result())
+            while pending:
+                yield from self._collect(pending.popleft().result())
+
+    def _collect(self, pages):
+        """Pass pages through, recording extraction errors in ``self.failed``"""
+        for page in pages:
+            if "error" in page:
+                self.failed.setdefault(page["metadata"]["source"], page["error"])
+            else:
+                yield page
+
+    def _page_tasks(self, data_path, pdf_files=None):
+        """Yield (path, start, end) page-range tasks; one per file in serial mode"""
+        for pdf_file in sorted(os.listdir(data_path)):
+            if pdf_files is not None and pdf_file not in pdf_files:
+                continue
+            if not pdf_file.endswith('.pdf'):
+                continue
+
+            pdf_path = os.path.join(data_path, pdf_file)
+            print(f"📄 Processing: {pdf_file}")
+
+            if self.workers <= 1:
+                yield (pdf_path, 1, sys.maxsize)
+                continue
+
+            try:
+                with open(pdf_path, 'rb') as f:
+                    num_pages = len(PdfReader(f).pages)
+            except Exception as e:
+                print(f"❌ Error processing {pdf_file}: {e}")
+                self.failed[pdf_file] = str(e)
+                continue
+            for start in range(1, num_pages + 1, PAGES_PER_TASK):
+                yield (pdf_path, start, min(start + PAGES_PER_TASK, num_pages + 1))
 
     def text_split(self, documents, chunk_size=800, chunk_overlap=150):
         """Split documents while preserving page-specific metadata"""
+        return list(self.iter_split(documents, chunk_size, chunk_overlap))
+
+    def iter_split(self, documents, chunk_size=800, chunk_overlap=150):
+        """Lazily split an iterable of page dicts into chunk dicts"""
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             separators=["\n\n", "\n", " ", ""]
         )
         
-        chunks = []
         for doc in documents:
             split_texts = text_splitter.split_text(doc["content"])
             
             for i, text_chunk in enumerate(split_texts):
                 chunk_metadata = doc["metadata"].copy()
+                # Stable ID so re-indexing can upsert/delete individual chunks
+                chunk_metadata["chunk_id"] = f"{chunk_metadata['source']}_p{chunk_metadata['page']}_c{i}"
                 
                 # Determine element type for this specific chunk
                 if "[TABLE_START]" in text_chunk or re.search(r'Table \d+', text_chunk):
@@ -88,11 +196,25 @@ class SimplePDFProcessor:
                 else:
                     chunk_metadata["element_type"] = "text"
                 
-                chunks.append({
+                yield {
                     "text": text_chunk,
                     "metadata": chunk_metadata
-                })
-        return chunks
+                }
 
 def download_hugging_face_embeddings():
+    # Imported lazily so PDF worker processes don't pay for torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
     return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+
+
+def load_embedding_model(backend=None):
+    """Embedding model for the configured EMBEDDING_BACKEND (huggingface | onnx)"""
+    backend = backend or EMBEDDING_BACKEND
+    if backend == "onnx":
+        from src.onnx_embeddings import OnnxEmbeddings
+
+        return OnnxEmbeddings(ONNX_MODEL_DIR)
+    if backend == "huggingface":
+        return download_hugging_face_embeddings()
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
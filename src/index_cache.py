@@ -0,0 +1,139 @@
+import os
+import json
+import hashlib
+import sqlite3
+import numpy as np
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk embedding cache keyed by (model name, chunk text hash).
+
+    Backed by a single SQLite file so re-runs of store_index.py only pay for
+    chunks whose text has never been embedded with this model before.
+    """
+
+    def __init__(self, path, model_name):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.model_name = model_name
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text):
+        return f"{self.model_name}:{text_hash(text)}"
+
+    def get_many(self, texts):
+        """Return {text: vector} for every text already in the cache"""
+        found = {}
+        keys = {self._key(text): text for text in texts}
+        key_list = list(keys)
+        for i in range(0, len(key_list), 500):
+            batch = key_list[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            )
+            for key, blob in rows:
+                found[keys[key]] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, texts, vectors):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+            [(self._key(text), np.asarray(vector, dtype=np.float32).tobytes())
+             for text, vector in zip(texts, vectors)]
+        )
+        self._conn.commit()
+
+    def embed_documents(self, texts, embeddings):
+        """Embed texts, computing only cache misses with ``embeddings``"""
+        cached = self.get_many(texts)
+        missing = list(dict.fromkeys(text for text in texts if text not in cached))
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = embeddings.embed_documents(missing)
+            self.put_many(missing, vectors)
+            cached.update(zip(missing, vectors))
+
+        return [cached[text] for text in texts]
+
+    def close(self):
+        self._conn.close()
+
+
+class IndexManifest:
+    """Record of what is in the vector index, per source file and page.
+
+    Layout::
+
+        {"sources": {"report.pdf": {"file_hash": "...",
+                                    "pages": {"41": {"report.pdf_p41_c0": "<text hash>"}}}}}
+    """
+
+    def __init__(self, path, sources=None):
+        self.path = path
+        self.sources = sources or {}
+
+    @classmethod
+    def load(cls, path):
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(path, json.load(f).get("sources", {}))
+        return cls(path)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"sources": self.sources}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def is_unchanged(self, source, source_hash):
+        return self.sources.get(source, {}).get("file_hash") == source_hash
+
+    def chunk_ids(self, source):
+        pages = self.sources.get(source, {}).get("pages", {})
+        return {chunk_id for chunks in pages.values() for chunk_id in chunks}
+
+    def all_chunk_ids(self):
+        return {chunk_id for source in self.sources for chunk_id in self.chunk_ids(source)}
+
+    def start_source(self, source, source_hash):
+        """Reset a source before re-indexing it; returns its previous {chunk_id: text hash}"""
+        previous = {}
+        for page_chunks in self.sources.get(source, {}).get("pages", {}).values():
+            previous.update(page_chunks)
+        self.sources[source] = {"file_hash": source_hash, "pages": {}}
+        return previous
+
+    def restore_source(self, source, entry):
+        """Put back a source's entry as it was before start_source (None: it had none)"""
+        if entry is None:
+            self.sources.pop(source, None)
+        else:
+            self.sources[source] = entry
+
+    def add_chunk(self, chunk, chunk_hash=None):
+        metadata = chunk["metadata"]
+        pages = self.sources.setdefault(metadata["source"], {"file_hash": None, "pages": {}})["pages"]
+        pages.setdefault(str(metadata["page"]), {})[metadata["chunk_id"]] = chunk_hash or text_hash(chunk["text"])
+
+    def remove(self, source):
+        self.sources.pop(source, None)
@@ -0,0 +1,166 @@
+import queue
+import threading
+from collections import Counter
+
+from src.index_cache import text_hash
+
+_DONE = object()
+
+
+def batched(items, batch_size):
+    """Group an iterable into lists of at most ``batch_size`` items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class IngestionPipeline:
+    """Streaming PDF -> chunk -> embed -> upsert pipeline with bounded memory.
+
+    Pages are pulled lazily from ``SimplePDFProcessor.iter_pdf_pages`` and
+    split one at a time; only new or changed chunks (per the manifest) are
+    embedded, in fixed-size batches on the calling thread. A background
+    uploader drains a bounded queue, so embedding batch N+1 overlaps with
+    uploading batch N and at most ``queue_size`` batches are ever buffered.
+    """
+
+    def __init__(self, processor, manifest, embed_fn, upsert_fn, delete_fn,
+                 batch_size=64, queue_size=4, chunk_indexes=(), page_indexes=()):
+        self.processor = processor
+        self.manifest = manifest
+        # Side indexes (BM25Index, ReferenceIndex) kept in sync with the vector store
+        self.chunk_indexes = list(chunk_indexes)
+        # Whole-page indexes (TableStore, PageImageIndex): a re-processed source's pages are
+        # staged and swapped in only once the whole file has been read
+        self.page_indexes = list(page_indexes)
+        self.embed_fn = embed_fn
+        self.upsert_fn = upsert_fn
+        self.delete_fn = delete_fn
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+        self.stats = Counter()
+        self.element_types = Counter()
+        # {pdf file: error} for sources left as they were because extraction failed
+        self.failed = {}
+
+    def run(self, data_path, source_hashes):
+        """Re-index the given {pdf file: file hash} sources and return stats.
+
+        A source that fails to extract keeps its previous manifest entry and
+        chunks (none of its stale chunks are deleted), so the next run retries it;
+        the failures are left in ``self.failed``.
+        """
+        entries = {source: self.manifest.sources.get(source) for source in source_hashes}
+        previous = {
+            source: self.manifest.start_source(source, source_hash)
+            for source, source_hash in source_hashes.items()
+        }
+        seen_ids = {source: set() for source in source_hashes}
+        self.failed = {}
+
+        uploads = queue.Queue(maxsize=self.queue_size)
+        errors = []
+        uploader = threading.Thread(target=self._upload_worker, args=(uploads, errors), daemon=True)
+        uploader.start()
+
+        try:
+            changed = self._changed_chunks(data_path, list(source_hashes), previous, seen_ids)
+            for batch in batched(changed, self.batch_size):
+                vectors = self.embed_fn([chunk["text"] for chunk in batch])
+                self._put(uploads, ("upsert", batch, vectors), errors)
+
+            self.failed = dict(self.processor.failed)
+            for source in self.failed:
+                self.manifest.restore_source(source, entries.get(source))
+            for index in self.page_indexes:
+                for source in source_hashes:
+                    if source in self.failed:
+                        index.discard_source(source)
+                    else:
+                        index.commit_source(source)
+            stale_ids = sorted(
+                chunk_id
+                for source, chunk_hashes in previous.items() if source not in self.failed
+                for chunk_id in chunk_hashes
+                if chunk_id not in seen_ids[source]
+            )
+            # Chunks a failed source did not have before are dropped again; the
+            # ones it had are left for the retry to compare against
+            stale_ids += sorted(
+                chunk_id
+                for source in self.failed if source in previous
+                for chunk_id in seen_ids[source]
+                if chunk_id not in previous[source]
+            )
+            for index in self.chunk_indexes:
+                for chunk_id in stale_ids:
+                    index.remove(chunk_id)
+            for ids in batched(stale_ids, 1000):
+                self._put(uploads, ("delete", ids, None), errors)
+        finally:
+            uploads.put(_DONE)
+            uploader.join()
+
+        if errors:
+            raise errors[0]
+        return self.stats
+
+    def _changed_chunks(self, data_path, pdf_files, previous, seen_ids):
+        pages = self.processor.iter_pdf_pages(data_path, pdf_files=pdf_files)
+        for page in pages:
+            self.stats["pages"] += 1
+            source = page["metadata"]["source"]
+            for index in self.page_indexes:
+                index.stage_page(page)
+            for chunk in self.processor.iter_split([page]):
+                metadata = chunk["metadata"]
+                chunk_hash = text_hash(chunk["text"])
+                self.stats["chunks"] += 1
+                self.element_types[metadata["element_type"]] += 1
+
+                seen_ids[source].add(metadata["chunk_id"])
+                self.manifest.add_chunk(chunk, chunk_hash)
+                for index in self.chunk_indexes:
+                    index.add(metadata["chunk_id"], chunk["text"], metadata)
+                if previous.get(metadata["source"], {}).get(metadata["chunk_id"]) != chunk_hash:
+                    yield chunk
+
+    def _put(self, uploads, item, errors):
+        # Blocks while the uploader is behind; bail out early if it has died
+        while True:
+            if errors:
+                raise errors[0]
+            try:
+                uploads.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def _upload_worker(self, uploads, errors):
+        while True:
+            item = uploads.get()
+            if item is _DONE:
+                return
+            if errors:
+                continue
+            try:
+                action, payload, vectors = item
+                if action == "upsert":
+                    self.upsert_fn(
+                        ids=[chunk["metadata"]["chunk_id"] for chunk in payload],
+                        texts=[chunk["text"] for chunk in payload],
+                        vectors=vectors,
+                        metadatas=[chunk["metadata"] for chunk in payload]
+                    )
+                    self.stats["upserted"] += len(payload)
+                else:
+                    self.delete_fn(payload)
+                    self.stats["deleted"] += len(payload)
+            except Exception as e:
+                errors.append(e)
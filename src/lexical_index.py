@@ -0,0 +1,126 @@
+import os
+import re
+import math
+import json
+from collections import Counter
+from langchain_core.documents import Document
+
+from src.vector_store import matches_filter
+
+# Keeps exact tokens like "2023", "4", "3.5" and "vat" intact
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or show shows that the "
+    "this to was were what which with does do me tell explain".split()
+)
+
+
+def tokenize(text):
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 inverted index over the same chunks as the vector store.
+
+    Built incrementally by store_index.py and persisted as JSON next to the
+    vectors (postings plus chunk text/metadata), so lexical hits can be
+    returned as Documents without a vector-store round-trip.
+    """
+
+    def __init__(self, path, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.docs = {}       # chunk_id -> {"text", "metadata", "length"}
+        self.postings = {}   # term -> {chunk_id: term frequency}
+        self.total_length = 0
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        index = cls(path, **kwargs)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            index.docs = data["docs"]
+            index.postings = data["postings"]
+            index.total_length = sum(doc["length"] for doc in index.docs.values())
+        return index
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"docs": self.docs, "postings": self.postings}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, chunk_id, text, metadata):
+        """Index (or re-index) one chunk"""
+        self.remove(chunk_id)
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        self.docs[chunk_id] = {"text": text, "metadata": dict(metadata), "length": length}
+        self.total_length += length
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[chunk_id] = tf
+
+    def remove(self, chunk_id):
+        doc = self.docs.pop(chunk_id, None)
+        if doc is None:
+            return
+        self.total_length -= doc["length"]
+        for term in set(tokenize(doc["text"])):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def search(self, query, k=10, filter=None):
+        """Return [(Document, bm25 score)] for the top-k chunks (matching ``filter``, if given)"""
+        n = len(self.docs)
+        if n == 0:
+            return []
+        avg_length = self.total_length / n
+
+        scores = Counter()
+        allowed = {}  # chunk_id -> matches filter, evaluated once per chunk
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                if filter:
+                    if chunk_id not in allowed:
+                        allowed[chunk_id] = matches_filter(self.docs[chunk_id]["metadata"], filter)
+                    if not allowed[chunk_id]:
+                        continue
+                norm = self.k1 * (1 - self.b + self.b * self.docs[chunk_id]["length"] / avg_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return [
+            (Document(id=chunk_id, page_content=self.docs[chunk_id]["text"],
+                      metadata=dict(self.docs[chunk_id]["metadata"])), score)
+            for chunk_id, score in scores.most_common(k)
+        ]
+
+
+def doc_key(doc):
+    """Identity of a retrieved chunk across backends"""
+    return doc.metadata.get("chunk_id") or doc.id or doc.page_content
+
+
+def reciprocal_rank_fusion(ranked_lists, k=60):
+    """Fuse several ranked Document lists: score(d) = sum(1 / (k + rank))"""
+    scores = Counter()
+    docs = {}
+    for ranked in ranked_lists:
+        for rank, doc in enumerate(ranked, 1):
+            key = doc_key(doc)
+            scores[key] += 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key, _ in scores.most_common()]
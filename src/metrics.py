@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import glob
+import bisect
+import threading
+
+# Seconds; covers a cached answer (~1 ms) up to a slow LLM completion
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Each worker writes its samples here so any worker can serve the merged totals (set by gunicorn.conf.py)
+METRICS_DIR = os.getenv("METRICS_DIR")
+SNAPSHOT_INTERVAL = 5.0
+# Totals of exited workers, folded in by the gunicorn master (mark_process_dead)
+ARCHIVE_FILE = "archive.json"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_string(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels: ``errors.inc(endpoint="/get")``"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(key): value for key, value in self._values.items()}
+
+    @staticmethod
+    def merge(total, snapshot):
+        for key, value in snapshot.items():
+            total[key] = total.get(key, 0) + value
+
+    def render(self, merged):
+        lines = []
+        for key, value in sorted(merged.items()):
+            lines.append(f"{self.name}{_label_string(self.labelnames, json.loads(key))} {_format(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram (seconds by convention): ``latency.observe(0.12, stage="llm")``"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}   # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(key): list(series) for key, series in self._values.items()}
+
+    @staticmethod
+    def merge(total, snapshot):
+        for key, series in snapshot.items():
+            if key in total:
+                total[key] = [a + b for a, b in zip(total[key], series)]
+            else:
+                total[key] = list(series)
+
+    def render(self, merged):
+        lines = []
+        for key, series in sorted(merged.items()):
+            values = json.loads(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                labels = _label_string(self.labelnames, values, extra=[("le", _format(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_string(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text exposition format.
+
+    Recording is a dict update under a per-metric lock, so the hot path pays
+    microseconds. With ``METRICS_DIR`` set, every worker process writes its
+    samples to ``<pid>.json`` every few seconds and ``render`` sums all files,
+    so a scrape of any worker reports totals for the whole server. When a
+    worker exits its file is folded into ``archive.json`` and removed, like
+    prometheus_client's multiprocess mode, so a restarted worker (or one
+    reusing the PID) starts from zero without counters double-counting.
+    """
+
+    def __init__(self, metrics_dir=METRICS_DIR):
+        self.metrics_dir = metrics_dir
+        self._metrics = []
+        self._writer_pid = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    # --- Multi-process aggregation ---
+
+    def _snapshot_path(self, pid=None):
+        return os.path.join(self.metrics_dir, f"{pid or os.getpid()}.json")
+
+    def write_snapshot(self):
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        path = self._snapshot_path()
+        with self._write_lock:
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({metric.name: metric.snapshot() for metric in self._metrics}, f)
+            os.replace(path + ".tmp", path)
+
+    def _read(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def mark_process_dead(self, pid):
+        """Fold an exited worker's samples into the archive and drop its file (run by the gunicorn master)"""
+        if not self.metrics_dir:
+            return
+        path = self._snapshot_path(pid)
+        if not os.path.exists(path):
+            return
+        archive_path = os.path.join(self.metrics_dir, ARCHIVE_FILE)
+        archive = self._read(archive_path)
+        snapshot = self._read(path)
+        for metric in self._metrics:
+            merged = archive.setdefault(metric.name, {})
+            metric.merge(merged, snapshot.get(metric.name, {}))
+        with open(archive_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(archive, f)
+        os.replace(archive_path + ".tmp", archive_path)
+        os.remove(path)
+
+    def start_writer(self):
+        """Periodically persist this process's samples (no-op without METRICS_DIR)"""
+        if not self.metrics_dir or self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+            threading.Thread(target=self._write_loop, name="metrics-writer", daemon=True).start()
+
+    def _write_loop(self):
+        while True:
+            time.sleep(SNAPSHOT_INTERVAL)
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                print(f"⚠️ Could not write metrics snapshot: {e}")
+
+    def _merged(self):
+        merged = {metric.name: {} for metric in self._metrics}
+        if not self.metrics_dir:
+            for metric in self._metrics:
+                metric.merge(merged[metric.name], metric.snapshot())
+            return merged
+
+        # Fresh numbers for this worker; other workers are at most SNAPSHOT_INTERVAL behind.
+        # Exited workers live on in archive.json so counters never go backwards.
+        self.write_snapshot()
+        for path in glob.glob(os.path.join(self.metrics_dir, "*.json")):
+            snapshot = self._read(path)
+            for metric in self._metrics:
+                metric.merge(merged[metric.name], snapshot.get(metric.name, {}))
+        return merged
+
+    def render(self):
+        merged = self._merged()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render(merged[metric.name]))
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_LATENCY = registry.histogram(
+    "rag_stage_duration_seconds", "Time spent in each pipeline stage (embed, retrieve, prompt, llm, ttft, total)",
+    labelnames=("stage",)
+)
+LLM_TOKENS = registry.counter(
+    "rag_llm_tokens_total", "Prompt and completion tokens reported by the chat model", labelnames=("type",)
+)
+RETRIEVED_CHUNKS = registry.counter(
+    "rag_retrieved_chunks_total", "Chunks placed in the prompt context, by element_type", labelnames=("element_type",)
+)
+ANSWER_CACHE = registry.counter(
+    "rag_answer_cache_lookups_total", "Answer cache lookups by result (exact, semantic, miss)", labelnames=("result",)
+)
+EMBEDDING_QUERIES = registry.counter(
+    "rag_embedding_queries_total", "Query embeddings by source (batched forward pass or LRU hit)", labelnames=("source",)
+)
+EMBEDDING_BATCHES = registry.counter("rag_embedding_batches_total", "Forward passes run by the query batcher")
+COALESCED = registry.counter(
+    "rag_coalesced_requests_total", "Questions answered by joining an identical in-flight request"
+)
+SHED = registry.counter(
+    "rag_shed_requests_total", "Requests rejected by LLM admission control (queue_full, queue_timeout)",
+    labelnames=("reason",)
+)
+FILTERED_SEARCHES = registry.counter(
+    "rag_filtered_searches_total", "Searches narrowed by a query-intent metadata filter (table, figure, page)",
+    labelnames=("intent",)
+)
+SHARD_MISSES = registry.counter(
+    "rag_shard_misses_total", "Shards left out of a fan-out search (timeout, error)", labelnames=("shard", "reason")
+)
+REQUESTS = registry.counter("rag_requests_total", "Question requests by endpoint", labelnames=("endpoint",))
+ERRORS = registry.counter("rag_errors_total", "Failed question requests by endpoint", labelnames=("endpoint",))
+
+
+def record_request(timings, docs, cache_level=None, usage=None, cache_enabled=True):
+    """Record one answered question: stage latencies, context chunks, cache result and token usage"""
+    for key, ms in timings.items():
+        STAGE_LATENCY.observe(ms / 1000, stage=key[:-3] if key.endswith("_ms") else key)
+    for doc in docs:
+        RETRIEVED_CHUNKS.inc(element_type=doc.metadata.get("element_type", "unknown"))
+    if cache_enabled:
+        ANSWER_CACHE.inc(result=cache_level or "miss")
+    if usage:
+        LLM_TOKENS.inc(usage.get("input_tokens", 0), type="prompt")
+        LLM_TOKENS.inc(usage.get("output_tokens", 0), type="completion")
@@ -0,0 +1,139 @@
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+QUANTIZED_MODEL_FILE = "model_quantized.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+class OnnxEmbeddings(Embeddings):
+    """all-MiniLM-L6-v2 as an int8-quantized ONNX graph on onnxruntime.
+
+    Same interface and (within tolerance, see ``parity_check``) the same
+    vectors as the sentence-transformers model: token embeddings are
+    mean-pooled over the attention mask and L2-normalized. Needs only
+    ``onnxruntime`` and ``tokenizers`` at serving time, no torch. Texts are
+    sorted by length before batching so padding stays small during ingestion.
+    Build the model directory once with ``python export_onnx.py``.
+    """
+
+    def __init__(self, model_dir, batch_size=32, max_length=256, threads=None):
+        from tokenizers import Tokenizer
+
+        self.model_dir = model_dir
+        self.batch_size = batch_size
+        self.threads = threads if threads is not None else int(os.getenv("ONNX_THREADS", "0"))
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        # The graph bytes are read once (shared copy-on-write under a preloading
+        # gunicorn master); the session and its thread pool are created per process,
+        # since onnxruntime's threads do not survive fork()
+        with open(os.path.join(model_dir, QUANTIZED_MODEL_FILE), "rb") as f:
+            self._model_bytes = f.read()
+        self._session = None
+        self._session_pid = None
+
+    def _get_session(self):
+        if self._session is None or self._session_pid != os.getpid():
+            import onnxruntime as ort
+
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self._session = ort.InferenceSession(
+                self._model_bytes, sess_options=options, providers=["CPUExecutionProvider"]
+            )
+            self._input_names = {i.name for i in self._session.get_inputs()}
+            self._session_pid = os.getpid()
+        return self._session
+
+    def _encode(self, texts):
+        session = self._get_session()
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = session.run(None, inputs)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        vectors = [None] * len(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._encode([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def export_quantized_model(model_name, output_dir):
+    """Export a sentence-transformers checkpoint to ONNX and quantize its weights to int8.
+
+    Build-time only: needs torch, transformers and onnxruntime.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    # Writes tokenizer.json (the fast tokenizer) next to the graph
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    dynamic_axes = {"input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "token_type_ids": {0: "batch", 1: "sequence"},
+                    "last_hidden_state": {0: "batch", 1: "sequence"}}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+
+    quantized_path = os.path.join(output_dir, QUANTIZED_MODEL_FILE)
+    quantize_dynamic(fp32_path, quantized_path, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    return quantized_path
+
+
+def parity_check(reference, candidate, texts):
+    """Cosine similarity between two embedding models' vectors for the same texts"""
+    a = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    b = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    cosine = (a * b).sum(axis=1)
+
+    # Would the two models retrieve the same neighbours? Top-5 overlap per text
+    k = min(5, len(texts))
+    top_a = np.argsort(-(a @ a.T), axis=1)[:, :k]
+    top_b = np.argsort(-(b @ b.T), axis=1)[:, :k]
+    overlap = np.mean([len(set(x) & set(y)) / k for x, y in zip(top_a, top_b)])
+
+    return {
+        "texts": len(texts),
+        "min_cosine": round(float(cosine.min()), 4),
+        "mean_cosine": round(float(cosine.mean()), 4),
+        "top5_overlap": round(float(overlap), 4)
+    }
@@ -0,0 +1,245 @@
+import os
+import re
+import json
+import zlib
+import struct
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Rendered widths in pixels; a fixed set keeps the disk cache bounded
+PAGE_SIZES = {"thumb": 320, "large": 1024}
+# Smaller raster images are logos, bullets and rules, not figures
+MIN_IMAGE_PX = 100
+# Captions ("Text Figure 3. Indicators of ...", "Box 1. Figure 1. ..."), not in-text mentions ("(Figure 3)")
+FIGURE_CAPTION = re.compile(r"((?:Text\s+|Box\s+\d+\.\s+)?(?:Figure|Chart)\s+\d+[a-z]?)\.(?=\s+[A-Z])")
+
+# pdfium is not thread-safe, not even across documents, so renders run in worker processes
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+
+
+def figure_images(pdfium_page):
+    """Figure-sized raster images on a pypdfium2 page, in drawing order.
+
+    The one numbering of a page's images: ingestion records them in this
+    order and /pages/<source>/<page>/images/<n>.png renders the n-th.
+    Inline images and images inside form XObjects are included.
+    """
+    import pypdfium2.raw as pdfium_c
+
+    return [
+        image for image in pdfium_page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE])
+        if min(image.get_px_size()) >= MIN_IMAGE_PX
+    ]
+
+
+def image_refs(pdfium_page):
+    """Figure-sized raster images on a page, as [{"width", "height", "filter"}]"""
+    refs = []
+    for image in figure_images(pdfium_page):
+        width, height = image.get_px_size()
+        filters = image.get_filters()
+        refs.append({"width": int(width), "height": int(height), "filter": filters[0] if filters else ""})
+    return refs
+
+
+def encode_png(pixels):
+    """Encode an HxW (gray), HxWx3 (RGB) or HxWx4 (RGBA) uint8 array as PNG bytes"""
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+    height, width = pixels.shape[:2]
+    channels = 1 if pixels.ndim == 2 else pixels.shape[2]
+    color_type = {1: 0, 3: 2, 4: 6}[channels]
+
+    # Every scanline starts with filter type 0 (None)
+    raw = np.zeros((height, 1 + width * channels), dtype=np.uint8)
+    raw[:, 1:] = pixels.reshape(height, -1)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+class PageImageIndex:
+    """Page -> figure captions and raster images, built at ingestion.
+
+    Lets the app say which cited pages carry a figure (and link its
+    rendering) without opening the PDF at query time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sources = {}  # source -> {page (str): {"figures": [...], "images": [...]}}
+        self._staged = {}  # same, for sources being re-indexed; swapped in by commit_source
+
+    @classmethod
+    def load(cls, path):
+        index = cls(path)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                index.sources = json.load(f)
+        return index
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.sources, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return sum(len(pages) for pages in self.sources.values())
+
+    @staticmethod
+    def _entry(page):
+        figures = list(dict.fromkeys(" ".join(m.split()) for m in FIGURE_CAPTION.findall(page["content"])))
+        images = page.get("images", [])
+        return {"figures": figures, "images": images} if figures or images else None
+
+    def remove_source(self, source):
+        self.sources.pop(source, None)
+
+    def stage_page(self, page):
+        """Record a page of a source being re-indexed; its old pages stay until commit_source"""
+        metadata = page["metadata"]
+        pages = self._staged.setdefault(metadata["source"], {})
+        entry = self._entry(page)
+        if entry:
+            pages[str(metadata["page"])] = entry
+
+    def commit_source(self, source):
+        """Replace a source's pages with the ones staged for it"""
+        pages = self._staged.pop(source, {})
+        self.remove_source(source)
+        if pages:
+            self.sources[source] = pages
+
+    def discard_source(self, source):
+        self._staged.pop(source, None)
+
+    def page(self, source, page):
+        return self.sources.get(source, {}).get(str(page), {"figures": [], "images": []})
+
+
+def _open(pdf_path, source, page):
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(pdf_path)
+    if not 1 <= page <= len(pdf):
+        pdf.close()
+        raise LookupError(f"{source} has no page {page}")
+    return pdf
+
+
+def _render_page(pdf_path, source, page, width):
+    """PNG bytes of a 1-based page rendered ``width`` pixels wide. Runs in a render process."""
+    pdf = _open(pdf_path, source, page)
+    try:
+        pdf_page = pdf[page - 1]
+        bitmap = pdf_page.render(scale=width / pdf_page.get_width(), rev_byteorder=True)
+        return encode_png(bitmap.to_numpy())
+    finally:
+        pdf.close()
+
+
+def _render_image(pdf_path, source, page, number):
+    """PNG bytes of a page's ``number``-th figure image. Runs in a render process."""
+    pdf = _open(pdf_path, source, page)
+    try:
+        images = figure_images(pdf[page - 1])
+        if not 0 <= number < len(images):
+            raise LookupError(f"{source} page {page} has no image {number}")
+        # Rendered with its masks and color space applied, as BGRA
+        pixels = images[number].get_bitmap(render=True).to_numpy()
+        return encode_png(pixels[..., [2, 1, 0, 3]])
+    finally:
+        pdf.close()
+
+
+class PageRenderer:
+    """Renders PDF pages and their raster images on first request, cached as PNG files on disk.
+
+    Cache paths include the PDF's size and mtime, so a replaced PDF is
+    re-rendered. After ``start()`` renders run in a pool of ``RENDER_WORKERS``
+    processes with a lock per document, so different PDFs render in parallel
+    and a page is rendered once however many requests ask for it; without
+    it they run in this process, one at a time. Needs the optional
+    ``pypdfium2`` package.
+    """
+
+    def __init__(self, data_dir, cache_dir, workers=RENDER_WORKERS):
+        # Absolute, since Flask's send_file resolves relative paths against the app root
+        self.data_dir = os.path.abspath(data_dir)
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.workers = workers
+        self._locks = {}  # source -> lock held while one of its pages renders
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()  # serializes in-process renders
+        self._pool = None
+        self._pool_pid = None
+
+    def pdf_path(self, source):
+        """Path of a PDF in the data directory, or None (also for anything that isn't a plain file name)"""
+        if os.path.basename(source) != source or not source.lower().endswith(".pdf"):
+            return None
+        path = os.path.join(self.data_dir, source)
+        return path if os.path.isfile(path) else None
+
+    def _cache_path(self, source, name):
+        stat = os.stat(self.pdf_path(source))
+        version = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+        return os.path.join(self.cache_dir, f"{os.path.splitext(source)[0]}-{version}", name)
+
+    def start(self):
+        """Fork the render processes now, before this process starts any threads.
+
+        Called from gunicorn's post_fork (or at startup, ahead of the warmup):
+        forking while other threads run can leave a child holding a lock no
+        thread will release. fork, not spawn, since spawn re-imports the main
+        module (app.py and its warmup) in every render process.
+        """
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("fork"))
+        # A fork-context pool launches all of its processes on the first submit
+        self._pool.submit(os.getpid).result()
+        self._pool_pid = os.getpid()
+
+    def _render(self, render, source, *args):
+        # A pool started before a gunicorn fork belongs to the master, not to this worker
+        if self._pool is not None and self._pool_pid == os.getpid():
+            return self._pool.submit(render, self.pdf_path(source), source, *args).result()
+        with self._render_lock:
+            return render(self.pdf_path(source), source, *args)
+
+    def _document_lock(self, source):
+        with self._lock:
+            return self._locks.setdefault(source, threading.Lock())
+
+    def _cached(self, source, name, render, *args):
+        path = self._cache_path(source, name)
+        if os.path.exists(path):
+            return path
+        with self._document_lock(source):
+            # Another thread may have rendered it while we waited
+            if not os.path.exists(path):
+                data = self._render(render, source, *args)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+        return path
+
+    def page_image(self, source, page, size="thumb"):
+        """Path of a PNG rendering of a 1-based page at one of PAGE_SIZES"""
+        return self._cached(source, f"p{page}-{size}.png", _render_page, page, PAGE_SIZES[size])
+
+    def embedded_image(self, source, page, number):
+        """Path of a PNG of the page's ``number``-th (0-based) figure-sized raster image"""
+        return self._cached(source, f"p{page}-img{number}.png", _render_image, page, number)
@@ -0,0 +1,621 @@
+import time
+import asyncio
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from src.context_builder import ContextBuilder
+from src.lexical_index import reciprocal_rank_fusion, doc_key
+from src.vector_store import fetch_documents, batch_similarity_search
+from src.answer_cache import normalize_query
+from src.admission import Abandoned
+from src.query_intent import analyze_query
+from src.metrics import record_request, FILTERED_SEARCHES
+
+
+@contextmanager
+def timed(timings, stage):
+    """Record the wall-clock duration of a stage in milliseconds"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[f"{stage}_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+
+def message_text(message):
+    """Text of a chat model message or chunk (content may be a list of parts)"""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(part if isinstance(part, str) else part.get("text", "") for part in content)
+
+
+def _done(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _coalesced(result, start):
+    """A follower's copy of a shared result, timed from its own arrival"""
+    return {**result, "timings": {"total_ms": round((time.perf_counter() - start) * 1000, 2)},
+            "cache": "coalesced"}
+
+
+def _follow(events, start):
+    """A follower's view of a shared stream, timed from its own arrival"""
+    timings = {}
+    for kind, payload in events:
+        if kind == "token" and "ttft_ms" not in timings:
+            timings["ttft_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        elif kind == "timings":
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            payload = timings
+        yield kind, payload
+
+
+async def _afollow(events, start):
+    timings = {}
+    async for kind, payload in events:
+        if kind == "token" and "ttft_ms" not in timings:
+            timings["ttft_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        elif kind == "timings":
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            payload = timings
+        yield kind, payload
+
+
+class RAGPipeline:
+    """Single-pass RAG pipeline.
+
+    The query is embedded and searched exactly once; the same documents feed
+    both the prompt context and the citations returned to the caller. An
+    optional AnswerCache is consulted before embedding (exact match) and
+    again before the vector search (semantic match). With a BM25 ``lexical_index``
+    the dense and lexical candidate lists are fused by reciprocal rank. With a
+    ``reference_index``, chunks for explicit Figure/Table/page references are
+    fetched by ID and similarity search only fills the remaining slots. The
+    ``context_builder`` packs the retrieved chunks into a token budget; only
+    the chunks that make it into the prompt are returned as sources. With
+    ``query_filters``, table, figure and page-specific questions search only
+    the matching chunks (a metadata filter inside the vector and BM25
+    searches) and keep ``filtered_k`` chunks instead of ``k``. With a
+    ``shard_map`` (and a ShardedVectorStore), questions naming a document
+    search only its shards. A
+    ``table_store`` answers direct table-cell questions right after the exact
+    cache check, skipping embedding, retrieval and the LLM (``cache="table"``).
+
+    With a ``singleflight``, identical questions asked concurrently share one
+    run (``cache="coalesced"`` for the followers). With an ``admission``
+    controller, LLM calls take a slot first and may raise ``Overloaded``;
+    streams take theirs before the first event, so callers can still turn it
+    into an HTTP error status.
+    """
+
+    def __init__(self, embeddings, vector_store, chat_model, prompt_template, k=12, cache=None,
+                 lexical_index=None, fetch_k=20, reference_index=None, context_builder=None,
+                 table_store=None, singleflight=None, admission=None, query_filters=False, filtered_k=8,
+                 shard_map=None):
+        self.embeddings = embeddings
+        self.vector_store = vector_store
+        self.k = k
+        self.cache = cache
+        self.lexical_index = lexical_index
+        self.reference_index = reference_index
+        self.table_store = table_store
+        self.singleflight = singleflight
+        self.admission = admission
+        self.query_filters = query_filters
+        self.filtered_k = filtered_k
+        self.shard_map = shard_map
+        # Candidates pulled from each retriever before fusion
+        self.fetch_k = max(fetch_k, k)
+        self.context_builder = context_builder or ContextBuilder()
+        self.prompt = ChatPromptTemplate.from_template(prompt_template)
+        self.chat_model = chat_model
+
+    # --- Stages ---
+
+    def embed(self, question, timings):
+        with timed(timings, "embed"):
+            return self.embeddings.embed_query(question)
+
+    def _dense_k(self, k):
+        # Hybrid search pulls more dense candidates to fuse with BM25
+        return k if self.lexical_index is None else max(self.fetch_k, k)
+
+    def _vector_search(self, question, query_vector, k, dense=None, filter=None, shards=None):
+        # ``dense`` holds precomputed (doc, score) results, e.g. from a batched search
+        if dense is None:
+            scope = {"filter": filter} if shards is None else {"filter": filter, "shards": shards}
+            dense = self.vector_store.similarity_search_by_vector_with_score(
+                query_vector, k=self._dense_k(k), **scope
+            )
+        if self.lexical_index is None:
+            return [doc for doc, _score in dense[:k]]
+
+        # Hybrid: dense + BM25 candidates fused with reciprocal rank fusion
+        if shards is not None:
+            # One BM25 index covers every shard
+            in_shards = {"source": {"$in": self.shard_map.sources(shards)}}
+            filter = in_shards if filter is None else {"$and": [filter, in_shards]}
+        fetch_k = self._dense_k(k)
+        lexical = self.lexical_index.search(question, k=fetch_k, filter=filter)
+        return reciprocal_rank_fusion([
+            [doc for doc, _score in dense],
+            [doc for doc, _score in lexical]
+        ])[:k]
+
+    def _scope(self, question):
+        """(query intent, shards to search or None for all)"""
+        intent = analyze_query(question) if self.query_filters else {"intent": None, "filter": None}
+        shards = self.shard_map.select(question) if self.shard_map is not None else None
+        return intent, shards
+
+    def _search(self, question, query_vector, dense=None):
+        intent, shards = self._scope(question)
+        filter = intent["filter"]
+        # A filtered search ranks within a much smaller candidate set, so fewer chunks suffice
+        k = self.k if filter is None else min(self.k, self.filtered_k)
+
+        # Explicit "Figure 12" / "Table 3a" / "page 41" references are fetched directly
+        direct = []
+        if self.reference_index is not None:
+            sources = set(self.shard_map.sources(shards)) if shards is not None else None
+            chunk_ids = self.reference_index.lookup(question, limit=k, sources=sources)
+            direct = fetch_documents(self.vector_store, chunk_ids)
+        if len(direct) >= k:
+            return direct[:k]
+
+        # Similarity search only fills the remaining slots, within the metadata filter and shards
+        seen = {doc_key(doc) for doc in direct}
+        found = self._vector_search(question, query_vector, k, dense=dense, filter=filter, shards=shards)
+        found = [doc for doc in found if doc_key(doc) not in seen]
+        if filter is not None:
+            FILTERED_SEARCHES.inc(intent=intent["intent"])
+            if len(direct) + len(found) < k:
+                # Too few chunks match: top up from the whole index (or shards) rather than lose recall
+                seen.update(doc_key(doc) for doc in found)
+                found += [doc for doc in self._vector_search(question, query_vector, k, shards=shards)
+                          if doc_key(doc) not in seen]
+        return direct + found[:k - len(direct)]
+
+    def search(self, question, query_vector, timings):
+        with timed(timings, "retrieve"):
+            return self._search(question, query_vector)
+
+    def retrieve(self, question, timings=None):
+        """Embed the question once and run a single (hybrid) search"""
+        timings = {} if timings is None else timings
+        return self.search(question, self.embed(question, timings), timings)
+
+    def build_prompt(self, question, docs, timings=None):
+        """Return (prompt value, docs packed into its context)"""
+        timings = {} if timings is None else timings
+        with timed(timings, "prompt"):
+            context, docs = self.context_builder.build(docs)
+            return self.prompt.invoke({
+                "context": context,
+                "question": question
+            }), docs
+
+    def _cache_exact(self, question):
+        return self.cache.get_exact(question) if self.cache else None
+
+    def _answer_without_llm(self, question, timings):
+        """(hit, level) from the exact cache or the table store, before any embedding"""
+        hit = self._cache_exact(question)
+        if hit is not None:
+            return hit, "exact"
+        if self.table_store is not None:
+            with timed(timings, "table"):
+                hit = self.table_store.lookup(question)
+            if hit is not None:
+                return hit, "table"
+        return None, None
+
+    def _cache_semantic(self, question, query_vector):
+        return self.cache.get_semantic(question, query_vector) if self.cache else None
+
+    def _cache_put(self, question, query_vector, answer, docs):
+        if self.cache:
+            self.cache.put(question, query_vector, answer, docs)
+
+    def _acquire(self, timings):
+        """Take an LLM slot (time spent waiting is the "queue" stage); returns a ticket for _release"""
+        if self.admission is None:
+            return None
+        with timed(timings, "queue"):
+            return self.admission.acquire()
+
+    async def _aacquire(self, timings):
+        if self.admission is None:
+            return None
+        with timed(timings, "queue"):
+            return await self.admission.aacquire()
+
+    def _release(self, ticket):
+        if ticket is not None:
+            self.admission.release(ticket)
+
+    def _record(self, timings, docs, level, usage):
+        # Cache hits skip retrieval, so their sources are not counted as retrieved chunks;
+        # table answers count as a cache miss followed by a (table) source
+        cached = level in ("exact", "semantic")
+        record_request(timings, [] if cached else docs, level if cached else None, usage,
+                       cache_enabled=self.cache is not None)
+
+    # --- Sync entry points ---
+
+    def invoke(self, question):
+        """Run the full pipeline and return the answer, source docs and stage timings"""
+        if self.singleflight is None:
+            return self._invoke(question)
+        start = time.perf_counter()
+        try:
+            result, shared = self.singleflight.do(normalize_query(question), lambda: self._invoke(question))
+        except Abandoned:
+            return self._invoke(question)
+        return _coalesced(result, start) if shared else result
+
+    def _invoke(self, question):
+        timings = {}
+        with timed(timings, "total"):
+            hit, level = self._answer_without_llm(question, timings)
+            if hit is None:
+                query_vector = self.embed(question, timings)
+                hit, level = self._cache_semantic(question, query_vector), "semantic"
+
+            if hit is None:
+                docs = self.search(question, query_vector, timings)
+                prompt_value, docs = self.build_prompt(question, docs, timings)
+
+                ticket = self._acquire(timings)
+                try:
+                    with timed(timings, "llm"):
+                        message = self.chat_model.invoke(prompt_value)
+                finally:
+                    self._release(ticket)
+                answer = message_text(message)
+                self._cache_put(question, query_vector, answer, docs)
+
+        if hit is not None:
+            self._record(timings, hit["docs"], level, None)
+            return {"answer": hit["answer"], "docs": hit["docs"], "timings": timings, "cache": level}
+        self._record(timings, docs, None, message.usage_metadata)
+        return {
+            "answer": answer,
+            "docs": docs,
+            "timings": timings,
+            "cache": None
+        }
+
+    def stream(self, question):
+        """Yield ("docs", docs) once retrieval and context packing are done, then ("token", text) for each
+        answer chunk, then ("timings", timings) once the LLM is done"""
+        if self.singleflight is None:
+            yield from self._stream(question)
+            return
+        start = time.perf_counter()
+        key = normalize_query(question)
+        broadcast, leader = self.singleflight.join_stream(key)
+        if leader:
+            yield from self._lead(key, broadcast, self._stream(question))
+        else:
+            # Tokens arrive as the leader streams them, so followers keep their time to first token
+            yield from _follow(broadcast.events(), start)
+
+    def _lead(self, key, broadcast, events):
+        """Pass a stream through, publishing each event to coalesced followers as it goes"""
+        try:
+            for event in events:
+                broadcast.publish(event)
+                yield event
+        except Exception as e:
+            self.singleflight.finish_stream(key, error=e)
+            raise
+        except BaseException:
+            # The client disconnected mid-stream: finish the answer for any followers first
+            if self.singleflight.abandon_stream(key):
+                self._drain(key, broadcast, events)
+            raise
+        finally:
+            events.close()
+        self.singleflight.finish_stream(key)
+
+    def _drain(self, key, broadcast, events):
+        try:
+            for event in events:
+                broadcast.publish(event)
+        except Exception as e:
+            self.singleflight.finish_stream(key, error=e)
+        else:
+            self.singleflight.finish_stream(key)
+
+    def _stream(self, question):
+        timings = {}
+        start = time.perf_counter()
+
+        hit, level = self._answer_without_llm(question, timings)
+        if hit is None:
+            query_vector = self.embed(question, timings)
+            hit, level = self._cache_semantic(question, query_vector), "semantic"
+
+        if hit is not None:
+            yield "docs", hit["docs"]
+            yield "token", hit["answer"]
+        else:
+            docs = self.search(question, query_vector, timings)
+            prompt_value, docs = self.build_prompt(question, docs, timings)
+            # Admitted (or shed) before the first event
+            ticket = self._acquire(timings)
+            try:
+                yield "docs", docs
+
+                tokens = []
+                usage = None
+                with timed(timings, "llm"):
+                    for chunk in self.chat_model.stream(prompt_value):
+                        # With stream_usage the final chunk carries the token counts
+                        usage = chunk.usage_metadata or usage
+                        token = message_text(chunk)
+                        if not token:
+                            continue
+                        if "ttft_ms" not in timings:
+                            timings["ttft_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                        tokens.append(token)
+                        yield "token", token
+            finally:
+                self._release(ticket)
+            self._cache_put(question, query_vector, "".join(tokens), docs)
+
+        timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        if hit is not None:
+            self._record(timings, hit["docs"], level, None)
+        else:
+            self._record(timings, docs, None, usage)
+        yield "timings", timings
+
+    # --- Batch entry point (/batch) ---
+
+    def batch(self, questions, max_concurrency=4):
+        """Answer many questions, yielding (index, future) pairs as each answer completes.
+
+        Cached and table answers are yielded first. The rest are embedded in a
+        single ``embed_documents`` pass and searched together, then generated on
+        at most ``max_concurrency`` threads. ``future.result()`` returns the same
+        dict as ``invoke`` or raises that question's error.
+        """
+        start = time.perf_counter()
+        pending = []
+        for index, question in enumerate(questions):
+            timings = {}
+            hit, level = self._answer_without_llm(question, timings)
+            if hit is None:
+                pending.append((index, question, timings))
+                continue
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            self._record(timings, hit["docs"], level, None)
+            yield index, _done({"answer": hit["answer"], "docs": hit["docs"], "timings": timings, "cache": level})
+        if not pending:
+            return
+
+        # Shared stages are timed once for the whole batch
+        batch_timings = {}
+        with timed(batch_timings, "batch_embed"):
+            vectors = self.embeddings.embed_documents([question for _, question, _ in pending])
+
+        misses = []
+        for (index, question, timings), query_vector in zip(pending, vectors):
+            hit = self._cache_semantic(question, query_vector)
+            if hit is None:
+                misses.append((index, question, timings, query_vector))
+                continue
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            self._record(timings, hit["docs"], "semantic", None)
+            yield index, _done({"answer": hit["answer"], "docs": hit["docs"], "timings": timings, "cache": "semantic"})
+        if not misses:
+            record_request(batch_timings, [], cache_enabled=False)
+            return
+
+        with timed(batch_timings, "batch_retrieve"):
+            # Filtered or shard-scoped questions run their own (narrower) search
+            unfiltered = [i for i, (_, question, *_) in enumerate(misses)
+                          if self._scope(question) == ({"intent": None, "filter": None}, None)]
+            dense = [None] * len(misses)
+            results = batch_similarity_search(
+                self.vector_store, [misses[i][3] for i in unfiltered], self._dense_k(self.k)
+            )
+            for i, result in zip(unfiltered, results):
+                dense[i] = result
+            retrieved = [
+                self._search(question, query_vector, dense=results)
+                for (_, question, _, query_vector), results in zip(misses, dense)
+            ]
+        record_request(batch_timings, [], cache_enabled=False)
+
+        pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch-llm")
+        try:
+            futures = {
+                pool.submit(self._generate, question, query_vector, docs, timings, start): index
+                for (index, question, timings, query_vector), docs in zip(misses, retrieved)
+            }
+            for future in as_completed(futures):
+                yield futures[future], future
+        finally:
+            # A disconnected client stops the generations that have not started yet
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _generate(self, question, query_vector, docs, timings, start):
+        prompt_value, docs = self.build_prompt(question, docs, timings)
+        ticket = self._acquire(timings)
+        try:
+            with timed(timings, "llm"):
+                message = self.chat_model.invoke(prompt_value)
+        finally:
+            self._release(ticket)
+        answer = message_text(message)
+        self._cache_put(question, query_vector, answer, docs)
+        timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        self._record(timings, docs, None, message.usage_metadata)
+        return {"answer": answer, "docs": docs, "timings": timings, "cache": None}
+
+    # --- Async variants for the ASGI entry point (asgi.py) ---
+
+    async def aembed(self, question, timings):
+        # Embeddings.aembed_query runs off the event loop (thread pool or batching service)
+        with timed(timings, "embed"):
+            return await self.embeddings.aembed_query(question)
+
+    async def asearch(self, question, query_vector, timings):
+        with timed(timings, "retrieve"):
+            return await asyncio.to_thread(self._search, question, query_vector)
+
+    async def _aanswer_without_llm(self, question, timings):
+        # The table lookup parses the question and scans cells: off the event loop, like the search
+        return await asyncio.to_thread(self._answer_without_llm, question, timings)
+
+    async def _acache_semantic(self, question, query_vector):
+        # A similarity scan over every cached question vector
+        return await asyncio.to_thread(self._cache_semantic, question, query_vector)
+
+    async def abuild_prompt(self, question, docs, timings=None):
+        # Context packing counts tokens (tiktoken) for every candidate chunk
+        return await asyncio.to_thread(self.build_prompt, question, docs, timings)
+
+    async def aretrieve(self, question, timings=None):
+        timings = {} if timings is None else timings
+        return await self.asearch(question, await self.aembed(question, timings), timings)
+
+    async def ainvoke(self, question):
+        if self.singleflight is None:
+            return await self._ainvoke(question)
+        start = time.perf_counter()
+        try:
+            result, shared = await self.singleflight.ado(normalize_query(question), lambda: self._ainvoke(question))
+        except Abandoned:
+            return await self._ainvoke(question)
+        return _coalesced(result, start) if shared else result
+
+    async def _ainvoke(self, question):
+        timings = {}
+        with timed(timings, "total"):
+            hit, level = await self._aanswer_without_llm(question, timings)
+            if hit is None:
+                query_vector = await self.aembed(question, timings)
+                hit, level = await self._acache_semantic(question, query_vector), "semantic"
+
+            if hit is None:
+                docs = await self.asearch(question, query_vector, timings)
+                prompt_value, docs = await self.abuild_prompt(question, docs, timings)
+
+                ticket = await self._aacquire(timings)
+                try:
+                    with timed(timings, "llm"):
+                        message = await self.chat_model.ainvoke(prompt_value)
+                finally:
+                    self._release(ticket)
+                answer = message_text(message)
+                self._cache_put(question, query_vector, answer, docs)
+
+        if hit is not None:
+            self._record(timings, hit["docs"], level, None)
+            return {"answer": hit["answer"], "docs": hit["docs"], "timings": timings, "cache": level}
+        self._record(timings, docs, None, message.usage_metadata)
+        return {
+            "answer": answer,
+            "docs": docs,
+            "timings": timings,
+            "cache": None
+        }
+
+    async def astream(self, question):
+        """Async counterpart of stream(), yielding the same events"""
+        if self.singleflight is None:
+            async for event in self._astream(question):
+                yield event
+            return
+        start = time.perf_counter()
+        key = normalize_query(question)
+        broadcast, leader = self.singleflight.join_stream(key)
+        events = self._alead(key, broadcast, self._astream(question)) if leader \
+            else _afollow(broadcast.aevents(), start)
+        async for event in events:
+            yield event
+
+    async def _alead(self, key, broadcast, events):
+        handed_off = False
+        try:
+            async for event in events:
+                broadcast.publish(event)
+                yield event
+        except Exception as e:
+            self.singleflight.finish_stream(key, error=e)
+            raise
+        except BaseException:
+            # Cancelled (client went away): a task outside this request finishes the answer
+            # for any followers; the broadcast keeps a reference to it
+            if self.singleflight.abandon_stream(key):
+                handed_off = True
+                broadcast.drain = asyncio.ensure_future(self._adrain(key, broadcast, events))
+            raise
+        finally:
+            if not handed_off:
+                await events.aclose()
+        self.singleflight.finish_stream(key)
+
+    async def _adrain(self, key, broadcast, events):
+        try:
+            async for event in events:
+                broadcast.publish(event)
+        except Exception as e:
+            self.singleflight.finish_stream(key, error=e)
+        else:
+            self.singleflight.finish_stream(key)
+        finally:
+            await events.aclose()
+
+    async def _astream(self, question):
+        timings = {}
+        start = time.perf_counter()
+
+        hit, level = await self._aanswer_without_llm(question, timings)
+        if hit is None:
+            query_vector = await self.aembed(question, timings)
+            hit, level = await self._acache_semantic(question, query_vector), "semantic"
+
+        if hit is not None:
+            yield "docs", hit["docs"]
+            yield "token", hit["answer"]
+        else:
+            docs = await self.asearch(question, query_vector, timings)
+            prompt_value, docs = await self.abuild_prompt(question, docs, timings)
+            ticket = await self._aacquire(timings)
+            try:
+                yield "docs", docs
+
+                tokens = []
+                usage = None
+                with timed(timings, "llm"):
+                    async for chunk in self.chat_model.astream(prompt_value):
+                        # With stream_usage the final chunk carries the token counts
+                        usage = chunk.usage_metadata or usage
+                        token = message_text(chunk)
+                        if not token:
+                            continue
+                        if "ttft_ms" not in timings:
+                            timings["ttft_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                        tokens.append(token)
+                        yield "token", token
+            finally:
+                self._release(ticket)
+            self._cache_put(question, query_vector, "".join(tokens), docs)
+
+        timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        if hit is not None:
+            self._record(timings, hit["docs"], level, None)
+        else:
+            self._record(timings, docs, None, usage)
+        yield "timings", timings
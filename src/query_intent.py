@@ -0,0 +1,35 @@
+import re
+
+from src.reference_index import parse_references
+
+# "the table", "tables", "tabular"; every table chunk is tagged at ingestion
+TABLE_PATTERN = re.compile(r"\b(?:tables?|tabular)\b", re.I)
+# "Figure 3", "fig. 2", "chart", "graph", "diagram"; bare "figures" often means numbers, so it needs a number
+FIGURE_PATTERN = re.compile(r"\b(?:(?:figure|fig\.?)\s*\d+|charts?|graphs?|diagrams?|plots?)\b", re.I)
+
+# element_type is set per chunk by SimplePDFProcessor; the page-level has_tables/has_images
+# flags are true for most pages, so they would barely narrow the search
+TABLE_FILTER = {"element_type": "table"}
+FIGURE_FILTER = {"element_type": "image"}
+
+
+def analyze_query(question):
+    """Detect table, figure or page-specific questions.
+
+    Returns {"intent": "page" | "table" | "figure" | None, "filter": metadata filter or None}.
+    The filter uses the Pinecone filter syntax, which LocalVectorStore and
+    BM25Index evaluate too. Page references win over element words ("the
+    table on page 41" searches page 41); a question that mentions both
+    tables and figures is left unfiltered.
+    """
+    pages = [int(key.split(":")[1]) for key in parse_references(question) if key.startswith("page:")]
+    if pages:
+        return {"intent": "page", "filter": {"page": {"$in": pages}}}
+
+    wants_table = bool(TABLE_PATTERN.search(question))
+    wants_figure = bool(FIGURE_PATTERN.search(question))
+    if wants_table and not wants_figure:
+        return {"intent": "table", "filter": TABLE_FILTER}
+    if wants_figure and not wants_table:
+        return {"intent": "figure", "filter": FIGURE_FILTER}
+    return {"intent": None, "filter": None}
@@ -0,0 +1,110 @@
+import os
+import re
+import json
+
+from src.shards import chunk_source
+
+# "Figure 3", "Fig. 12", "Table 3a", "Chart 2"
+ELEMENT_PATTERN = re.compile(r"\b(figure|fig\.?|chart|table)\s+(\d+[a-z]?)\b", re.I)
+# "page 41", "p. 41", "pages 41-43", "pp. 41–43"
+PAGE_PATTERN = re.compile(r"\b(?:pages?|pp?\.)\s*(\d+)(?:\s*(?:-|–|to)\s*(\d+))?", re.I)
+MAX_PAGE_SPAN = 5
+
+
+def _kind(word):
+    word = word.lower().rstrip(".")
+    return "table" if word == "table" else "figure"
+
+
+def parse_references(text):
+    """Return the explicit reference keys in a query, e.g. ["figure:12", "page:41"]"""
+    keys = []
+    for word, number in ELEMENT_PATTERN.findall(text):
+        keys.append(f"{_kind(word)}:{number.lower()}")
+    for start, end in PAGE_PATTERN.findall(text):
+        first = int(start)
+        last = int(end) if end else first
+        for page in range(first, min(last, first + MAX_PAGE_SPAN - 1) + 1):
+            keys.append(f"page:{page}")
+    return list(dict.fromkeys(keys))
+
+
+class ReferenceIndex:
+    """Persistent map from Figure/Table/page numbers to chunk IDs.
+
+    Built at ingestion next to the vectors. Chunks where a reference looks
+    like a caption (at the start of a line) are listed before chunks that
+    merely mention it, so the query path can fetch the defining chunk first.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.refs = {}     # "figure:12" -> [chunk_id, ...]
+        self.chunks = {}   # chunk_id -> ["figure:12", "page:41", ...]
+
+    @classmethod
+    def load(cls, path):
+        index = cls(path)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            index.refs = data["refs"]
+            index.chunks = data["chunks"]
+        return index
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"refs": self.refs, "chunks": self.chunks}, f)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def add(self, chunk_id, text, metadata):
+        self.remove(chunk_id)
+        captions = []
+        mentions = []
+        for match in ELEMENT_PATTERN.finditer(text):
+            key = f"{_kind(match.group(1))}:{match.group(2).lower()}"
+            line_start = text.rfind("\n", 0, match.start()) + 1
+            if not text[line_start:match.start()].strip():
+                captions.append(key)
+            else:
+                mentions.append(key)
+
+        keys = list(dict.fromkeys(captions + mentions))
+        if metadata.get("page") is not None:
+            keys.append(f"page:{int(float(metadata['page']))}")
+
+        self.chunks[chunk_id] = keys
+        for key in keys:
+            ids = self.refs.setdefault(key, [])
+            if key in captions:
+                ids.insert(0, chunk_id)
+            else:
+                ids.append(chunk_id)
+
+    def remove(self, chunk_id):
+        for key in self.chunks.pop(chunk_id, []):
+            ids = self.refs.get(key)
+            if ids and chunk_id in ids:
+                ids.remove(chunk_id)
+                if not ids:
+                    del self.refs[key]
+
+    def lookup(self, query, limit=12, per_reference=4, sources=None):
+        """Chunk IDs for the explicit references in ``query``, at most ``limit``.
+
+        ``sources`` restricts the chunks to those PDFs (the shards searched)
+        before anything is cut, so "Table 3a" of one source is not crowded
+        out by another's.
+        """
+        chunk_ids = []
+        for key in parse_references(query):
+            ids = self.refs.get(key, [])
+            if sources is not None:
+                ids = [chunk_id for chunk_id in ids if chunk_source(chunk_id) in sources]
+            chunk_ids.extend(ids[:per_reference])
+        return list(dict.fromkeys(chunk_ids))[:limit]
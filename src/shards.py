@@ -0,0 +1,97 @@
+import os
+import re
+import json
+
+SHARD_NAME = re.compile(r"[^a-z0-9]+")
+WORD = re.compile(r"[a-z]+")
+# Chunk IDs are "<source>_p<page>_c<n>" (SimplePDFProcessor.iter_split)
+CHUNK_ID = re.compile(r"^(.+)_p\d+_c\d+$")
+# File-name words that say nothing about which document a question is about
+GENERIC_WORDS = frozenset(
+    "annex annual article consultation country doc document draft final imf iv pdf press release "
+    "report selected staff statement test the and for of".split()
+)
+
+
+def shard_slug(name):
+    """Namespace-safe shard name for a source file or collection, e.g. "qatar-test-doc" """
+    return SHARD_NAME.sub("-", os.path.splitext(name)[0].lower()).strip("-") or "default"
+
+
+def chunk_source(chunk_id):
+    """Source PDF a chunk ID belongs to (the ID itself if it isn't a chunk ID)"""
+    match = CHUNK_ID.match(chunk_id)
+    return match.group(1) if match else chunk_id
+
+
+class ShardMap:
+    """Which shard (vector namespace) each source PDF lives in.
+
+    ``shard_by="source"`` gives every PDF its own shard; ``"collection"``
+    puts the PDFs listed together in collections.json
+    (``{"gcc": ["qatar_2024.pdf", "kuwait_2024.pdf"]}``) into one shard and
+    the rest into their own; ``"none"`` keeps one unsharded index. Written
+    by store_index.py, so the app searches the shards the index was built
+    with. Questions naming a document ("... in Qatar") are routed to the
+    shards whose names contain that word; all others search every shard.
+    """
+
+    def __init__(self, path, shard_by="none", collections=None):
+        if shard_by not in ("none", "source", "collection"):
+            raise ValueError(f"Unknown SHARD_BY: {shard_by}")
+        self.path = path
+        self.shard_by = shard_by
+        self.collections = collections or {}  # collection -> [source, ...]
+        self.shards = {}                      # shard -> [source, ...]
+        self._keywords = {}
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        shard_map = cls(path, data["shard_by"], data.get("collections"))
+        shard_map.set_sources(source for sources in data["shards"].values() for source in sources)
+        return shard_map
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"shard_by": self.shard_by, "collections": self.collections, "shards": self.shards}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self.shards)
+
+    def shard_of(self, source):
+        if self.shard_by == "none":
+            return ""
+        if self.shard_by == "collection":
+            for collection, sources in self.collections.items():
+                if source in sources:
+                    return shard_slug(collection)
+        return shard_slug(source)
+
+    def set_sources(self, sources):
+        self.shards = {}
+        for source in sorted(set(sources)):
+            self.shards.setdefault(self.shard_of(source), []).append(source)
+        self._keywords = {
+            shard: {word for name in [shard] + sources for word in WORD.findall(os.path.splitext(name)[0].lower())
+                    if len(word) > 2 and word not in GENERIC_WORDS}
+            for shard, sources in self.shards.items()
+        }
+
+    def select(self, question):
+        """Shards a question is scoped to by name, or None to search them all"""
+        if self.shard_by == "none":
+            return None
+        words = set(WORD.findall(question.lower()))
+        selected = [shard for shard, keywords in self._keywords.items() if keywords & words]
+        # Naming every shard is no narrowing at all
+        return selected if selected and len(selected) < len(self.shards) else None
+
+    def sources(self, shards):
+        return [source for shard in shards for source in self.shards.get(shard, [])]
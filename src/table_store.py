@@ -0,0 +1,315 @@
+import os
+import re
+import json
+
+import pandas as pd
+from langchain_core.documents import Document
+
+from src.lexical_index import tokenize
+
+YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+YEAR_RANGE = re.compile(r"\b((?:19|20)\d{2})\s*(?:-|–|to|and|through)\s*((?:19|20)?\d{2})\b")
+TABLE_TITLE = re.compile(r"^\s*Table\s+\d+[a-z]?\.", re.I)
+NUMBER = re.compile(r"^\(?-?\d[\d,]*(?:\.\d+)?\)?%?$")
+PLACEHOLDERS = {"…", "...", "n.a.", "na", "--", "—", "-", "n/a"}
+FOOTNOTE = re.compile(r"\s+\d+/(?=\s|$)")
+# pypdf splits signs and decimals off numbers: "- 33.5", "5 .6"
+SPLIT_SIGN = re.compile(r"(?<!\S)-\s+(?=\d)")
+SPLIT_DECIMAL = re.compile(r"(?<=\d)\s+(?=\.\d)")
+# "Monetary and financial sector (change in percent)": a section heading that sets its rows' units
+HEADING_UNITS = re.compile(r"^(.*\S)\s*\(([^()]+)\)$")
+UNITS_NOTE = re.compile(r",?\s+unless otherwise (?:noted|indicated|specified)\.?$", re.I)
+
+# Words that say nothing about which row is meant
+LOOKUP_STOPWORDS = frozenset(
+    "value level qatar s amount much many year years data number according reported riyals "
+    "billion billions qr percent percentage".split()
+)
+# Questions that need reasoning over the data go to the LLM
+ANALYTIC_WORDS = frozenset(
+    "why explain describe summarize summary analyze analysis discuss trend trends impact drive drove "
+    "driven cause causes outlook risk risks compare compared comparison relationship".split()
+)
+MIN_SCORE = 0.6
+MIN_MARGIN = 0.15
+
+COLUMNS = ["source", "page", "table", "units", "section", "row", "year", "value"]
+
+
+def _parse_number(token):
+    if token.lower() in PLACEHOLDERS:
+        return None
+    negative = token.startswith("(") and token.endswith(")")
+    value = float(token.strip("()%").replace(",", ""))
+    return -value if negative else value
+
+
+def _is_value(token):
+    return token.lower() in PLACEHOLDERS or bool(NUMBER.match(token))
+
+
+def _is_label_number(token):
+    # Years are fine in a label ("Real GDP (2018 prices)"), other numbers are values that shifted into it
+    return bool(NUMBER.match(token)) and not YEAR.fullmatch(token.strip("()"))
+
+
+def _year_header(line):
+    tokens = line.split()
+    years = [int(t) for t in tokens if YEAR.fullmatch(t)]
+    if len(years) >= 3 and len(years) >= 0.6 * len(tokens):
+        return years
+    return None
+
+
+def parse_tables(text, metadata):
+    """Parse "label v1 v2 ... vn" rows under a year header line into cell records"""
+    records = []
+    title, units, section, years, parent = None, None, None, None, None
+    section_units, heading = None, None
+    for raw in text.split("\n"):
+        line = raw.strip()
+        if not line or line in ("[TABLE_START]", "[TABLE_END]"):
+            continue
+        if TABLE_TITLE.match(line):
+            title, units, section, years = line, None, None, None
+            continue
+        if title and units is None and years is None and line.startswith("("):
+            units = line.strip("()")
+            continue
+        header = _year_header(line)
+        if header:
+            years, section, section_units, parent = header, None, None, None
+            continue
+        if years is None:
+            continue
+        if line.startswith("Sources:") or line.startswith("Source:"):
+            years = None
+            continue
+
+        tokens = SPLIT_DECIMAL.sub("", SPLIT_SIGN.sub("-", line)).split()
+        n = len(years)
+        if len(tokens) <= n or not all(_is_value(t) for t in tokens[-n:]):
+            # Text without a full row of values: a section heading ("Financing"), its units
+            # ("(percent of GDP)") or a footnote
+            if re.match(r"^\d+/", line) or len(line) >= 60 or any(_is_value(t) for t in tokens):
+                continue
+            if line.startswith("(") and line.endswith(")"):
+                section_units = line[1:-1]
+                continue
+            # Kept with the section it replaces, in case the next row turns out to finish it
+            heading = (line, section, section_units)
+            match = HEADING_UNITS.match(line)
+            section, section_units = (match.group(1), match.group(2)) if match else (line.rstrip(":"), None)
+            continue
+
+        label = FOOTNOTE.sub("", " ".join(tokens[:-n])).strip()
+        if not re.search(r"[A-Za-z]", label) or any(_is_label_number(t) for t in label.split()):
+            # A number left in the label means the row didn't split cleanly into n values
+            continue
+        if label[0] == "(" and heading:
+            # "Non-hydrocarbon primary balance" / "(percent of non-hydrocarbon GDP) 2/ -35.4 ...":
+            # a label wrapped onto a second line, not a section heading
+            label = f"{heading[0]} {label}"
+            _, section, section_units = heading
+            parent = label
+        elif (label[0].islower() or label[0] == "(") and parent:
+            # "as a share of total revenues" or "(percent)" continues the row above
+            label = f"{parent} {label}"
+        else:
+            parent = label
+        heading = None
+
+        for year, token in zip(years, tokens[-n:]):
+            value = _parse_number(token)
+            if value is not None:
+                records.append({
+                    "source": metadata["source"],
+                    "page": int(metadata["page"]),
+                    "table": title or "",
+                    "units": section_units or units or "",
+                    "section": section or "",
+                    "row": label,
+                    "year": year,
+                    "value": value
+                })
+    return records
+
+
+def _format_value(value):
+    return f"{value:,.1f}" if abs(value) < 1e6 else f"{value:,.0f}"
+
+
+def _units(row):
+    """Display units for a row: its own "(...)" label wins over the section's or the table's"""
+    if "(" in row["row"]:
+        return ""
+    return UNITS_NOTE.sub("", row["units"])
+
+
+class TableStore:
+    """Table cells (row label x year) parsed at ingestion, held as a pandas DataFrame and saved as JSON.
+
+    Answers direct cell and series questions ("external debt service/total
+    revenue in 2023") without embedding, retrieval or an LLM call. A question
+    is only answered when exactly one row clearly matches; anything else
+    returns None and goes through the full chain.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.frame = pd.DataFrame(columns=COLUMNS)
+        self._pending = []
+        self._staged = {}  # source -> records of a source being re-indexed, swapped in by commit_source
+        self._rows = None
+
+    @classmethod
+    def load(cls, path):
+        store = cls(path)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                store.frame = pd.DataFrame(json.load(f), columns=COLUMNS)
+        return store
+
+    def save(self):
+        self._flush()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.frame.to_dict(orient="records"), f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _flush(self):
+        if self._pending:
+            pending = pd.DataFrame(self._pending, columns=COLUMNS)
+            self.frame = pending if self.frame.empty else pd.concat([self.frame, pending], ignore_index=True)
+            self._pending = []
+            self._rows = None
+
+    def __len__(self):
+        self._flush()
+        return len(self.frame)
+
+    def remove_source(self, source):
+        self._flush()
+        self.frame = self.frame[self.frame["source"] != source].reset_index(drop=True)
+        self._rows = None
+
+    def stage_page(self, page):
+        """Parse a page of a source being re-indexed; its old rows stay until commit_source"""
+        self._staged.setdefault(page["metadata"]["source"], []).extend(
+            parse_tables(page["content"], page["metadata"])
+        )
+
+    def commit_source(self, source):
+        """Replace a source's rows with the ones staged for it"""
+        records = self._staged.pop(source, [])
+        self.remove_source(source)
+        self._pending.extend(records)
+
+    def discard_source(self, source):
+        self._staged.pop(source, None)
+
+    # --- Query path ---
+
+    def _row_index(self):
+        """One entry per (table, row) series with its match tokens, built once per load"""
+        if self._rows is None:
+            self._flush()
+            rows = []
+            keys = ["source", "page", "table", "units", "section", "row"]
+            for key, group in self.frame.groupby(keys, sort=False):
+                meta = dict(zip(keys, key))
+                label_terms = set(tokenize(meta["row"])) - LOOKUP_STOPWORDS
+                context_terms = set(tokenize(f"{meta['section']} {meta['table']} {meta['units']}")) - LOOKUP_STOPWORDS
+                rows.append({
+                    **meta,
+                    "label_terms": label_terms,
+                    "context_terms": context_terms,
+                    "series": dict(zip(group["year"].astype(int), group["value"].astype(float)))
+                })
+            self._rows = rows
+        return self._rows
+
+    @staticmethod
+    def _years(question):
+        ranges = YEAR_RANGE.findall(question)
+        if ranges:
+            years = []
+            for start, end in ranges:
+                end = int(end) if len(end) == 4 else int(start[:2] + end)
+                years.extend(range(int(start), end + 1))
+            return years
+        return [int(y) for y in YEAR.findall(question)]
+
+    def lookup(self, question):
+        """Return {"answer", "docs"} for a direct cell/series question, or None"""
+        terms = set(tokenize(question))
+        if terms & ANALYTIC_WORDS:
+            return None
+        years = self._years(question)
+        query_terms = {t for t in terms if not YEAR.fullmatch(t)} - LOOKUP_STOPWORDS
+        if not query_terms:
+            return None
+
+        scored = []
+        for row in self._row_index():
+            if not row["label_terms"]:
+                continue
+            if years and not any(year in row["series"] for year in years):
+                continue
+            matched = len(query_terms & (row["label_terms"] | row["context_terms"]))
+            score = matched / len(query_terms | row["label_terms"])
+            scored.append((score, row))
+        if not scored:
+            return None
+        scored.sort(key=lambda item: -item[0])
+
+        # Rows whose label names everything asked for: answer only if that picks one series,
+        # or one label is exactly the question ("fiscal balance" matches primary, overall, ...)
+        in_label = [row for _score, row in scored if query_terms <= row["label_terms"]]
+        if in_label:
+            exact = [row for row in in_label if row["label_terms"] == query_terms]
+            for rows in (in_label, exact):
+                if rows and all(row["series"] == rows[0]["series"] for row in rows):
+                    return self._answer(rows[0], years)
+            return None
+
+        # Otherwise table/section context may complete the match, but only with a clear winner
+        best_score, best = scored[0]
+        if best_score < MIN_SCORE:
+            return None
+        if len(scored) > 1 and best_score - scored[1][0] < MIN_MARGIN:
+            # Two rows match about equally well ("Revenue" in billions and in percent of GDP)
+            if scored[1][1]["series"] != best["series"]:
+                return None
+
+        return self._answer(best, years)
+
+    def _answer(self, row, years):
+        series = row["series"]
+        units = _units(row)
+        # Row label, then the section it sits under ("Current account balance" is in "External sector")
+        label = f"**{row['row']}**" + (f", {row['section']}" if row["section"] else "")
+        where = f"{row['table']}, page {row['page']}" if row["table"] else f"page {row['page']}"
+        if not units and "(" not in row["row"]:
+            where += "; units are not stated in the extracted table text"
+
+        if len(years) == 1:
+            value = _format_value(series[years[0]])
+            answer = f"{label}, {years[0]}: **{value}**{f' ({units})' if units else ''} ({where})."
+            text = f"{row['row']} {years[0]}: {value}{f' {units}' if units else ''}"
+        else:
+            selected = [year for year in (years or sorted(series)) if year in series]
+            lines = [f"{label} ({where}):", "", f"| Year | {units or 'Value'} |", "|---|---|"]
+            lines += [f"| {year} | {_format_value(series[year])} |" for year in selected]
+            answer = "\n".join(lines)
+            text = f"{row['row']}{f' ({units})' if units else ''} " + \
+                " ".join(_format_value(series[year]) for year in selected)
+
+        doc = Document(page_content=text, metadata={
+            "source": row["source"],
+            "page": row["page"],
+            "element_type": "table",
+            "chunk_id": f"{row['source']}_p{row['page']}_table"
+        })
+        return {"answer": answer, "docs": [doc]}
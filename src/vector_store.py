@@ -0,0 +1,665 @@
+import os
+import json
+import uuid
+import heapq
+import shutil
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from src.config import (
+    VECTOR_BACKEND, INDEX_NAME, LOCAL_INDEX_DIR, EMBEDDING_DIM, SHARD_BUDGET_MS, SHARD_MAX_WORKERS
+)
+from src.components import PerProcess
+from src.metrics import SHARD_MISSES
+from src.shards import chunk_source
+
+VECTORS_FILE = "vectors.npy"
+DOCS_FILE = "docs.json"
+HNSW_FILE = "hnsw.bin"
+# Local shards live in LOCAL_INDEX_DIR/shards/<shard>
+SHARDS_DIR = "shards"
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def matches_filter(metadata, filter):
+    """Evaluate a Pinecone-style filter ($eq, $in, $and, $or) against one metadata dict"""
+    for field, condition in filter.items():
+        if field == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+            continue
+        if field == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+            continue
+        value = metadata.get(field)
+        if isinstance(condition, dict):
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector index, a drop-in for PineconeVectorStore.
+
+    Vectors are stored L2-normalised in ``vectors.npy`` and opened with
+    ``mmap_mode="r"`` so every worker on a host shares the same pages
+    through the OS page cache. Texts and metadata live in ``docs.json``.
+    ``index_type="flat"`` does an exact dot-product scan; ``"hnsw"`` builds
+    an approximate graph with hnswlib for larger corpora.
+
+    Metadata filters are evaluated on per-value row sets, and only the
+    matching rows are scored. The sets for ``FILTER_FIELDS`` (what query
+    intents filter on) are built when the index is loaded or saved; other
+    fields are indexed on first use.
+    """
+
+    FILTER_FIELDS = ("element_type", "page")
+
+    def __init__(self, index_dir, embedding, index_type="flat", dim=EMBEDDING_DIM, ef_search=64):
+        if index_type not in ("flat", "hnsw"):
+            raise ValueError(f"Unknown local index type: {index_type}")
+        self.index_dir = index_dir
+        self._embedding = embedding
+        self.index_type = index_type
+        self.dim = dim
+        self.ef_search = ef_search
+
+        self._ids = []
+        self._texts = []
+        self._metadatas = []
+        self._id_to_row = {}
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._buffer = None  # writable rows behind _vectors (with spare capacity) once written to
+        self._hnsw = None
+        self._value_rows = {}  # field -> {value: row indices}
+        self._filter_rows = {}  # filter (as JSON) -> matching row indices
+
+    # --- Persistence ---
+
+    @classmethod
+    def load(cls, index_dir, embedding, index_type="flat", **kwargs):
+        store = cls(index_dir, embedding, index_type=index_type, **kwargs)
+        vectors_path = os.path.join(index_dir, VECTORS_FILE)
+        docs_path = os.path.join(index_dir, DOCS_FILE)
+
+        if os.path.exists(vectors_path) and os.path.exists(docs_path):
+            with open(docs_path, "r", encoding="utf-8") as f:
+                docs = json.load(f)
+            store._ids = docs["ids"]
+            store._texts = docs["texts"]
+            store._metadatas = docs["metadatas"]
+            store._id_to_row = {id_: row for row, id_ in enumerate(store._ids)}
+            store._vectors = np.load(vectors_path, mmap_mode="r")
+            store.dim = store._vectors.shape[1]
+
+            if index_type == "hnsw":
+                store._load_hnsw()
+            store._index_filter_fields()
+        return store
+
+    def save(self):
+        """Atomically write vectors, docs and (for hnsw) the graph to ``index_dir``"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        vectors_path = os.path.join(self.index_dir, VECTORS_FILE)
+        docs_path = os.path.join(self.index_dir, DOCS_FILE)
+
+        # Write to temp files and rename so live readers keep a consistent mmap
+        tmp_vectors = vectors_path + ".tmp"
+        with open(tmp_vectors, "wb") as f:
+            np.save(f, np.ascontiguousarray(self._vectors, dtype=np.float32))
+        tmp_docs = docs_path + ".tmp"
+        with open(tmp_docs, "w", encoding="utf-8") as f:
+            json.dump({
+                "ids": self._ids,
+                "texts": self._texts,
+                "metadatas": self._metadatas
+            }, f, ensure_ascii=False)
+        os.replace(tmp_vectors, vectors_path)
+        os.replace(tmp_docs, docs_path)
+
+        if self.index_type == "hnsw":
+            self._build_hnsw()
+            self._hnsw.save_index(os.path.join(self.index_dir, HNSW_FILE))
+
+        self._vectors = np.load(vectors_path, mmap_mode="r")
+        self._buffer = None
+        self._index_filter_fields()
+
+    def _index_filter_fields(self):
+        # Built up front rather than by the first filtered query under load
+        for field in self.FILTER_FIELDS:
+            self._rows_by_value(field)
+
+    def _build_hnsw(self):
+        import hnswlib
+
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        index.init_index(max_elements=max(len(self._ids), 1), ef_construction=200, M=16)
+        if len(self._ids):
+            index.add_items(np.asarray(self._vectors), np.arange(len(self._ids)))
+        index.set_ef(self.ef_search)
+        self._hnsw = index
+
+    def _load_hnsw(self):
+        import hnswlib
+
+        path = os.path.join(self.index_dir, HNSW_FILE)
+        if not os.path.exists(path):
+            self._build_hnsw()
+            return
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        index.load_index(path, max_elements=max(len(self._ids), 1))
+        index.set_ef(self.ef_search)
+        self._hnsw = index
+
+    # --- Writes ---
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _reserve(self, rows):
+        """Writable buffer with room for ``rows`` vectors; _vectors stays a view of its used rows.
+
+        The (read-only, mmapped) vectors are copied in on the first write, and
+        the capacity doubles when full, so a build of many upsert batches
+        copies each vector a constant number of times on average.
+        """
+        n = len(self._ids)
+        if self._buffer is None or self._buffer.shape[0] < rows:
+            capacity = max(rows, 2 * (0 if self._buffer is None else self._buffer.shape[0]), 1024)
+            buffer = np.empty((capacity, self.dim), dtype=np.float32)
+            buffer[:n] = self._vectors[:n]
+            self._buffer = buffer
+            self._vectors = buffer[:n]
+        return self._buffer
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        """Upsert precomputed vectors; rows with an existing id are replaced"""
+        texts = list(texts)
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        if ids is None:
+            ids = [m.get("chunk_id") or str(uuid.uuid4()) for m in metadatas]
+        ids = list(ids)
+        new_vectors = _normalize(embeddings).reshape(len(texts), self.dim)
+
+        # Room for the worst case (every id new), written in place
+        vectors = self._reserve(len(self._ids) + len(ids))
+        for id_, text, metadata, vector in zip(ids, texts, metadatas, new_vectors):
+            row = self._id_to_row.get(id_)
+            if row is None:
+                row = self._id_to_row[id_] = len(self._ids)
+                self._ids.append(id_)
+                self._texts.append(text)
+                self._metadatas.append(dict(metadata))
+            else:
+                self._texts[row] = text
+                self._metadatas[row] = dict(metadata)
+            vectors[row] = vector
+        self._vectors = vectors[:len(self._ids)]
+        self._hnsw = None
+        self._value_rows = {}
+        self._filter_rows = {}
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        vectors = self._embedding.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas=metadatas, ids=ids)
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return False
+        drop = {self._id_to_row[id_] for id_ in ids if id_ in self._id_to_row}
+        if not drop:
+            return False
+        keep = [row for row in range(len(self._ids)) if row not in drop]
+        self._vectors = self._buffer = np.array(self._vectors, dtype=np.float32)[keep]
+        self._ids = [self._ids[row] for row in keep]
+        self._texts = [self._texts[row] for row in keep]
+        self._metadatas = [self._metadatas[row] for row in keep]
+        self._id_to_row = {id_: row for row, id_ in enumerate(self._ids)}
+        self._hnsw = None
+        self._value_rows = {}
+        self._filter_rows = {}
+        return True
+
+    # --- Reads ---
+
+    def _document(self, row):
+        return Document(id=self._ids[row], page_content=self._texts[row], metadata=dict(self._metadatas[row]))
+
+    def get_by_ids(self, ids):
+        return [self._document(self._id_to_row[id_]) for id_ in ids if id_ in self._id_to_row]
+
+    def iter_documents(self):
+        for row in range(len(self._ids)):
+            yield self._document(row)
+
+    def _rows_by_value(self, field):
+        """{value: sorted row indices} for one metadata field (FILTER_FIELDS are prebuilt)"""
+        index = self._value_rows.get(field)
+        if index is None:
+            rows = {}
+            for row, metadata in enumerate(self._metadatas):
+                value = metadata.get(field)
+                # A list value (Pinecone string lists) matches any of its items
+                for item in value if isinstance(value, list) else [value]:
+                    if item is not None:
+                        rows.setdefault(item, []).append(row)
+            index = self._value_rows[field] = {value: np.array(r, dtype=np.int64) for value, r in rows.items()}
+        return index
+
+    def _filter_mask(self, filter):
+        """Boolean row mask for a Pinecone-style filter, from the per-value row sets"""
+        mask = np.ones(len(self._ids), dtype=bool)
+        for field, condition in filter.items():
+            if field == "$and":
+                for clause in condition:
+                    mask &= self._filter_mask(clause)
+                continue
+            if field == "$or":
+                any_mask = np.zeros(len(self._ids), dtype=bool)
+                for clause in condition:
+                    any_mask |= self._filter_mask(clause)
+                mask &= any_mask
+                continue
+
+            if isinstance(condition, dict):
+                values = condition["$in"] if "$in" in condition else [condition["$eq"]]
+            else:
+                values = [condition]
+            by_value = self._rows_by_value(field)
+            field_mask = np.zeros(len(self._ids), dtype=bool)
+            for value in values:
+                rows = by_value.get(value)
+                if rows is not None:
+                    field_mask[rows] = True
+            mask &= field_mask
+        return mask
+
+    def _search_rows(self, query, k, filter=None):
+        """Return (rows, scores) for the k nearest rows by cosine similarity"""
+        n = len(self._ids)
+        if n == 0 or k <= 0:
+            return [], []
+
+        query = _normalize(query)
+
+        if filter:
+            # Exact scan over the matching rows only; intent filters repeat, so their rows are kept
+            key = json.dumps(filter, sort_keys=True)
+            candidates = self._filter_rows.get(key)
+            if candidates is None:
+                if len(self._filter_rows) >= 256:
+                    self._filter_rows.clear()
+                candidates = self._filter_rows[key] = np.flatnonzero(self._filter_mask(filter))
+            if candidates.size == 0:
+                return [], []
+            scores = np.asarray(self._vectors[candidates]) @ query
+            k = min(k, candidates.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return candidates[top].tolist(), scores[top].tolist()
+
+        if self.index_type == "hnsw":
+            if self._hnsw is None:
+                self._build_hnsw()
+            k = min(k, n)
+            labels, distances = self._hnsw.knn_query(query, k=k)
+            # hnswlib "ip" distance is 1 - dot product
+            return labels[0].tolist(), (1.0 - distances[0]).tolist()
+
+        scores = self._vectors @ query
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top.tolist(), scores[top].tolist()
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        rows, scores = self._search_rows(embedding, k, filter=filter)
+        return [(self._document(row), float(score)) for row, score in zip(rows, scores)]
+
+    def batch_similarity_search_by_vector_with_score(self, embeddings, k=4):
+        """Search many query vectors at once: one matrix product (flat) or one knn_query (hnsw)"""
+        n = len(self._ids)
+        queries = _normalize(embeddings)
+        if n == 0 or k <= 0 or len(queries) == 0:
+            return [[] for _ in range(len(queries))]
+        k = min(k, n)
+
+        if self.index_type == "hnsw":
+            if self._hnsw is None:
+                self._build_hnsw()
+            labels, distances = self._hnsw.knn_query(queries, k=k)
+            return [
+                [(self._document(row), float(1.0 - distance)) for row, distance in zip(rows, dists)]
+                for rows, dists in zip(labels.tolist(), distances.tolist())
+            ]
+
+        scores = queries @ np.asarray(self._vectors).T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [
+            [(self._document(row), float(score)) for row, score in zip(rows, row_scores)]
+            for rows, row_scores in zip(top.tolist(), top_scores.tolist())
+        ]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(
+            self._embedding.embed_query(query), k=k, filter=filter
+        )
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, index_dir=LOCAL_INDEX_DIR,
+                   index_type="flat", **kwargs):
+        store = cls(index_dir, embedding, index_type=index_type)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        store.save()
+        return store
+
+
+class PineconeNamespace:
+    """A raw Pinecone ``Index`` bound to one namespace (a shard), for writes and scans"""
+
+    def __init__(self, index, namespace):
+        self.index = index
+        self.namespace = namespace
+
+    def upsert(self, vectors):
+        return self.index.upsert(vectors=vectors, namespace=self.namespace)
+
+    def delete(self, ids):
+        return self.index.delete(ids=ids, namespace=self.namespace)
+
+    def fetch(self, ids):
+        return self.index.fetch(ids=ids, namespace=self.namespace)
+
+    def list(self, limit=100):
+        return self.index.list(limit=limit, namespace=self.namespace)
+
+
+class ShardedVectorStore:
+    """Vector index partitioned into shards (per-source or per-collection namespaces).
+
+    A search fans out to the selected shards (all by default) on a thread
+    pool and merges their sorted top-k lists with a heap. Each shard has
+    ``budget_ms`` from the start of the fan-out to answer; slower or failing
+    shards are left out and the result is partial (``rag_shard_misses_total``),
+    except that the first shard to finish is always awaited. Writes are
+    routed by the chunk's source; shards are opened on first write.
+    """
+
+    def __init__(self, shards, shard_of, open_shard, budget_ms=SHARD_BUDGET_MS, max_workers=SHARD_MAX_WORKERS):
+        self.shards = dict(shards)  # shard -> LocalVectorStore, PineconeVectorStore or PineconeNamespace
+        self.shard_of = shard_of    # source -> shard
+        self.open_shard = open_shard
+        self.budget = budget_ms / 1000
+        self.max_workers = max_workers
+        self.index = None           # raw Pinecone Index, when the shards are namespaces
+        self._dirty = set()
+        self._pool = PerProcess(
+            lambda: ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="shard")
+        )
+
+    def __len__(self):
+        return sum(len(store) for store in self.shards.values())
+
+    def _fan_out(self, fn, shards=None):
+        """[(shard, fn(store)), ...] for the selected shards that answered within the budget"""
+        names = [name for name in (self.shards if shards is None else shards) if name in self.shards]
+        if len(names) == 1:
+            return [(names[0], fn(self.shards[names[0]]))]
+
+        futures = {self._pool.get().submit(fn, self.shards[name]): name for name in names}
+        done, pending = wait(futures, timeout=self.budget)
+        if not done and pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in pending:
+            future.cancel()
+            SHARD_MISSES.inc(shard=futures[future], reason="timeout")
+        if pending:
+            print(f"⏳ {len(pending)}/{len(names)} shards over the {self.budget * 1000:.0f} ms budget, "
+                  "results are partial")
+
+        results, errors = [], []
+        for future in done:
+            try:
+                results.append((futures[future], future.result()))
+            except Exception as e:
+                SHARD_MISSES.inc(shard=futures[future], reason="error")
+                print(f"❌ Shard {futures[future]} search failed: {e}")
+                errors.append(e)
+        if errors and not results:
+            raise errors[0]
+        return results
+
+    @staticmethod
+    def _merge(ranked_lists, k):
+        # Every shard returns (doc, score) pairs best first
+        return list(islice(heapq.merge(*ranked_lists, key=lambda pair: -pair[1]), k))
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, shards=None, **kwargs):
+        results = self._fan_out(
+            lambda store: store.similarity_search_by_vector_with_score(embedding, k=k, filter=filter), shards
+        )
+        return self._merge([ranked for _, ranked in results], k)
+
+    def batch_similarity_search_by_vector_with_score(self, embeddings, k=4, shards=None):
+        results = self._fan_out(lambda store: batch_similarity_search(store, embeddings, k), shards)
+        return [self._merge([ranked[i] for _, ranked in results], k) for i in range(len(embeddings))]
+
+    def _group_ids(self, ids):
+        groups = {}
+        for id_ in ids:
+            name = self.shard_of(chunk_source(id_))
+            groups.setdefault(name, []).append(id_)
+        return groups
+
+    def get_by_ids(self, ids):
+        found = {}
+        for name, group in self._group_ids(ids).items():
+            if name in self.shards:
+                found.update((doc.id, doc) for doc in fetch_documents(self.shards[name], group))
+        return [found[id_] for id_ in ids if id_ in found]
+
+    def _shard_for_write(self, name):
+        if name not in self.shards:
+            self.shards[name] = self.open_shard(name)
+        self._dirty.add(name)
+        return self.shards[name]
+
+    def upsert(self, ids, texts, vectors, metadatas):
+        groups = {}
+        for record in zip(ids, texts, vectors, metadatas):
+            groups.setdefault(self.shard_of(record[3]["source"]), []).append(record)
+        for name, records in groups.items():
+            shard_ids, shard_texts, shard_vectors, shard_metadatas = zip(*records)
+            upsert_vectors(self._shard_for_write(name), list(shard_ids), list(shard_texts),
+                           list(shard_vectors), list(shard_metadatas))
+
+    def delete(self, ids):
+        for name, group in self._group_ids(ids).items():
+            if name in self.shards:
+                delete_vectors(self._shard_for_write(name), group)
+
+    def save(self):
+        """Persist the local shards written to; empty ones are removed"""
+        for name in sorted(self._dirty):
+            store = self.shards[name]
+            if not isinstance(store, LocalVectorStore):
+                continue
+            if len(store) == 0:
+                shutil.rmtree(store.index_dir, ignore_errors=True)
+                del self.shards[name]
+            else:
+                store.save()
+        self._dirty.clear()
+
+
+def open_sharded_store(shard_map, embedding=None, backend=None, index_name=INDEX_NAME, index_dir=LOCAL_INDEX_DIR):
+    """ShardedVectorStore over the shards in ``shard_map``.
+
+    Pinecone shards are namespaces of one index: PineconeVectorStores for
+    querying when an ``embedding`` is given, raw namespaces for writes and
+    scans otherwise. Local shards are LocalVectorStores under index/shards.
+    """
+    backend = (backend or VECTOR_BACKEND).lower()
+    index = None
+    if backend == "pinecone":
+        from src.clients import make_pinecone_index
+
+        index = make_pinecone_index(index_name)
+        if embedding is None:
+            def open_shard(name):
+                return PineconeNamespace(index, name)
+        else:
+            from langchain_pinecone import PineconeVectorStore
+
+            def open_shard(name):
+                return PineconeVectorStore(index=index, embedding=embedding, namespace=name)
+    elif backend in ("flat", "hnsw"):
+        def open_shard(name):
+            return LocalVectorStore.load(os.path.join(index_dir, SHARDS_DIR, name), embedding, index_type=backend)
+    else:
+        raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
+
+    store = ShardedVectorStore({name: open_shard(name) for name in shard_map.shards}, shard_map.shard_of, open_shard)
+    store.index = index
+    return store
+
+
+def get_vector_store(embeddings, backend=None, index_name=INDEX_NAME, index_dir=LOCAL_INDEX_DIR, shard_map=None):
+    """Open the configured vector store (``VECTOR_BACKEND``) for querying; sharded if ``shard_map`` says so"""
+    backend = (backend or VECTOR_BACKEND).lower()
+    if shard_map is not None and shard_map.shard_by != "none":
+        return open_sharded_store(shard_map, embeddings, backend, index_name, index_dir)
+    if backend == "pinecone":
+        from langchain_pinecone import PineconeVectorStore
+        from src.clients import make_pinecone_index
+
+        # Reuse one pooled keep-alive Index handle for every search in this process
+        return PineconeVectorStore(index=make_pinecone_index(index_name), embedding=embeddings)
+    if backend in ("flat", "hnsw"):
+        return LocalVectorStore.load(index_dir, embeddings, index_type=backend)
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
+
+
+def upsert_vectors(store, ids, texts, vectors, metadatas, batch_size=100):
+    """Upsert precomputed vectors keyed by chunk ID.
+
+    ``store`` is a LocalVectorStore, a raw Pinecone ``Index`` (or namespace) or a ShardedVectorStore.
+    """
+    if isinstance(store, LocalVectorStore):
+        store.add_embeddings(texts, vectors, metadatas=metadatas, ids=ids)
+        return
+    if isinstance(store, ShardedVectorStore):
+        store.upsert(ids, texts, vectors, metadatas)
+        return
+
+    # PineconeVectorStore reads the chunk text from the "text" metadata key
+    records = [
+        {"id": id_, "values": list(map(float, vector)), "metadata": {**metadata, "text": text}}
+        for id_, text, vector, metadata in zip(ids, texts, vectors, metadatas)
+    ]
+    for i in range(0, len(records), batch_size):
+        store.upsert(vectors=records[i:i + batch_size])
+
+
+def delete_vectors(store, ids, batch_size=1000):
+    ids = list(ids)
+    if isinstance(store, ShardedVectorStore):
+        store.delete(ids)
+        return
+    for i in range(0, len(ids), batch_size):
+        store.delete(ids=ids[i:i + batch_size])
+
+
+def batch_similarity_search(store, vectors, k, max_workers=8):
+    """[(doc, score), ...] for each query vector, from either backend.
+
+    The local store answers all queries in one vectorized pass; Pinecone has
+    no multi-query search, so its queries run concurrently on the pooled client.
+    """
+    if isinstance(store, (LocalVectorStore, ShardedVectorStore)):
+        return store.batch_similarity_search_by_vector_with_score(vectors, k=k)
+    if not vectors:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(vectors))) as pool:
+        return list(pool.map(lambda vector: store.similarity_search_by_vector_with_score(vector, k=k), vectors))
+
+
+def fetch_documents(store, ids):
+    """Fetch Documents by chunk ID, in the order given, from either backend"""
+    if not ids:
+        return []
+    if isinstance(store, (LocalVectorStore, ShardedVectorStore)):
+        return store.get_by_ids(ids)
+
+    # PineconeVectorStore: one fetch round-trip, text lives under the "text" metadata key
+    vectors = store.index.fetch(ids=list(ids), namespace=getattr(store, "_namespace", None)).vectors
+    docs = []
+    for id_ in ids:
+        record = vectors.get(id_)
+        if record is None:
+            continue
+        metadata = dict(record.metadata or {})
+        docs.append(Document(id=id_, page_content=metadata.pop("text", ""), metadata=metadata))
+    return docs
+
+
+def iter_index_records(store, batch_size=100):
+    """Yield every record in the index as a Document, one page at a time.
+
+    ``store`` is a LocalVectorStore, a raw Pinecone ``Index`` (or namespace)
+    or a ShardedVectorStore of either. Pinecone IDs are paged with ``list``
+    and their metadata fetched in bulk, so memory stays bounded by
+    ``batch_size`` whatever the index size.
+    """
+    if isinstance(store, LocalVectorStore):
+        yield from store.iter_documents()
+        return
+    if isinstance(store, ShardedVectorStore):
+        for shard in store.shards.values():
+            yield from iter_index_records(shard, batch_size)
+        return
+
+    for ids in store.list(limit=batch_size):
+        vectors = store.fetch(ids=list(ids)).vectors
+        for id_ in ids:
+            record = vectors.get(id_)
+            if record is None:
+                # Deleted between list and fetch
+                continue
+            metadata = dict(record.metadata or {})
+            yield Document(id=id_, page_content=metadata.pop("text", ""), metadata=metadata)
@@ -1,31 +1,62 @@
-
 from dotenv import load_dotenv
 import os
-from src.helper import SimplePDFProcessor, download_hugging_face_embeddings
-from langchain_core.documents import Document
-from pinecone import Pinecone, ServerlessSpec
-from langchain_pinecone import PineconeVectorStore
+import sys
+import json
+import time
+import shutil
+from src.helper import SimplePDFProcessor, load_embedding_model
+from src.config import (
+    VECTOR_BACKEND, INDEX_NAME, LOCAL_INDEX_DIR, EMBEDDING_DIM,
+    EMBEDDING_MODEL, EMBEDDING_BACKEND, MANIFEST_PATH, EMBEDDING_CACHE_PATH, INDEX_VERSION_PATH,
+    LEXICAL_INDEX_PATH, REFERENCE_INDEX_PATH, TABLE_STORE_PATH, PAGE_IMAGE_INDEX_PATH,
+    SHARD_BY, SHARD_MAP_PATH, COLLECTIONS_PATH
+)
+from src.vector_store import (
+    LocalVectorStore, ShardedVectorStore, SHARDS_DIR, VECTORS_FILE, DOCS_FILE, HNSW_FILE,
+    open_sharded_store, upsert_vectors, delete_vectors
+)
+from src.index_cache import EmbeddingCache, IndexManifest, file_hash
+from src.ingest import IngestionPipeline
+from src.lexical_index import BM25Index
+from src.reference_index import ReferenceIndex
+from src.table_store import TableStore
+from src.page_images import PageImageIndex
+from src.shards import ShardMap
 
 load_dotenv()
 
-print("🚀 Starting Multi-Modal RAG Setup (Simple Version)...")
+DATA_PATH = 'data/'
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+# --rebuild drops the manifest and re-indexes everything from scratch
+FULL_REBUILD = "--rebuild" in sys.argv
+
+# Chunks live in one index, or one shard (namespace) per source PDF or collection
+collections = {}
+if SHARD_BY == "collection" and os.path.exists(COLLECTIONS_PATH):
+    with open(COLLECTIONS_PATH, 'r', encoding='utf-8') as f:
+        collections = json.load(f)
+shard_map = ShardMap(SHARD_MAP_PATH, SHARD_BY, collections)
+previous_shards = ShardMap.load(SHARD_MAP_PATH)
+if os.path.exists(MANIFEST_PATH) and (previous_shards.shard_by, previous_shards.collections) != (SHARD_BY, collections):
+    print(f"🔀 Sharding changed ({previous_shards.shard_by} -> {SHARD_BY}), rebuilding the index...")
+    FULL_REBUILD = True
+
+print("🚀 Starting Multi-Modal RAG Setup (Incremental)...")
 
 # Initialize processor
 processor = SimplePDFProcessor()
 
-# Load and process PDFs
-print("📄 Loading PDFs from data/ folder...")
-documents = processor.load_pdf_file('data/')
+pdf_files = sorted(f for f in os.listdir(DATA_PATH) if f.endswith('.pdf')) if os.path.exists(DATA_PATH) else []
 
-if len(documents) == 0:
+if len(pdf_files) == 0:
     print("⚠️  No documents found! Creating sample content...")
     os.makedirs('data', exist_ok=True)
-    
+
     # Create a sample document
     sample_content = """IMF Article IV Consultation - Qatar
 
 Executive Summary:
-Qatar's economy shows strong growth with GDP increasing by 3.2% in 2023. 
+Qatar's economy shows strong growth with GDP increasing by 3.2% in 2023.
 Inflation remains controlled at 2.1%.
 
 Table 1: Economic Indicators
@@ -41,109 +72,163 @@ Key Recommendations:
 1. Enhance business environment
 2. Improve access to finance
 3. Diversify economy"""
-    
+
     with open('data/sample_qatar.pdf', 'w', encoding='utf-8') as f:
         f.write(sample_content)
-    
-    documents = processor.load_pdf_file('data/')
-
-print(f"✅ Extracted {len(documents)} pages")
-
-# Split into chunks
-print("✂️  Chunking documents...")
-chunks = processor.text_split(documents)
-print(f"✅ Created {len(chunks)} chunks")
-
-# Show chunk types
-element_types = [chunk["metadata"].get("element_type", "text") for chunk in chunks]
-print(f"📊 Element distribution: {set(element_types)}")
-
-# Load embeddings
-print("🔤 Loading embeddings...")
-embeddings = download_hugging_face_embeddings()
-
-# Connect to Pinecone
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-if not PINECONE_API_KEY:
-    print("❌ PINECONE_API_KEY not found in .env file")
-    exit(1)
-
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index_name = "multimodal-rag-v2"  # New index name
-
-# Create or connect to index
-print(f"📊 Setting up Pinecone index '{index_name}'...")
-if index_name not in pc.list_indexes().names():
-    pc.create_index(
-        name=index_name,
-        dimension=384,
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-east-1")
-    )
-    print(f"✅ Created new index: {index_name}")
+
+    pdf_files = ['sample_qatar.pdf']
+
+# Compare file hashes with the manifest to find what actually needs work
+manifest = IndexManifest(MANIFEST_PATH) if FULL_REBUILD else IndexManifest.load(MANIFEST_PATH)
+source_hashes = {f: file_hash(os.path.join(DATA_PATH, f)) for f in pdf_files}
+changed_files = [f for f in pdf_files if not manifest.is_unchanged(f, source_hashes[f])]
+
+# Side indexes are rebuilt from every PDF if missing (embeddings stay cached)
+lexical_index = BM25Index(LEXICAL_INDEX_PATH) if FULL_REBUILD else BM25Index.load(LEXICAL_INDEX_PATH)
+reference_index = ReferenceIndex(REFERENCE_INDEX_PATH) if FULL_REBUILD else ReferenceIndex.load(REFERENCE_INDEX_PATH)
+table_store = TableStore(TABLE_STORE_PATH) if FULL_REBUILD else TableStore.load(TABLE_STORE_PATH)
+page_images = PageImageIndex(PAGE_IMAGE_INDEX_PATH) if FULL_REBUILD else PageImageIndex.load(PAGE_IMAGE_INDEX_PATH)
+chunk_indexes = [lexical_index, reference_index]
+page_index_paths = [TABLE_STORE_PATH, PAGE_IMAGE_INDEX_PATH]
+if manifest.sources and (any(len(index) == 0 for index in chunk_indexes)
+                         or not all(os.path.exists(path) for path in page_index_paths)):
+    print("🔎 Lexical/reference/table/page image index missing, re-processing all PDFs to build it...")
+    changed_files = list(pdf_files)
+removed_files = [f for f in manifest.sources if f not in source_hashes]
+# Shards that already hold chunks, so updates and deletes reach them
+shard_map.set_sources(manifest.sources)
+
+print(f"📄 {len(pdf_files)} PDFs in {DATA_PATH}: {len(changed_files)} new/changed, "
+      f"{len(pdf_files) - len(changed_files)} unchanged, {len(removed_files)} removed")
+
+# Open the target vector store
+if VECTOR_BACKEND in ("flat", "hnsw"):
+    # Local in-process index persisted under LOCAL_INDEX_DIR
+    index_name = LOCAL_INDEX_DIR
+    if FULL_REBUILD:
+        # Drop both layouts; only the configured one is rebuilt
+        shutil.rmtree(os.path.join(LOCAL_INDEX_DIR, SHARDS_DIR), ignore_errors=True)
+        for name in (VECTORS_FILE, DOCS_FILE, HNSW_FILE):
+            if os.path.exists(os.path.join(LOCAL_INDEX_DIR, name)):
+                os.remove(os.path.join(LOCAL_INDEX_DIR, name))
+    if SHARD_BY != "none":
+        docsearch = open_sharded_store(shard_map, backend=VECTOR_BACKEND)
+    elif FULL_REBUILD:
+        docsearch = LocalVectorStore(LOCAL_INDEX_DIR, None, index_type=VECTOR_BACKEND)
+    else:
+        docsearch = LocalVectorStore.load(LOCAL_INDEX_DIR, None, index_type=VECTOR_BACKEND)
 else:
-    print(f"✅ Using existing index: {index_name}")
-
-# Convert to Document objects
-print("📄 Converting to Document format...")
-docs_to_upsert = []
-for chunk in chunks:
-    docs_to_upsert.append(Document(
-        page_content=chunk["text"],
-        metadata=chunk["metadata"]
-    ))
-
-# Store in Pinecone
-print(f"💾 Storing {len(docs_to_upsert)} chunks in Pinecone...")
-try:
-    docsearch = PineconeVectorStore.from_documents(
-        documents=docs_to_upsert,
-        embedding=embeddings,
-        index_name=index_name
-    )
-    print("🎉 Successfully indexed documents!")
-    
-    # Verify storage
-    index = pc.Index(index_name)
-    stats = index.describe_index_stats()
-    print(f"📊 Index stats: {stats.total_vector_count} vectors stored")
-    
-except Exception as e:
-    print(f"❌ Error: {e}")
-    print("Trying alternative storage method...")
-    
-    # Alternative: Manual upsert
-    from tqdm import tqdm
-    
-    index = pc.Index(index_name)
-    
-    # Create embeddings
-    print("Creating embeddings...")
-    texts = [doc.page_content for doc in docs_to_upsert]
-    embeddings_list = embeddings.embed_documents(texts)
-    
-    # Prepare vectors
-    vectors = []
-    for i, (doc, embedding) in enumerate(zip(docs_to_upsert, embeddings_list)):
-        vectors.append({
-            "id": doc.metadata.get("chunk_id", f"chunk_{i}"),
-            "values": embedding,
-            "metadata": doc.metadata
-        })
-    
-    # Upsert in batches
-    batch_size = 100
-    for i in tqdm(range(0, len(vectors), batch_size), desc="Uploading"):
-        batch = vectors[i:i+batch_size]
-        index.upsert(vectors=batch)
-    
-    print(f"✅ Uploaded {len(vectors)} vectors")
+    # Connect to Pinecone
+    from pinecone import Pinecone, ServerlessSpec
+
+    PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+    if not PINECONE_API_KEY:
+        print("❌ PINECONE_API_KEY not found in .env file")
+        exit(1)
+
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+    index_name = INDEX_NAME
+
+    # Create or connect to index
+    print(f"📊 Setting up Pinecone index '{index_name}'...")
+    if index_name not in pc.list_indexes().names():
+        pc.create_index(
+            name=index_name,
+            dimension=EMBEDDING_DIM,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1")
+        )
+        print(f"✅ Created new index: {index_name}")
+    else:
+        print(f"✅ Using existing index: {index_name}")
+        if FULL_REBUILD:
+            print("🧹 Clearing existing vectors for full rebuild...")
+            index = pc.Index(index_name)
+            for namespace in index.describe_index_stats().namespaces:
+                index.delete(delete_all=True, namespace=namespace)
+
+    if SHARD_BY != "none":
+        # One namespace per shard in the same index
+        docsearch = open_sharded_store(shard_map, backend="pinecone", index_name=index_name)
+    else:
+        docsearch = pc.Index(index_name)
+
+# Vectors for PDFs that were removed from data/
+removed_ids = sorted(chunk_id for source in removed_files for chunk_id in manifest.chunk_ids(source))
+if removed_ids:
+    print(f"🗑️  Deleting {len(removed_ids)} chunks of removed PDFs...")
+    delete_vectors(docsearch, removed_ids)
+for index in chunk_indexes:
+    for chunk_id in removed_ids:
+        index.remove(chunk_id)
+for source in removed_files:
+    table_store.remove_source(source)
+    page_images.remove_source(source)
+    manifest.remove(source)
+
+# Embeddings are loaded on first use, so a no-op run never touches the model
+# int8 vectors are close to, not identical with, fp32 ones, so they are cached separately
+cache_key = EMBEDDING_MODEL if EMBEDDING_BACKEND == "huggingface" else f"{EMBEDDING_MODEL}:{EMBEDDING_BACKEND}"
+cache = EmbeddingCache(EMBEDDING_CACHE_PATH, cache_key)
+embeddings = None
+
+def embed_batch(texts):
+    global embeddings
+    if embeddings is None:
+        print("🔤 Loading embeddings...")
+        embeddings = load_embedding_model()
+    return cache.embed_documents(texts, embeddings)
+
+# Stream pages -> chunks -> embedding batches -> upserts with bounded buffering
+print(f"💾 Streaming new/changed chunks into {VECTOR_BACKEND} index '{index_name}'...")
+pipeline = IngestionPipeline(
+    processor,
+    manifest,
+    embed_fn=embed_batch,
+    upsert_fn=lambda **batch: upsert_vectors(docsearch, **batch),
+    delete_fn=lambda ids: delete_vectors(docsearch, ids),
+    batch_size=INGEST_BATCH_SIZE,
+    chunk_indexes=chunk_indexes,
+    page_indexes=[table_store, page_images]
+)
+stats = pipeline.run(DATA_PATH, {f: source_hashes[f] for f in changed_files})
+cache.close()
+
+print(f"✅ Extracted {stats['pages']} pages, {stats['chunks']} chunks")
+print(f"📊 Element distribution: {dict(pipeline.element_types)}")
+print(f"🧠 Embedding cache: {cache.hits} hits, {cache.misses} newly embedded")
+for pdf_file, error in pipeline.failed.items():
+    print(f"⚠️  {pdf_file} could not be extracted ({error}); its previous chunks are kept and it is retried next run")
+
+index_changed = stats["upserted"] or stats["deleted"] or removed_ids or FULL_REBUILD
+if isinstance(docsearch, (LocalVectorStore, ShardedVectorStore)) and index_changed:
+    docsearch.save()
+
+# Record the new state only after the index has been updated
+lexical_index.save()
+reference_index.save()
+table_store.save()
+page_images.save()
+print(f"🔎 Lexical (BM25) index: {len(lexical_index)} chunks, {len(lexical_index.postings)} terms")
+print(f"🔖 Reference index: {len(reference_index.refs)} Figure/Table/page references")
+print(f"📊 Table store: {len(table_store)} table cells")
+print(f"🖼️  Page image index: {len(page_images)} pages with figures or images")
+shard_map.set_sources(manifest.sources)
+shard_map.save()
+if SHARD_BY != "none":
+    print(f"🧩 Shards: {len(shard_map)} by {SHARD_BY}")
+manifest.save()
+
+# Bump the index version so running apps drop cached answers
+if index_changed:
+    with open(INDEX_VERSION_PATH, 'w', encoding='utf-8') as f:
+        f.write(str(time.time()))
 
 print("\n" + "="*50)
 print("✅ Setup Complete!")
-print(f"📚 Documents: {len(documents)} pages")
-print(f"🔗 Chunks: {len(chunks)}")
-print(f"🗂️  Index: {index_name}")
+print(f"📚 Documents: {stats['pages']} pages re-extracted")
+print(f"🔗 Chunks: {stats['upserted']} upserted, {stats['deleted'] + len(removed_ids)} deleted")
+print(f"🗂️  Index: {index_name} ({len(manifest.all_chunk_ids())} chunks tracked)")
 print("="*50)
-print("\n🎯 Next: Update app.py to use index 'multimodal-rag-v2'")
-print("🚀 Run: python app.py")
\ No newline at end of file
+print(f"\n🎯 Next: Run app.py with VECTOR_BACKEND={VECTOR_BACKEND}")
+print("🚀 Run: python app.py")
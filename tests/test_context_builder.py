@@ -0,0 +1,25 @@
+from langchain_core.documents import Document
+
+from src.context_builder import ContextBuilder
+
+
+def chunk(page, index, text):
+    return Document(page_content=text, metadata={
+        "source": "a.pdf", "page": page, "chunk_id": f"a.pdf_p{page}_c{index}"
+    })
+
+
+def test_merges_neighbours_selected_out_of_order():
+    c0 = chunk(3, 0, "Fiscal surplus narrowed as hydrocarbon revenue fell back in 2023.")
+    c2 = chunk(3, 2, "Capital spending is projected to stay near 8 percent of GDP.")
+    c1 = chunk(3, 1, "Current expenditure rose on wages and goods and services outlays.")
+    other = chunk(7, 0, "Banks remain well capitalized with ample liquidity buffers.")
+    groups = ContextBuilder()._merge([c0, other, c2, c1])
+    assert groups == [[c0, c1, c2], [other]]
+
+
+def test_gaps_and_pages_stay_separate():
+    c0, c2 = chunk(3, 0, "first"), chunk(3, 2, "third")
+    next_page = chunk(4, 1, "next page")
+    groups = ContextBuilder()._merge([c2, next_page, c0])
+    assert groups == [[c2], [next_page], [c0]]
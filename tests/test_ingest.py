@@ -0,0 +1,67 @@
+from src.index_cache import IndexManifest
+from src.ingest import IngestionPipeline
+from src.page_images import PageImageIndex
+from src.table_store import TableStore
+
+TABLE_PAGE = """Table 1. Qatar: Selected Indicators, 2021-24
+2021 2022 2023 2024
+Real GDP growth {} 4.2 1.2 1.7
+"""
+
+
+def page(source, number, growth):
+    return {
+        "content": TABLE_PAGE.format(growth) + f"\nFigure {number}. Output Gap",
+        "metadata": {"source": source, "page": number, "element_type": "text"},
+        "images": []
+    }
+
+
+class FailingProcessor:
+    """Yields the first page of a.pdf, then fails the rest of the file"""
+
+    def __init__(self):
+        self.failed = {}
+
+    def iter_pdf_pages(self, data_path, pdf_files=None):
+        self.failed = {}
+        yield page("a.pdf", 1, "9.9")
+        self.failed = {"a.pdf": "stream ended"}
+
+    def iter_split(self, pages):
+        for p in pages:
+            metadata = dict(p["metadata"], chunk_id=f"{p['metadata']['source']}_p{p['metadata']['page']}_c0")
+            yield {"text": p["content"], "metadata": metadata}
+
+
+def test_failed_source_keeps_page_indexes(tmp_path):
+    tables = TableStore(str(tmp_path / "tables.json"))
+    images = PageImageIndex(str(tmp_path / "page_images.json"))
+    for index in (tables, images):
+        for number in (1, 2):
+            index.stage_page(page("a.pdf", number, "1.5"))
+        index.commit_source("a.pdf")
+    assert len(tables) == 8
+    before_tables = tables.frame.copy()
+    before_images = {p: dict(entry) for p, entry in images.sources["a.pdf"].items()}
+
+    manifest = IndexManifest(str(tmp_path / "manifest.json"), {
+        "a.pdf": {"file_hash": "old", "pages": {"1": {"a.pdf_p1_c0": "h"}, "2": {"a.pdf_p2_c0": "h"}}}
+    })
+    pipeline = IngestionPipeline(
+        FailingProcessor(), manifest,
+        embed_fn=lambda texts: [[0.0]] * len(texts),
+        upsert_fn=lambda **batch: None,
+        delete_fn=lambda ids: None,
+        page_indexes=[tables, images]
+    )
+    pipeline.run("data", {"a.pdf": "new"})
+
+    assert pipeline.failed == {"a.pdf": "stream ended"}
+    assert manifest.sources["a.pdf"]["file_hash"] == "old"
+    # Both pages survive, with the old values rather than the half-read file's
+    assert tables.frame.equals(before_tables)
+    assert set(tables.frame["page"]) == {1, 2}
+    assert 9.9 not in set(tables.frame["value"])
+    assert images.sources["a.pdf"] == before_images
+    assert set(images.sources["a.pdf"]) == {"1", "2"}
@@ -0,0 +1,55 @@
+from src.table_store import TableStore
+
+PAGE = """Table 1. Qatar: Selected Macroeconomic Indicators, 2020-24
+2020 2021 2022 2023 2024
+Central government finances
+Revenue 32.6 29.6 34.7 32.8 26.2
+Non-hydrocarbon primary balance
+(percent of non-hydrocarbon GDP) 2/ -35.4 -34.6 -31.9 -33.5 -32.7
+Monetary and financial sector (change in percent)
+Broad money 3.8 1.4 17.4 1 .1 4.1
+External sector
+Current account balance -2.1 14.6 26.8 17.1 16.6
+Sources: Qatari authorities, and IMF staff.
+Table 2. Qatar: Balance of Payments, 2020-24
+(Billions of US dollars unless otherwise noted)
+2020 2021 2022 2023 2024
+Trade balance 25.3 58.4 97.8 61.3 57.9
+"""
+
+
+def store(tmp_path):
+    tables = TableStore(str(tmp_path / "tables.json"))
+    tables.stage_page({"content": PAGE, "metadata": {"source": "a.pdf", "page": 39}})
+    tables.commit_source("a.pdf")
+    tables.save()
+    return tables
+
+
+def test_answer_names_row_section_and_units(tmp_path):
+    answer = store(tmp_path).lookup("broad money in 2023")["answer"]
+    assert answer.startswith("**Broad money**, Monetary and financial sector, 2023: **1.1** (change in percent)")
+    assert "Table 1. Qatar" in answer and "page 39" in answer
+
+
+def test_table_units_drop_otherwise_noted(tmp_path):
+    answer = store(tmp_path).lookup("trade balance in 2024")["answer"]
+    assert "**57.9** (Billions of US dollars)" in answer
+
+
+def test_series_header_uses_units(tmp_path):
+    answer = store(tmp_path).lookup("trade balance 2022-2024")["answer"]
+    assert "| Year | Billions of US dollars |" in answer
+
+
+def test_missing_units_are_flagged(tmp_path):
+    answer = store(tmp_path).lookup("current account balance in 2024")["answer"]
+    assert "**Current account balance**, External sector, 2024: **16.6**" in answer
+    assert "units are not stated" in answer
+
+
+def test_wrapped_label_is_not_a_section(tmp_path):
+    frame = store(tmp_path).frame
+    rows = frame[frame["value"] == -33.5]
+    assert list(rows["row"]) == ["Non-hydrocarbon primary balance (percent of non-hydrocarbon GDP)"]
+    assert list(rows["section"]) == ["Central government finances"]
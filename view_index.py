@@ -1,128 +1,211 @@
-from pinecone import Pinecone
-from dotenv import load_dotenv
+"""Scan every record in the vector index.
+
+Pages through all vector IDs (Pinecone ``list`` + bulk ``fetch``, or the
+local store's documents), streams each record to a JSONL export and
+writes exact distributions plus consistency checks against the index
+manifest to a JSON summary.
+
+    python view_index.py                      # VECTOR_BACKEND (pinecone by default)
+    python view_index.py --backend flat --no-text
+"""
 import os
 import json
+import argparse
+from collections import Counter, defaultdict
+
+from dotenv import load_dotenv
+
+from src.config import VECTOR_BACKEND, INDEX_NAME, LOCAL_INDEX_DIR, MANIFEST_PATH, SHARD_MAP_PATH
+from src.index_cache import IndexManifest
+from src.shards import ShardMap
+from src.vector_store import LocalVectorStore, open_sharded_store, iter_index_records
 
 load_dotenv()
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index("multimodal-rag-v2")
-
-print("🔍 Analyzing Pinecone Index...")
-
-# Get ALL vectors with metadata (in batches)
-def get_all_vectors(limit=100):
-    """Get all vectors from index"""
-    all_vectors = []
-    query_vectors = [
-        [0.1]*384, 
-        [0.5]*384,  
-        [-0.5]*384,
-        [1.0]*384,  
-        [-1.0]*384  
-    ]
-    
-    seen_ids = set()
-    for query_vec in query_vectors:
-        results = index.query(
-            vector=query_vec,
-            top_k=50,
-            include_metadata=True,
-            include_values=False
-        )
-        
-        for match in results.matches:
-            if match.id not in seen_ids:
-                seen_ids.add(match.id)
-                all_vectors.append(match)
-                
-                if len(all_vectors) >= limit:
-                    return all_vectors
-    
-    return all_vectors
-
-# Get sample vectors
-vectors = get_all_vectors(50)
-
-if not vectors:
+
+parser = argparse.ArgumentParser(description="Export and analyze every record in the vector index")
+parser.add_argument("--backend", default=VECTOR_BACKEND, choices=["pinecone", "flat", "hnsw"])
+parser.add_argument("--output", default="index_export.jsonl", help="one JSON record per line")
+parser.add_argument("--summary", default="index_analysis.json")
+parser.add_argument("--problems", default="index_problems.jsonl", help="every consistency problem, one per line")
+parser.add_argument("--problem-samples", type=int, default=20, help="problem IDs kept per check in the summary")
+parser.add_argument("--batch-size", type=int, default=100, help="IDs per list/fetch round-trip (Pinecone)")
+parser.add_argument("--no-text", action="store_true", help="leave chunk text out of the export")
+parser.add_argument("--samples", type=int, default=2, help="samples to show per element type")
+parser.add_argument("--data-dir", default="data", help="source PDFs, to spot vectors of deleted files")
+args = parser.parse_args()
+
+shard_map = ShardMap.load(SHARD_MAP_PATH)
+if shard_map.shard_by != "none":
+    # Every shard (namespace) is scanned in turn
+    store = open_sharded_store(shard_map, backend=args.backend)
+    print(f"🔍 Scanning {len(shard_map)} {args.backend} shards (by {shard_map.shard_by})...")
+elif args.backend == "pinecone":
+    from src.clients import make_pinecone_index
+
+    store = make_pinecone_index(INDEX_NAME)
+    print(f"🔍 Scanning Pinecone index '{INDEX_NAME}'...")
+else:
+    # No queries are run, so no embedding model is needed
+    store = LocalVectorStore.load(LOCAL_INDEX_DIR, None, index_type="flat")
+    print(f"🔍 Scanning local index in '{LOCAL_INDEX_DIR}'...")
+
+manifest = IndexManifest.load(MANIFEST_PATH)
+manifest_ids = manifest.all_chunk_ids()
+known_sources = set(manifest.sources)
+if os.path.isdir(args.data_dir):
+    data_files = {f for f in os.listdir(args.data_dir) if f.lower().endswith(".pdf")}
+else:
+    data_files = None
+
+element_counts = Counter()
+source_counts = Counter()
+shard_counts = Counter()
+page_counts = defaultdict(Counter)  # source -> page -> chunks
+stale_sources = Counter()            # vectors whose source PDF is gone
+samples = defaultdict(list)
+# Only the manifest's IDs are held in memory (they already are, above); whatever
+# the scan finds is checked against them and crossed off, nothing grows with the index
+unseen_ids = set(manifest_ids)       # manifest vector IDs not scanned yet -> missing
+unclaimed_chunks = set(manifest_ids) # manifest chunk_ids no vector carried yet -> later ones are duplicates
+problem_counts = Counter()           # check -> problems found
+problem_samples = defaultdict(list)  # check -> first --problem-samples problems
+total = 0
+
+
+def report(problems_out, check, problem):
+    """Stream a problem to the problems file, keeping a count and a few samples"""
+    problem_counts[check] += 1
+    if len(problem_samples[check]) < args.problem_samples:
+        problem_samples[check].append(problem)
+    problems_out.write(json.dumps({"check": check, **problem}, ensure_ascii=False) + "\n")
+
+
+with open(args.output, "w", encoding="utf-8") as out, open(args.problems, "w", encoding="utf-8") as problems_out:
+    for doc in iter_index_records(store, batch_size=args.batch_size):
+        total += 1
+        metadata = doc.metadata
+        source = metadata.get("source", "unknown")
+        elem_type = metadata.get("element_type", "unknown")
+        chunk_id = metadata.get("chunk_id", doc.id)
+
+        try:
+            page = int(float(metadata.get("page")))
+        except (TypeError, ValueError):
+            page = "unknown"
+
+        element_counts[elem_type] += 1
+        source_counts[source] += 1
+        shard_counts[shard_map.shard_of(source)] += 1
+        page_counts[source][page] += 1
+        unseen_ids.discard(doc.id)
+
+        if chunk_id in unclaimed_chunks:
+            unclaimed_chunks.discard(chunk_id)
+        elif chunk_id in manifest_ids:
+            report(problems_out, "duplicate_chunk_id", {"id": doc.id, "chunk_id": chunk_id})
+        if chunk_id != doc.id:
+            report(problems_out, "mismatched_id", {"id": doc.id, "chunk_id": chunk_id})
+        if doc.id not in manifest_ids:
+            # Duplicates among orphans can't be told apart without remembering every ID; they show up here
+            report(problems_out, "orphaned_vector", {
+                "id": doc.id, "source": source,
+                "reason": "unknown source" if source not in known_sources else "not in manifest"
+            })
+        if data_files is not None and source not in data_files:
+            stale_sources[source] += 1
+
+        if len(samples[elem_type]) < args.samples:
+            samples[elem_type].append(doc)
+
+        record = {"id": doc.id, "metadata": metadata}
+        if not args.no_text:
+            record["text"] = doc.page_content
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        if total % 1000 == 0:
+            print(f"   ...{total} records")
+
+    for chunk_id in sorted(unseen_ids):
+        report(problems_out, "missing_from_index", {"id": chunk_id})
+
+if total == 0:
     print("❌ No vectors found in index!")
     exit(1)
 
-print(f"✅ Found {len(vectors)} vectors")
+duplicates = problem_counts["duplicate_chunk_id"]
+mismatched = problem_counts["mismatched_id"]
+orphans = problem_counts["orphaned_vector"]
+missing = problem_counts["missing_from_index"]
+
+print(f"✅ Scanned {total} vectors -> {args.output}")
 
-# Analyze element types
 print("\n📊 Element Type Distribution:")
-element_counts = {}
-page_distribution = {}
+for elem_type, count in element_counts.most_common():
+    print(f"  {elem_type}: {count} ({count/total*100:.1f}%)")
 
-for vector in vectors:
-    metadata = vector.metadata
-    elem_type = metadata.get('element_type', 'unknown')
-    page = metadata.get('page', 'unknown')
-    
-    element_counts[elem_type] = element_counts.get(elem_type, 0) + 1
-    page_distribution[page] = page_distribution.get(page, 0) + 1
+print("\n📚 Source Distribution:")
+for source, count in source_counts.most_common():
+    print(f"  {source}: {count} chunks on {len(page_counts[source])} pages")
 
-print("Element Types:")
-for elem_type, count in element_counts.items():
-    print(f"  {elem_type}: {count} ({count/len(vectors)*100:.1f}%)")
+if shard_map.shard_by != "none":
+    print("\n🧩 Shard Distribution:")
+    for shard, count in shard_counts.most_common():
+        print(f"  {shard}: {count} chunks")
 
 print("\n📄 Page Distribution (top 10):")
-for page, count in sorted(page_distribution.items(), key=lambda x: x[1], reverse=True)[:10]:
-    print(f"  Page {page}: {count} chunks")
+top_pages = sorted(
+    ((source, page, count) for source, pages in page_counts.items() for page, count in pages.items()),
+    key=lambda x: x[2], reverse=True
+)[:10]
+for source, page, count in top_pages:
+    print(f"  {source} page {page}: {count} chunks")
+
+print("\n🧪 Consistency Checks:")
+print(f"  {'✅' if not duplicates else '⚠️ '} Duplicate chunk_ids: {duplicates}")
+print(f"  {'✅' if not mismatched else '⚠️ '} Vector ID != chunk_id: {mismatched}")
+print(f"  {'✅' if not orphans else '⚠️ '} Orphaned vectors (not in manifest): {orphans}")
+print(f"  {'✅' if not missing else '⚠️ '} Manifest chunks missing from index: {missing}")
+if problem_counts:
+    print(f"  📝 Every problem is listed in {args.problems}")
+if stale_sources:
+    print(f"  ⚠️  Vectors of sources missing from {args.data_dir}/: {dict(stale_sources)}")
+if orphans or missing:
+    print("  💡 Run `python store_index.py --rebuild` to bring the index and manifest back in sync")
 
-# Show samples of each type
 print("\n🔍 Sample Content by Type:")
-
-for elem_type in element_counts.keys():
+for elem_type, docs in samples.items():
     print(f"\n📌 {elem_type.upper()} Samples:")
-    samples = [v for v in vectors if v.metadata.get('element_type') == elem_type][:2]
-    
-    for i, sample in enumerate(samples):
+    for i, sample in enumerate(docs):
         print(f"  Sample {i+1}:")
         print(f"    ID: {sample.id}")
         print(f"    Page: {sample.metadata.get('page', 'N/A')}")
         print(f"    Source: {sample.metadata.get('source', 'N/A')}")
-        
-        # Get content preview
-        content = ""
-        if 'text' in sample.metadata:
-            content = sample.metadata['text']
-        elif 'page_content' in sample.metadata:
-            content = sample.metadata['page_content']
-        
-        if content:
-            preview = content[:150].replace('\n', ' ')
+        if sample.page_content:
+            preview = sample.page_content[:150].replace('\n', ' ')
             print(f"    Preview: {preview}...")
-        
-        # Check for special markers
-        if content and '[TABLE_START]' in content:
-            print(f"    ✅ Contains table data")
-        if content and '[IMAGE_REFERENCE]' in content:
-            print(f"    ✅ Contains image reference")
-        if content and 'Figure' in content:
-            print(f"    ✅ Mentions figures")
-        if content and 'Table' in content:
-            print(f"    ✅ Mentions tables")
-
-# Save detailed view to file
-print("\n💾 Saving detailed analysis to 'pinecone_analysis.json'...")
+
+print(f"\n💾 Saving analysis to '{args.summary}'...")
 
 analysis = {
-    "total_vectors": len(vectors),
-    "element_distribution": element_counts,
-    "page_distribution": page_distribution,
-    "samples": []
+    "backend": args.backend,
+    "total_vectors": total,
+    "element_distribution": dict(element_counts.most_common()),
+    "source_distribution": dict(source_counts.most_common()),
+    "shard_distribution": dict(shard_counts.most_common()),
+    "page_distribution": {
+        source: {str(page): count for page, count in sorted(pages.items(), key=lambda x: str(x[0]).zfill(6))}
+        for source, pages in page_counts.items()
+    },
+    "problem_counts": {check: problem_counts[check] for check in
+                       ("duplicate_chunk_id", "mismatched_id", "orphaned_vector", "missing_from_index")},
+    "problem_samples": dict(problem_samples),
+    "stale_sources": dict(stale_sources),
+    "samples": [
+        {"id": doc.id, "metadata": doc.metadata} for docs in samples.values() for doc in docs
+    ]
 }
 
-for i, vector in enumerate(vectors[:20]):
-    analysis["samples"].append({
-        "id": vector.id,
-        "score": float(vector.score),
-        "metadata": vector.metadata
-    })
-
-with open('pinecone_analysis.json', 'w', encoding='utf-8') as f:
+with open(args.summary, "w", encoding="utf-8") as f:
     json.dump(analysis, f, indent=2, ensure_ascii=False)
 
 print("✅ Analysis complete!")
-print(f"📁 Check 'pinecone_analysis.json' for full details")
\ No newline at end of file